@@ -0,0 +1,163 @@
+"""Population living within a catchment distance of sites.
+
+Population polygons are reduced to one representative point each, a point
+which lies inside the polygon, carrying its population. A point lies in the
+catchment of a site when it is inside the site or within the catchment
+distance of its outline. Points are found through a bucket grid over all
+of them, and the predicates are evaluated on arrays of candidate points
+against all the edges of a site at once, a block at a time, rather than
+point by point.
+
+This module only depends on NumPy; reading the geometries is left to
+:mod:`exclusion_engine`.
+"""
+
+import math
+
+import numpy as np
+
+# Point and edge pairs compared at a time
+BLOCK_PAIRS = 1 << 20
+
+
+class PointIndex:
+    """Bucket grid answering which points lie within a rectangle.
+
+    Points are sorted by the cell of the grid they fall in, numbered row by
+    row, so the points of a row of cells are a contiguous run found by
+    binary search. The grid has about one cell per point.
+    """
+
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        count = len(self.x)
+        if count:
+            self.x_min, self.y_min = self.x.min(), self.y.min()
+            width, height = self.x.max() - self.x_min, self.y.max() - self.y_min
+        else:
+            self.x_min = self.y_min = width = height = 0.0
+        self.cell_size = max(math.sqrt(width * height / max(count, 1)), max(width, height) / max(count, 1), 1e-9)
+        self.columns = int(width / self.cell_size) + 1
+        self.rows = int(height / self.cell_size) + 1
+
+        keys = self._row(self.y) * self.columns + self._column(self.x)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def _column(self, x):
+        return np.clip(np.floor((x - self.x_min) / self.cell_size).astype(np.int64), 0, self.columns - 1)
+
+    def _row(self, y):
+        return np.clip(np.floor((y - self.y_min) / self.cell_size).astype(np.int64), 0, self.rows - 1)
+
+    def query(self, rect):
+        """Returns the indexes of the points within ``rect``, ``(x_min, y_min, x_max, y_max)``."""
+        if not len(self.x):
+            return np.empty(0, dtype=np.int64)
+        first_column, last_column = self._column(np.array([rect[0], rect[2]]))
+        rows = np.arange(self._row(np.array(rect[1])), self._row(np.array(rect[3])) + 1)
+        starts = np.searchsorted(self.keys, rows * self.columns + first_column, side="left")
+        stops = np.searchsorted(self.keys, rows * self.columns + last_column, side="right")
+        candidates = np.concatenate([self.order[start:stop] for start, stop in zip(starts, stops)])
+
+        x, y = self.x[candidates], self.y[candidates]
+        return candidates[(x >= rect[0]) & (x <= rect[2]) & (y >= rect[1]) & (y <= rect[3])]
+
+
+def _point_blocks(count, edges):
+    step = max(1, BLOCK_PAIRS // max(edges, 1))
+    for start in range(0, count, step):
+        yield slice(start, start + step)
+
+
+def points_in_rings(x, y, rings):
+    """Returns which points are inside the polygons bounded by ``rings``.
+
+    Every ring flips the inside state of the points it encloses (even odd
+    rule), so holes and the parts of a multi-polygon need no special care.
+
+    :param rings: Arrays of the ``(x, y)`` vertices of every ring.
+    :rtype: numpy.ndarray
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    inside = np.zeros(len(x), dtype=bool)
+    for ring in rings:
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        for block in _point_blocks(len(x), len(ring)):
+            px, py = x[block, np.newaxis], y[block, np.newaxis]
+            straddles = (y1 > py) != (y2 > py)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                crossing_x = x1 + (x2 - x1) * (py - y1) / (y2 - y1)
+            crossings = np.count_nonzero(straddles & (px < crossing_x), axis=1)
+            inside[block] ^= crossings % 2 == 1
+    return inside
+
+
+def segment_distances(x, y, starts, ends):
+    """Returns the distance from every point to the nearest segment.
+
+    :param starts: ``(n, 2)`` array of the first vertex of the segments.
+    :param ends: ``(n, 2)`` array of their last vertex; a segment whose
+        ends coincide is a point.
+    :returns: The distances, infinite when there is no segment.
+    :rtype: numpy.ndarray
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    distances = np.full(len(x), np.inf)
+    if not len(starts):
+        return distances
+
+    sx, sy = starts[:, 0], starts[:, 1]
+    dx, dy = ends[:, 0] - sx, ends[:, 1] - sy
+    squared_lengths = dx * dx + dy * dy
+    degenerate = squared_lengths == 0
+    squared_lengths = np.where(degenerate, 1.0, squared_lengths)
+    for block in _point_blocks(len(x), len(starts)):
+        px, py = x[block, np.newaxis] - sx, y[block, np.newaxis] - sy
+        # Position of the closest point along each segment
+        t = np.where(degenerate, 0.0, np.clip((px * dx + py * dy) / squared_lengths, 0.0, 1.0))
+        distances[block] = np.sqrt(((px - t * dx) ** 2 + (py - t * dy) ** 2).min(axis=1))
+    return distances
+
+
+def catchment_points(index, rings, starts, ends, distance):
+    """Returns the indexes of the points inside a site or within ``distance``
+    of its outline.
+
+    :param index: Index of the points.
+    :type index: PointIndex
+
+    :param rings: Rings of the site, see :func:`points_in_rings`, empty
+        for points and lines.
+    :param starts: First vertices of the segments of the site outline.
+    :param ends: Last vertices, see :func:`segment_distances`.
+    :rtype: numpy.ndarray
+    """
+    vertices = np.concatenate([starts, ends]) if len(starts) else np.empty((0, 2))
+    if not len(vertices):
+        return np.empty(0, dtype=np.int64)
+    x_min, y_min = vertices.min(axis=0)
+    x_max, y_max = vertices.max(axis=0)
+    candidates = index.query((x_min - distance, y_min - distance, x_max + distance, y_max + distance))
+    if not len(candidates):
+        return candidates
+
+    x, y = index.x[candidates], index.y[candidates]
+    within = segment_distances(x, y, starts, ends) <= distance
+    if rings:
+        outside = ~within
+        within[outside] = points_in_rings(x[outside], y[outside], rings)
+    return candidates[within]
+
+
+def catchment_population(index, population, rings, starts, ends, distance):
+    """Returns the population within ``distance`` of a site, see
+    :func:`catchment_points`.
+
+    :param population: Population of every point, NaN counting as 0.
+    :rtype: float
+    """
+    served = catchment_points(index, rings, starts, ends, distance)
+    return float(np.nansum(np.asarray(population, dtype=float)[served]))
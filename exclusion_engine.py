@@ -0,0 +1,324 @@
+import numpy as np
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (QgsFeature, QgsFeatureRequest, QgsField, QgsGeometry, QgsSpatialIndex,
+                       QgsVectorLayer, QgsWkbTypes)
+
+from .catchment import PointIndex, catchment_population
+from .pipeline import CATCHMENT_FIELD, RIVER_DISTANCE_FIELD, SCHOOL_DISTANCE_FIELD
+
+
+def attribute_value(value):
+    """Returns the attribute ``value`` with NULL turned into None."""
+    if isinstance(value, QVariant) and value.isNull():
+        return None
+    return value
+
+
+def geometry_index(layer):
+    """Returns a spatial index of ``layer`` storing the feature geometries."""
+    return QgsSpatialIndex(layer.getFeatures(), None, QgsSpatialIndex.FlagStoreFeatureGeometries)
+
+
+def nearest_distance(index, geometry):
+    """Returns the distance from ``geometry`` to the nearest feature of ``index``.
+
+    :param index: Index built by :func:`geometry_index`.
+    :type index: QgsSpatialIndex
+
+    :returns: The distance, or None when the index is empty.
+    :rtype: float
+    """
+    # Stored geometries make the index rank the candidates by their true distance
+    candidates = index.nearestNeighbor(geometry, 1)
+    if not candidates:
+        return None
+    return min(geometry.distance(index.geometry(feature_id)) for feature_id in candidates)
+
+
+# Vertices of the longest line piece indexed by an exclusion zone
+PIECE_VERTICES = 32
+
+
+def split_lines(geometry, vertices=PIECE_VERTICES):
+    """Returns the single parts of ``geometry``, its lines cut into pieces.
+
+    Each line piece has at most ``vertices`` vertices and shares its last
+    vertex with the next piece, so the buffers of the pieces together cover
+    the buffer of the line.
+
+    :rtype: list of QgsGeometry
+    """
+    pieces = []
+    for part in geometry.asGeometryCollection():
+        if QgsWkbTypes.geometryType(part.wkbType()) != QgsWkbTypes.LineGeometry:
+            pieces.append(part)
+            continue
+        points = part.asPolyline()
+        if len(points) <= vertices:
+            pieces.append(part)
+            continue
+        for start in range(0, len(points) - 1, vertices - 1):
+            pieces.append(QgsGeometry.fromPolylineXY(points[start:start + vertices]))
+    return pieces
+
+
+class ExclusionZone:
+    """Features around which a fixed distance must be kept free.
+
+    The features are split into their single parts and their lines into
+    short pieces, see :func:`split_lines`, which are indexed with a
+    :class:`QgsSpatialIndex` storing their geometries, so that only the
+    pieces close to a population polygon are ever compared against it and a
+    long river does not turn into one huge buffer. Buffers are built
+    lazily, one per piece, and only for pieces that actually fall within
+    ``distance`` of a polygon.
+    """
+
+    def __init__(self, layer, distance, segments=5):
+        self.distance = distance
+        self.segments = segments
+        self.index = QgsSpatialIndex(QgsSpatialIndex.FlagStoreFeatureGeometries)
+        self._buffers = {}
+
+        piece_count = 0
+        for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+            if feature.geometry().isNull():
+                continue
+            for piece in split_lines(feature.geometry()):
+                piece_feature = QgsFeature(piece_count)
+                piece_feature.setGeometry(piece)
+                self.index.addFeature(piece_feature)
+                piece_count += 1
+
+    def buffers_near(self, geometry):
+        """Returns the buffers of the pieces within distance of ``geometry``."""
+        if self.distance <= 0:
+            return []
+
+        buffers = []
+        search_rect = geometry.boundingBox().buffered(self.distance)
+        for piece_id in self.index.intersects(search_rect):
+            candidate = self.index.geometry(piece_id)
+            if geometry.distance(candidate) >= self.distance:
+                continue
+
+            buffer = self._buffers.get(piece_id)
+            if buffer is None:
+                buffer = candidate.buffer(self.distance, self.segments)
+                self._buffers[piece_id] = buffer
+            buffers.append(buffer)
+        return buffers
+
+
+def memory_layer_like(layer, name, fields=None):
+    """Returns an empty multi-part memory layer with the geometry type and
+    CRS of ``layer`` and its fields, or ``fields`` when given."""
+    geometry_type = QgsWkbTypes.displayString(QgsWkbTypes.multiType(layer.wkbType()))
+    output = QgsVectorLayer(f"{geometry_type}?crs={layer.crs().authid()}", name, "memory")
+    output.setCrs(layer.crs())
+    output.dataProvider().addAttributes((layer.fields() if fields is None else fields).toList())
+    output.updateFields()
+    return output
+
+
+def exclude_zones(population_layer, zones, feedback=None, name="suitable_areas"):
+    """Removes the area within the ``zones`` from every population polygon.
+
+    This is equivalent to differencing the population polygons against the
+    merged, dissolved buffers of all zones, but each polygon is only cut by
+    the buffers of its local neighbours. Polygons without any neighbour are
+    copied unchanged, and polygons left empty are dropped.
+
+    :param population_layer: Polygon layer to cut.
+    :type population_layer: QgsVectorLayer
+
+    :param zones: Exclusion zones to remove from the polygons.
+    :type zones: list of ExclusionZone
+
+    :returns: A memory layer with the fields of ``population_layer``.
+    :rtype: QgsVectorLayer
+    """
+    output = memory_layer_like(population_layer, name)
+    provider = output.dataProvider()
+
+    total = population_layer.featureCount()
+    step = 100.0 / total if total > 0 else 0
+    features = []
+
+    for current, feature in enumerate(population_layer.getFeatures(QgsFeatureRequest())):
+        if feedback and feedback.isCanceled():
+            break
+
+        geometry = feature.geometry()
+        buffers = []
+        for zone in zones:
+            buffers.extend(zone.buffers_near(geometry))
+
+        if buffers:
+            geometry = geometry.difference(QgsGeometry.unaryUnion(buffers))
+
+        if not geometry.isEmpty():
+            geometry.convertToMultiType()
+            out_feature = QgsFeature(output.fields())
+            out_feature.setGeometry(geometry)
+            out_feature.setAttributes(feature.attributes())
+            features.append(out_feature)
+
+        if feedback:
+            feedback.setProgress(current * step)
+
+    provider.addFeatures(features)
+    output.updateExtents()
+    return output
+
+
+def exclude_schools_and_rivers(parameters, feedback=None):
+    """Spatial index replacement for the buffer, merge and difference steps.
+
+    ``parameters`` follows the processing conventions used by the pipeline:
+    ``INPUT`` (high population polygons), ``SCHOOLS``, ``RIVERS``,
+    ``SCHOOL_DISTANCE``, ``RIVER_DISTANCE`` and optionally ``SEGMENTS``.
+
+    :returns: The high population areas farther than ``SCHOOL_DISTANCE``
+        from any school and farther than ``RIVER_DISTANCE`` from any river.
+    :rtype: QgsVectorLayer
+    """
+    segments = parameters.get('SEGMENTS', 5)
+    zones = [
+        ExclusionZone(parameters['SCHOOLS'], parameters['SCHOOL_DISTANCE'], segments),
+        ExclusionZone(parameters['RIVERS'], parameters['RIVER_DISTANCE'], segments),
+    ]
+    return exclude_zones(parameters['INPUT'], zones, feedback)
+
+
+def add_distance_attributes(parameters, feedback=None):
+    """Adds the distance to the nearest school and river to every polygon.
+
+    ``parameters`` holds the ``INPUT`` polygons, the ``SCHOOLS`` and the
+    ``RIVERS``. Distances are left empty when there is no school or river.
+
+    :returns: A memory layer with the fields of ``INPUT`` followed by
+        :data:`SCHOOL_DISTANCE_FIELD` and :data:`RIVER_DISTANCE_FIELD`.
+    :rtype: QgsVectorLayer
+    """
+    population_layer = parameters['INPUT']
+    indexes = [geometry_index(parameters['SCHOOLS']), geometry_index(parameters['RIVERS'])]
+
+    output = memory_layer_like(population_layer, "nearest_distances")
+    provider = output.dataProvider()
+    provider.addAttributes([QgsField(SCHOOL_DISTANCE_FIELD, QVariant.Double),
+                            QgsField(RIVER_DISTANCE_FIELD, QVariant.Double)])
+    output.updateFields()
+
+    total = population_layer.featureCount()
+    step = 100.0 / total if total > 0 else 0
+    features = []
+
+    for current, feature in enumerate(population_layer.getFeatures()):
+        if feedback and feedback.isCanceled():
+            break
+
+        geometry = feature.geometry()
+        distances = [nearest_distance(index, geometry) for index in indexes]
+        geometry.convertToMultiType()
+        out_feature = QgsFeature(output.fields())
+        out_feature.setGeometry(geometry)
+        out_feature.setAttributes(feature.attributes() + distances)
+        features.append(out_feature)
+
+        if feedback:
+            feedback.setProgress(current * step)
+
+    provider.addFeatures(features)
+    output.updateExtents()
+    return output
+
+
+def population_points(layer, population_field):
+    """Returns the representative points of the polygons of ``layer`` and
+    their population, as arrays, see :mod:`catchment`."""
+    population_index = layer.fields().indexOf(population_field)
+    request = QgsFeatureRequest().setSubsetOfAttributes([population_index])
+    x, y, population = [], [], []
+    for feature in layer.getFeatures(request):
+        geometry = feature.geometry()
+        if geometry.isNull():
+            continue
+        point = geometry.pointOnSurface().asPoint()
+        x.append(point.x())
+        y.append(point.y())
+        population.append(attribute_value(feature.attributes()[population_index]))
+    return np.array(x), np.array(y), np.array(population, dtype=float)
+
+
+def outline(geometry):
+    """Returns the rings and the segments of ``geometry`` as arrays, see
+    :func:`catchment.catchment_population`."""
+    geometry = QgsGeometry(geometry)
+    geometry.convertToMultiType()
+    geometry_type = QgsWkbTypes.geometryType(geometry.wkbType())
+    rings = []
+    if geometry_type == QgsWkbTypes.PolygonGeometry:
+        for polygon in geometry.asMultiPolygon():
+            rings.extend(np.array([(point.x(), point.y()) for point in ring]) for ring in polygon)
+        lines = rings
+    elif geometry_type == QgsWkbTypes.LineGeometry:
+        lines = [np.array([(point.x(), point.y()) for point in line]) for line in geometry.asMultiPolyline()]
+    else:
+        points = np.array([(point.x(), point.y()) for point in geometry.asMultiPoint()]).reshape(-1, 2)
+        return rings, points, points
+
+    lines = [line for line in lines if len(line)]
+    if not lines:
+        return rings, np.empty((0, 2)), np.empty((0, 2))
+    # A single vertex line still stands for a point
+    starts = np.concatenate([line[:-1] if len(line) > 1 else line for line in lines])
+    ends = np.concatenate([line[1:] if len(line) > 1 else line for line in lines])
+    return rings, starts, ends
+
+
+def aggregate_catchments(parameters, feedback=None):
+    """Adds the population within a distance of every feature.
+
+    ``parameters`` holds the ``INPUT`` features, the ``POPULATION``
+    polygons, the ``DISTANCE`` and the population ``FIELD``. A population
+    polygon counts towards a feature when its representative point lies
+    inside the feature or within ``DISTANCE`` of it; see :mod:`catchment`.
+
+    :returns: A memory layer with the fields of ``INPUT`` followed by
+        :data:`CATCHMENT_FIELD`.
+    :rtype: QgsVectorLayer
+    """
+    layer = parameters['INPUT']
+    distance = parameters['DISTANCE']
+    x, y, population = population_points(parameters['POPULATION'], parameters.get('FIELD', "population"))
+    index = PointIndex(x, y)
+
+    output = memory_layer_like(layer, "catchment_population")
+    provider = output.dataProvider()
+    provider.addAttributes([QgsField(CATCHMENT_FIELD, QVariant.Double)])
+    output.updateFields()
+
+    total = layer.featureCount()
+    step = 100.0 / total if total > 0 else 0
+    features = []
+    for current, feature in enumerate(layer.getFeatures()):
+        if feedback and feedback.isCanceled():
+            break
+
+        geometry = feature.geometry()
+        served = None
+        if not geometry.isNull():
+            served = catchment_population(index, population, *outline(geometry), distance)
+            geometry.convertToMultiType()
+        out_feature = QgsFeature(output.fields())
+        out_feature.setGeometry(geometry)
+        out_feature.setAttributes(feature.attributes() + [served])
+        features.append(out_feature)
+
+        if feedback:
+            feedback.setProgress(current * step)
+
+    provider.addFeatures(features)
+    output.updateExtents()
+    return output
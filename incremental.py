@@ -0,0 +1,93 @@
+"""Bookkeeping of the previous analysis run for incremental updates.
+
+When only the school or river layer changed since the previous run with
+the same parameters, the previous result only needs patching around the
+features that were added, removed or moved; every other population polygon
+keeps its suitable areas. The state of the previous run is kept in a
+directory holding ``state.json``, the previous result and snapshots of the
+school and river layers, all written by the analysis task.
+"""
+
+import json
+import os
+from collections import Counter
+
+# Sources whose changes can be patched into a previous result
+PATCHABLE_SOURCES = ("school", "river")
+
+
+def changed_geometries(old, new):
+    """Returns the values only found in ``old`` and those only found in ``new``.
+
+    Values are compared as multisets, so feature ids and the order of the
+    features do not matter: a moved feature is removed at its old position
+    and added at its new one.
+
+    :param old: Hashable geometry representations of the previous run, such
+        as WKB bytes.
+    :param new: Those of the current run.
+    :returns: The removed and the added values.
+    :rtype: tuple
+    """
+    old_counts = Counter(old)
+    new_counts = Counter(new)
+    return list((old_counts - new_counts).elements()), list((new_counts - old_counts).elements())
+
+
+class IncrementalState:
+    """State of the previous analysis run stored in ``directory``."""
+
+    STATE_FILE = "state.json"
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        """Returns the GeoPackage holding the previous ``result`` or the
+        snapshot of a patchable source."""
+        return os.path.join(self.directory, f"{name}.gpkg")
+
+    def load(self):
+        """Returns the state saved by :meth:`save`, or None."""
+        try:
+            with open(os.path.join(self.directory, self.STATE_FILE), encoding="utf-8") as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, settings, source_keys):
+        """Records the run whose result and snapshots have just been written.
+
+        :param settings: Analysis parameters, anything JSON serialisable.
+        :param source_keys: Maps source names to their cache keys.
+        """
+        with open(os.path.join(self.directory, self.STATE_FILE), "w", encoding="utf-8") as state_file:
+            json.dump({"settings": settings, "sources": source_keys}, state_file)
+
+    def invalidate(self):
+        """Forgets the previous run, for instance before its files are rewritten."""
+        try:
+            os.remove(os.path.join(self.directory, self.STATE_FILE))
+        except OSError:
+            pass
+
+    def changed_sources(self, settings, source_keys):
+        """Returns the sources changed since the previous run.
+
+        :returns: The names of the changed sources, or None when the previous
+            result cannot be patched: there is no previous run, the settings
+            differ or a source other than the :data:`PATCHABLE_SOURCES` changed.
+        :rtype: list
+        """
+        previous = self.load()
+        if previous is None or previous["settings"] != settings or set(previous["sources"]) != set(source_keys):
+            return None
+        if not os.path.exists(self.path("result")):
+            return None
+
+        changed = [name for name, key in source_keys.items() if previous["sources"][name] != key]
+        for name in changed:
+            if name not in PATCHABLE_SOURCES or not os.path.exists(self.path(name)):
+                return None
+        return changed
@@ -0,0 +1,456 @@
+"""Description of the suitability analysis as a graph of stages.
+
+The pipeline only describes which algorithm runs on which inputs; it does
+not depend on QGIS so that plans can be built and inspected anywhere.
+Executing a plan is left to :mod:`school_locator_task`.
+"""
+
+import math
+
+# Stage kinds understood by the planner
+KIND_CLIP = "clip"          # output is INPUT restricted to OVERLAY
+KIND_FILTER = "filter"      # output is the subset of INPUT matching an attribute expression
+KIND_SUBTRACT = "subtract"  # output is INPUT with some areas removed
+KIND_ATTRIBUTE = "attribute"  # output is INPUT with attributes added
+KIND_OTHER = "other"
+
+# Exclusion engines removing the zones near schools and rivers
+ENGINE_PROCESSING = "processing"
+ENGINE_SPATIAL_INDEX = "spatial_index"
+ENGINE_DISTANCE_ATTRIBUTES = "distance_attributes"
+ENGINE_RASTER = "raster"
+
+# Algorithm id of the spatial index exclusion engine
+SPATIAL_INDEX_EXCLUSION = "school_locator:spatial_index_exclusion"
+# Algorithm id of the nearest school and river distance attributes
+NEAREST_DISTANCES = "school_locator:nearest_distances"
+# Algorithm id of the raster engine
+RASTER_SUITABILITY = "school_locator:raster_suitability"
+# Algorithm id of the population within a catchment distance
+CATCHMENT_POPULATION = "school_locator:catchment_population"
+
+# Attributes holding the distance of a polygon to the nearest school and river
+SCHOOL_DISTANCE_FIELD = "school_dist"
+RIVER_DISTANCE_FIELD = "river_dist"
+# Attribute holding the population within the catchment distance of a feature
+CATCHMENT_FIELD = "catch_pop"
+
+
+class Stage:
+    """A single step of the pipeline.
+
+    :param name: Unique name of the stage, also used to name its output.
+    :param algorithm: Processing algorithm id run by the stage.
+    :param inputs: Maps algorithm parameters to the name of the source or
+        stage providing them, or to a list of such names.
+    :param parameters: Remaining, constant algorithm parameters.
+    :param kind: One of the ``KIND_*`` constants, used by the planner.
+    """
+
+    def __init__(self, name, algorithm, inputs, parameters=None, kind=KIND_OTHER, description=""):
+        self.name = name
+        self.algorithm = algorithm
+        self.inputs = dict(inputs)
+        self.parameters = dict(parameters or {})
+        self.kind = kind
+        self.description = description or name
+
+    def dependencies(self):
+        """Returns the names of the sources and stages this stage reads."""
+        names = []
+        for value in self.inputs.values():
+            names.extend(value if isinstance(value, (list, tuple)) else [value])
+        return names
+
+    def replace_input(self, old, new):
+        """Makes the stage read ``new`` wherever it used to read ``old``."""
+        for key, value in self.inputs.items():
+            if isinstance(value, (list, tuple)):
+                self.inputs[key] = [new if item == old else item for item in value]
+            elif value == old:
+                self.inputs[key] = new
+
+    def copy(self):
+        return Stage(self.name, self.algorithm, self.inputs, self.parameters, self.kind, self.description)
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, {self.algorithm!r}, {self.inputs!r})"
+
+
+class Pipeline:
+    """A directed acyclic graph of stages reading a set of named sources."""
+
+    def __init__(self, sources, stages, output):
+        self.sources = list(sources)
+        self.stages = {stage.name: stage for stage in stages}
+        self.output = output
+
+    def copy(self):
+        return Pipeline(self.sources, [stage.copy() for stage in self.stages.values()], self.output)
+
+    def consumers(self, name):
+        """Returns the stages reading the output of ``name``."""
+        return [stage for stage in self.stages.values() if name in stage.dependencies()]
+
+    def topological_order(self):
+        """Returns the stages sorted so that every stage follows its inputs.
+
+        Stages that do not depend on each other keep their declaration order.
+        """
+        ordered = []
+        done = set(self.sources)
+        pending = list(self.stages.values())
+        while pending:
+            ready = [stage for stage in pending if all(name in done for name in stage.dependencies())]
+            if not ready:
+                names = ", ".join(stage.name for stage in pending)
+                raise ValueError(f"Pipeline has a cycle or a missing input between: {names}")
+            for stage in ready:
+                ordered.append(stage)
+                done.add(stage.name)
+                pending.remove(stage)
+        return ordered
+
+    def bounds(self, name):
+        """Returns the sources the output of ``name`` is known to lie within."""
+        if name not in self.stages:
+            return set()
+
+        stage = self.stages[name]
+        if stage.kind == KIND_CLIP:
+            bounds = self.bounds(stage.inputs["INPUT"])
+            overlay = stage.inputs["OVERLAY"]
+            if overlay in self.sources:
+                bounds.add(overlay)
+            return bounds
+        if stage.kind in (KIND_FILTER, KIND_SUBTRACT, KIND_ATTRIBUTE):
+            return self.bounds(stage.inputs["INPUT"])
+        return set()
+
+    def remove_stage(self, name):
+        """Removes a single input stage, rewiring its consumers to its input."""
+        stage = self.stages.pop(name)
+        replacement = stage.inputs["INPUT"]
+        for consumer in self.consumers(name):
+            consumer.replace_input(name, replacement)
+        if self.output == name:
+            self.output = replacement
+
+
+class Plan:
+    """Stages to execute, in order, once the planner has optimised a pipeline.
+
+    :attr:`source_filters` maps source names to the attribute expression
+    their provider must apply when the source is opened.
+    """
+
+    def __init__(self, pipeline, notes, source_filters=None):
+        self.pipeline = pipeline
+        self.stages = pipeline.topological_order()
+        self.output = pipeline.output
+        self.notes = notes
+        self.source_filters = dict(source_filters or {})
+
+    def __iter__(self):
+        return iter(self.stages)
+
+    def __len__(self):
+        return len(self.stages)
+
+
+def _push_down_filters(pipeline, notes):
+    """Runs attribute filters before the clip feeding them.
+
+    Clipping keeps attribute values, so filtering first gives the same result
+    while the expensive geometry intersection only sees the matching rows.
+    """
+    changed = False
+    for stage in list(pipeline.stages.values()):
+        if stage.kind != KIND_FILTER:
+            continue
+
+        clip = pipeline.stages.get(stage.inputs["INPUT"])
+        if clip is None or clip.kind != KIND_CLIP or len(pipeline.consumers(clip.name)) != 1:
+            continue
+
+        for consumer in pipeline.consumers(stage.name):
+            consumer.replace_input(stage.name, clip.name)
+        if pipeline.output == stage.name:
+            pipeline.output = clip.name
+        stage.inputs["INPUT"] = clip.inputs["INPUT"]
+        clip.inputs["INPUT"] = stage.name
+
+        notes.append(f"Moved {stage.name} before {clip.name}")
+        changed = True
+    return changed
+
+
+def quote_field(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def filter_expression(stage):
+    """Returns the attribute expression applied by a filter stage."""
+    if 'EXPRESSION' in stage.parameters:
+        return stage.parameters['EXPRESSION']
+
+    field = quote_field(stage.parameters['FIELD'])
+    value = stage.parameters['VALUE']
+    if isinstance(value, str):
+        value = "'{}'".format(value.replace("'", "''"))
+    return f"{field} {stage.parameters['OPERATOR']} {value}"
+
+
+def _push_filters_into_sources(pipeline, notes, filterable_sources, source_filters):
+    """Turns filters reading a source into provider level subset filters.
+
+    Rows rejected by the provider are never read, so the stage disappears.
+    """
+    changed = False
+    for stage in list(pipeline.stages.values()):
+        source = stage.inputs.get("INPUT")
+        if stage.kind != KIND_FILTER or source not in filterable_sources:
+            continue
+        if len(pipeline.consumers(source)) != 1:
+            # Other stages read the rows the filter rejects
+            continue
+
+        expression = filter_expression(stage)
+        if source in source_filters:
+            expression = f"({source_filters[source]}) AND ({expression})"
+        source_filters[source] = expression
+        pipeline.remove_stage(stage.name)
+
+        notes.append(f"Pushed {stage.name} into the {source} provider")
+        changed = True
+    return changed
+
+
+def _remove_redundant_clips(pipeline, notes):
+    """Removes clips whose input already lies within the clip overlay."""
+    changed = False
+    for stage in list(pipeline.stages.values()):
+        if stage.kind != KIND_CLIP:
+            continue
+
+        if stage.inputs["OVERLAY"] in pipeline.bounds(stage.inputs["INPUT"]):
+            pipeline.remove_stage(stage.name)
+            notes.append(f"Skipped {stage.name}: input already clipped to {stage.inputs['OVERLAY']}")
+            changed = True
+    return changed
+
+
+def plan(pipeline, filterable_sources=()):
+    """Optimises ``pipeline`` and returns the resulting :class:`Plan`.
+
+    Filters reading one of the ``filterable_sources`` are pushed into the
+    provider of that source, see :attr:`Plan.source_filters`. The original
+    pipeline is left untouched.
+    """
+    pipeline = pipeline.copy()
+    notes = []
+    source_filters = {}
+    while (_push_down_filters(pipeline, notes)
+           or _push_filters_into_sources(pipeline, notes, filterable_sources, source_filters)
+           or _remove_redundant_clips(pipeline, notes)):
+        pass
+    return Plan(pipeline, notes, source_filters)
+
+
+def suitability_expression(population_threshold, school_distance, river_distance,
+                           population_field="population"):
+    """Returns the expression selecting the suitable polygons by their
+    distance attributes, see :func:`build_distance_pipeline`."""
+    # Distances are NULL when there is no school or river at all
+    return " AND ".join([
+        f"{quote_field(population_field)} >= {population_threshold!r}",
+        "({0} IS NULL OR {0} >= {1!r})".format(quote_field(SCHOOL_DISTANCE_FIELD), school_distance),
+        "({0} IS NULL OR {0} >= {1!r})".format(quote_field(RIVER_DISTANCE_FIELD), river_distance),
+    ])
+
+
+def max_buffer_error(distance, segments, simplify_tolerance=0.0, snap_grid=0.0):
+    """Returns the largest distance between the boundary of a buffer built
+    with these settings and the boundary of the exact buffer.
+
+    :param distance: Buffer distance.
+    :param segments: Segments approximating a quarter circle.
+    :param simplify_tolerance: Tolerance the buffered geometries were
+        simplified with beforehand.
+    :param snap_grid: Spacing of the grid the buffers were snapped to.
+    """
+    # Chords of an arc of pi / (2 * segments) stay within this of the circle
+    arc_error = distance * (1 - math.cos(math.pi / (4 * segments)))
+    return arc_error + simplify_tolerance + snap_grid * math.sqrt(2) / 2
+
+
+def add_catchment_stage(pipeline, distance, population_field="population"):
+    """Adds the population of the ``population`` source living within
+    ``distance`` of every output feature of ``pipeline``, as the attribute
+    :data:`CATCHMENT_FIELD`. Nothing is added when ``distance`` is not
+    positive.
+
+    :returns: ``pipeline``, whose output is the new stage.
+    :rtype: Pipeline
+    """
+    if distance <= 0:
+        return pipeline
+
+    pipeline.stages["catchment_population"] = Stage(
+        "catchment_population", CATCHMENT_POPULATION, {'INPUT': pipeline.output, 'POPULATION': "population"},
+        {'DISTANCE': distance, 'FIELD': population_field},
+        kind=KIND_ATTRIBUTE, description="Summing the population within the catchments")
+    pipeline.output = "catchment_population"
+    return pipeline
+
+
+def build_suitability_pipeline(population_threshold, school_distance, river_distance,
+                               engine=ENGINE_PROCESSING, population_field="population", segments=5,
+                               simplify_ratio=0.0, snap_grid=0.0, cell_size=0.0, catchment_distance=0.0):
+    """Builds the school suitability pipeline as written by the analyst.
+
+    The pipeline reads the ``population``, ``school``, ``river`` and
+    ``boundary`` sources; :func:`plan` removes its redundant work.
+
+    ``segments`` sets how many segments approximate a quarter circle of the
+    buffers. When ``simplify_ratio`` is positive, river lines are first
+    simplified, preserving their topology, with a tolerance of that
+    fraction of ``river_distance``; a positive ``snap_grid`` snaps the
+    buffered zones of the buffer overlay engine to a grid of that spacing.
+    :func:`max_buffer_error` bounds the resulting error.
+
+    With :data:`ENGINE_DISTANCE_ATTRIBUTES` the distances to the nearest
+    school and river are stored on the clipped population polygons, and the
+    thresholds are applied as a single attribute query. That stage does not
+    depend on the thresholds, so a stage cache reuses it across settings.
+    Polygons are then kept whole when they lie entirely beyond the distances
+    rather than being cut.
+
+    With :data:`ENGINE_RASTER` the population, boundary, schools and rivers
+    are burnt onto a grid of ``cell_size`` cells, chosen from the boundary
+    extent when 0, instead of being overlaid as vectors; the suitable areas
+    follow the cell edges.
+
+    A positive ``catchment_distance`` adds the population living within
+    that distance of every suitable area, see :func:`add_catchment_stage`.
+    """
+    prepare = []
+    rivers = "river"
+    if simplify_ratio > 0 and river_distance > 0:
+        prepare.append(
+            Stage("simplify_rivers", "native:simplifygeometries", {'INPUT': "river"},
+                  {'METHOD': 0, 'TOLERANCE': river_distance * simplify_ratio},
+                  description="Simplifying rivers"))
+        rivers = "simplify_rivers"
+
+    if engine == ENGINE_DISTANCE_ATTRIBUTES:
+        expression = suitability_expression(population_threshold, school_distance, river_distance,
+                                            population_field)
+        stages = [
+            Stage("clip_population", "native:clip",
+                  {'INPUT': "population", 'OVERLAY': "boundary"},
+                  kind=KIND_CLIP, description="Clipping population data"),
+            Stage("nearest_distances", NEAREST_DISTANCES,
+                  {'INPUT': "clip_population", 'SCHOOLS': "school", 'RIVERS': rivers},
+                  kind=KIND_ATTRIBUTE, description="Measuring distances to schools and rivers"),
+            Stage("select_suitable", "native:extractbyexpression",
+                  {'INPUT': "nearest_distances"}, {'EXPRESSION': expression},
+                  kind=KIND_FILTER, description="Selecting suitable areas"),
+            Stage("final_clip", "native:clip", {'INPUT': "select_suitable", 'OVERLAY': "boundary"},
+                  kind=KIND_CLIP, description="Clipping suitable areas"),
+        ]
+        return add_catchment_stage(Pipeline(["population", "school", "river", "boundary"], prepare + stages,
+                                            "final_clip"), catchment_distance, population_field)
+
+    if engine == ENGINE_RASTER:
+        # The boundary is burnt onto the grid, the population needs no vector clip
+        stages = [
+            Stage("extract_high_population", "native:extractbyattribute",
+                  {'INPUT': "population"},
+                  {'FIELD': population_field, 'OPERATOR': '>=', 'VALUE': population_threshold},
+                  kind=KIND_FILTER, description="Filtering high population areas"),
+            Stage("raster_suitability", RASTER_SUITABILITY,
+                  {'INPUT': "extract_high_population", 'SCHOOLS': "school", 'RIVERS': rivers,
+                   'BOUNDARY': "boundary"},
+                  {'SCHOOL_DISTANCE': school_distance, 'RIVER_DISTANCE': river_distance, 'CELL_SIZE': cell_size},
+                  description="Rasterising and measuring distances"),
+        ]
+        return add_catchment_stage(Pipeline(["population", "school", "river", "boundary"], prepare + stages,
+                                            "raster_suitability"), catchment_distance, population_field)
+
+    stages = prepare + [
+        Stage("clip_population", "native:clip",
+              {'INPUT': "population", 'OVERLAY': "boundary"},
+              kind=KIND_CLIP, description="Clipping population data"),
+        Stage("extract_high_population", "native:extractbyattribute",
+              {'INPUT': "clip_population"},
+              {'FIELD': population_field, 'OPERATOR': '>=', 'VALUE': population_threshold},
+              kind=KIND_FILTER, description="Filtering high population areas"),
+    ]
+
+    if engine == ENGINE_SPATIAL_INDEX:
+        stages.append(
+            Stage("spatial_index_exclusion", SPATIAL_INDEX_EXCLUSION,
+                  {'INPUT': "extract_high_population", 'SCHOOLS': "school", 'RIVERS': rivers},
+                  {'SCHOOL_DISTANCE': school_distance, 'RIVER_DISTANCE': river_distance, 'SEGMENTS': segments},
+                  kind=KIND_SUBTRACT, description="Removing zones near schools and rivers"))
+        suitable = "spatial_index_exclusion"
+    else:
+        stages.extend([
+            Stage("school_buffer", "native:buffer", {'INPUT': "school"},
+                  {'DISTANCE': school_distance, 'SEGMENTS': segments, 'DISSOLVE': True},
+                  description="Buffering existing schools"),
+            Stage("river_buffer", "native:buffer", {'INPUT': rivers},
+                  {'DISTANCE': river_distance, 'SEGMENTS': segments, 'DISSOLVE': True},
+                  description="Buffering rivers"),
+            Stage("merge", "native:mergevectorlayers", {'LAYERS': ["school_buffer", "river_buffer"]},
+                  description="Combining buffers"),
+        ])
+        zones = "merge"
+        if snap_grid > 0:
+            stages.append(
+                Stage("snap_buffers", "native:snappointstogrid", {'INPUT': "merge"},
+                      {'HSPACING': snap_grid, 'VSPACING': snap_grid, 'ZSPACING': 0, 'MSPACING': 0},
+                      description="Snapping buffers to the grid"))
+            zones = "snap_buffers"
+        stages.append(
+            Stage("difference", "native:difference",
+                  {'INPUT': "extract_high_population", 'OVERLAY': zones},
+                  kind=KIND_SUBTRACT, description="Removing buffered zones"))
+        suitable = "difference"
+
+    stages.append(
+        Stage("final_clip", "native:clip", {'INPUT': suitable, 'OVERLAY': "boundary"},
+              kind=KIND_CLIP, description="Clipping suitable areas"))
+
+    return add_catchment_stage(Pipeline(["population", "school", "river", "boundary"], stages, "final_clip"),
+                               catchment_distance, population_field)
+
+
+def build_distance_pipeline(population_threshold=None, population_field="population"):
+    """Builds the pipeline measuring how far population polygons are from
+    the nearest school and river.
+
+    The output holds the polygons of the boundary with at least
+    ``population_threshold`` people, or all of them when it is None, with
+    their distance attributes.
+    """
+    stages = [
+        Stage("clip_population", "native:clip",
+              {'INPUT': "population", 'OVERLAY': "boundary"},
+              kind=KIND_CLIP, description="Clipping population data"),
+    ]
+    measured = "clip_population"
+    if population_threshold is not None:
+        stages.append(
+            Stage("extract_high_population", "native:extractbyattribute",
+                  {'INPUT': "clip_population"},
+                  {'FIELD': population_field, 'OPERATOR': '>=', 'VALUE': population_threshold},
+                  kind=KIND_FILTER, description="Filtering high population areas"))
+        measured = "extract_high_population"
+
+    stages.append(
+        Stage("nearest_distances", NEAREST_DISTANCES,
+              {'INPUT': measured, 'SCHOOLS': "school", 'RIVERS': "river"},
+              kind=KIND_ATTRIBUTE, description="Measuring distances to schools and rivers"))
+    return Pipeline(["population", "school", "river", "boundary"], stages, "nearest_distances")
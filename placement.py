@@ -0,0 +1,74 @@
+"""Placement of new schools covering the most unserved population.
+
+This is the maximal covering location problem: given candidate sites and
+the population polygons each of them would serve, that is those within
+the catchment distance, choose the sites covering the largest population
+not already served by an existing school.
+
+Sites are chosen greedily, always taking the one adding the most newly
+covered population. Coverage only shrinks the gain of the other sites, so
+a gain computed before the last choice is an upper bound of the current
+one: the candidates wait in a priority queue under that stale bound and
+only the one on top is re-evaluated (lazy greedy evaluation), so most
+candidates are never looked at again after the first pass. The greedy
+choice covers at least 63 % of the best possible population.
+"""
+
+import heapq
+
+import numpy as np
+
+
+def candidate_points(extent, spacing):
+    """Yields the centres of the cells of a ``spacing`` grid over ``extent``.
+
+    :param extent: ``(x_min, y_min, x_max, y_max)``.
+    """
+    columns = max(1, int(np.ceil((extent[2] - extent[0]) / spacing)))
+    rows = max(1, int(np.ceil((extent[3] - extent[1]) / spacing)))
+    for row in range(rows):
+        for column in range(columns):
+            yield extent[0] + (column + 0.5) * spacing, extent[1] + (row + 0.5) * spacing
+
+
+def lazy_greedy(coverage, weights, count, covered=None):
+    """Chooses up to ``count`` candidates covering the largest total weight.
+
+    :param coverage: For every candidate, the array of the indexes of the
+        demand it covers.
+    :type coverage: list
+
+    :param weights: Weight of every demand, such as its population.
+    :param count: Number of candidates to choose.
+    :param covered: Boolean array of the demand covered beforehand, by the
+        existing schools.
+
+    :returns: The positions in ``coverage`` of the chosen candidates, in
+        the order they were chosen, with the weight each newly covered.
+        Fewer than ``count`` are returned once nothing is left to cover.
+    :rtype: list of tuple
+    """
+    weights = np.nan_to_num(np.asarray(weights, dtype=float))
+    covered = np.zeros(len(weights), dtype=bool) if covered is None else np.array(covered, dtype=bool)
+    coverage = [np.asarray(indexes, dtype=np.int64) for indexes in coverage]
+
+    def gain(position):
+        indexes = coverage[position]
+        return float(weights[indexes][~covered[indexes]].sum())
+
+    # Entries are (negated gain, position, number of choices when the gain was computed)
+    queue = [(-gain(position), position, 0) for position in range(len(coverage))]
+    heapq.heapify(queue)
+
+    chosen = []
+    while queue and len(chosen) < count:
+        negative_gain, position, computed = heapq.heappop(queue)
+        if negative_gain >= 0:
+            break
+        if computed == len(chosen):
+            # The gain is current and no other bound is higher
+            chosen.append((position, -negative_gain))
+            covered[coverage[position]] = True
+        else:
+            heapq.heappush(queue, (-gain(position), position, len(chosen)))
+    return chosen
@@ -0,0 +1,203 @@
+"""Execution of the suitability analysis inside a PostGIS database.
+
+The whole pipeline is a single SQL statement, so the database plans it as
+a whole: the boundary clip uses ``ST_Intersects`` and every population
+polygon only meets the schools and rivers found by ``ST_DWithin``, both
+answered from the GiST indexes of the tables. Only the final suitable
+polygons travel back to QGIS. All tables are expected to share the SRID
+of the population table, in units of the distances.
+
+The module only builds SQL and talks to a DB-API connection, such as one
+opened with ``psycopg2``; turning rows into a layer is left to the caller.
+"""
+
+import threading
+from contextlib import contextmanager
+
+# Sources of the analysis, in the order of the table arguments
+SOURCES = ("population", "school", "river", "boundary")
+
+# Rows fetched from the server at a time when streaming results
+BATCH_SIZE = 2000
+
+GEOMETRY_COLUMN_QUERY = """
+SELECT f_geometry_column, srid
+FROM geometry_columns
+WHERE f_table_schema = %(schema)s AND f_table_name = %(table)s
+"""
+
+SUITABILITY_QUERY = """
+WITH boundary AS (
+    SELECT ST_Union({boundary_geometry}) AS geom
+    FROM {boundary_table}
+),
+candidates AS (
+    SELECT p.{population_field} AS population,
+           ST_CollectionExtract(ST_Intersection(p.{population_geometry}, b.geom), 3) AS geom
+    FROM {population_table} p
+    JOIN boundary b ON ST_Intersects(p.{population_geometry}, b.geom)
+    WHERE p.{population_field} >= %(population_threshold)s
+),
+suitable AS (
+    SELECT c.population,
+           CASE WHEN z.geom IS NULL THEN c.geom ELSE ST_Difference(c.geom, z.geom) END AS geom
+    FROM candidates c
+    LEFT JOIN LATERAL (
+        SELECT ST_Union(zone) AS geom
+        FROM (
+            SELECT ST_Buffer(s.{school_geometry}, %(school_distance)s, %(buffer_style)s) AS zone
+            FROM {school_table} s
+            WHERE ST_DWithin(s.{school_geometry}, c.geom, %(school_distance)s)
+            UNION ALL
+            SELECT ST_Buffer(r.{river_geometry}, %(river_distance)s, %(buffer_style)s)
+            FROM {river_table} r
+            WHERE ST_DWithin(r.{river_geometry}, c.geom, %(river_distance)s)
+        ) zones
+    ) z ON true
+)
+SELECT population, ST_AsBinary(ST_Multi(ST_CollectionExtract(geom, 3))) AS geom
+FROM suitable
+WHERE NOT ST_IsEmpty(ST_CollectionExtract(geom, 3))
+"""
+
+
+def quote_identifier(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def split_table_name(name, default_schema="public"):
+    """Splits ``schema.table`` into its schema and table names."""
+    schema, _, table = name.rpartition(".")
+    return schema or default_schema, table
+
+
+def qualified_table(name):
+    """Returns ``schema.table`` quoted for use in SQL."""
+    return ".".join(quote_identifier(part) for part in split_table_name(name))
+
+
+def build_suitability_query(tables, geometry_columns, population_field="population"):
+    """Returns the SQL statement computing the suitable areas.
+
+    :param tables: Maps each of the :data:`SOURCES` to a ``schema.table``
+        name.
+    :type tables: dict
+
+    :param geometry_columns: Maps each of the :data:`SOURCES` to the name
+        of its geometry column.
+    :type geometry_columns: dict
+
+    :returns: The statement; its parameters are given by
+        :func:`query_parameters`. It returns the ``population`` and the
+        ``geom`` of every suitable area as multi-polygon WKB.
+    :rtype: str
+    """
+    identifiers = {"population_field": quote_identifier(population_field)}
+    for source in SOURCES:
+        identifiers[f"{source}_table"] = qualified_table(tables[source])
+        identifiers[f"{source}_geometry"] = quote_identifier(geometry_columns[source])
+    return SUITABILITY_QUERY.format(**identifiers)
+
+
+def query_parameters(population_threshold, school_distance, river_distance, segments=5):
+    """Returns the parameters of the statement of :func:`build_suitability_query`."""
+    return {
+        "population_threshold": population_threshold,
+        "school_distance": school_distance,
+        "river_distance": river_distance,
+        "buffer_style": f"quad_segs={segments}",
+    }
+
+
+def geometry_column(cursor, table):
+    """Returns the geometry column and SRID of ``table``.
+
+    :raises ValueError: When the table has no registered geometry column.
+    """
+    schema, name = split_table_name(table)
+    cursor.execute(GEOMETRY_COLUMN_QUERY, {"schema": schema, "table": name})
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Table {table} has no geometry column.")
+    return row[0], row[1]
+
+
+def execute_suitability_query(connection, tables, population_threshold, school_distance, river_distance,
+                              population_field="population", cursor_name=None, batch_size=BATCH_SIZE):
+    """Runs the analysis in the database of ``connection``.
+
+    With a ``cursor_name``, the rows are read through a server side cursor
+    of that name, ``batch_size`` rows at a time, so that client memory does
+    not grow with the result; the cursor lives until the transaction ends.
+
+    :returns: The SRID of the population table and a cursor returning the
+        ``(population, wkb)`` rows of the suitable areas.
+    :rtype: tuple
+    """
+    columns = {}
+    srid = None
+    with connection.cursor() as metadata_cursor:
+        for source in SOURCES:
+            columns[source], source_srid = geometry_column(metadata_cursor, tables[source])
+            if source == "population":
+                srid = source_srid
+
+    if cursor_name:
+        cursor = connection.cursor(name=cursor_name)
+        cursor.itersize = batch_size
+    else:
+        cursor = connection.cursor()
+    cursor.execute(build_suitability_query(tables, columns, population_field),
+                   query_parameters(population_threshold, school_distance, river_distance))
+    return srid, cursor
+
+
+class ConnectionPool:
+    """Database connections kept open for the lifetime of the plugin.
+
+    One thread safe ``psycopg2`` pool is created per set of connection
+    parameters on first use, holding at most ``max_connections``
+    connections, so repeated runs do not pay for connecting again.
+    """
+
+    def __init__(self, max_connections=4):
+        self.max_connections = max_connections
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, parameters):
+        """Lends a connection to the database reached with ``parameters``.
+
+        The transaction is rolled back when the connection is returned, and
+        connections which were closed meanwhile are discarded.
+        """
+        pool = self._pool(parameters)
+        connection = pool.getconn()
+        try:
+            yield connection
+        finally:
+            if pool.closed:
+                # The pool was closed while the connection was lent
+                connection.close()
+            else:
+                if not connection.closed:
+                    connection.rollback()
+                pool.putconn(connection, close=bool(connection.closed))
+
+    def close(self):
+        """Closes every connection of every pool."""
+        with self._lock:
+            for pool in self._pools.values():
+                pool.closeall()
+            self._pools.clear()
+
+    def _pool(self, parameters):
+        # psycopg2 is only needed by the database backend
+        from psycopg2.pool import ThreadedConnectionPool
+
+        key = tuple(sorted(parameters.items()))
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = ThreadedConnectionPool(1, self.max_connections, **parameters)
+            return self._pools[key]
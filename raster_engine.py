@@ -0,0 +1,203 @@
+"""Array operations of the raster suitability engine.
+
+The raster engine burns the sources onto a regular grid and works on
+cells rather than vertices: the distance to the nearest school and river
+is an exact Euclidean distance transform of the burnt cells, and the
+thresholds become boolean masks. Its run time grows with the number of
+cells whatever the complexity of the geometries, at the price of results
+that are only precise to the cell size.
+
+Grids may be larger than memory: the operations read and write them in
+blocks of rows, so they equally accept memory mapped arrays or any object
+giving the rows of a grid when sliced.
+
+This module only depends on NumPy; burning the layers and turning the
+final grid back into polygons is left to :mod:`raster_io`.
+"""
+
+import math
+
+import numpy as np
+
+# Cells along the longer side of the grid when no cell size is given
+DEFAULT_GRID_CELLS = 4096
+# Cells held in memory at a time by the block wise operations
+BLOCK_CELLS = 1 << 20
+
+
+class Grid:
+    """A north up grid of square cells.
+
+    :param x_min: Left edge of the grid.
+    :param y_max: Top edge of the grid.
+    :param cell_size: Width and height of a cell.
+    :param columns: Number of cells along a row.
+    :param rows: Number of cells along a column.
+    """
+
+    def __init__(self, x_min, y_max, cell_size, columns, rows):
+        self.x_min = x_min
+        self.y_max = y_max
+        self.cell_size = cell_size
+        self.columns = columns
+        self.rows = rows
+
+    @classmethod
+    def covering(cls, extent, cell_size):
+        """Returns the grid covering ``extent``, ``(x_min, y_min, x_max, y_max)``.
+
+        Cell edges fall on multiples of ``cell_size``, so that grids covering
+        different extents with the same cell size line up.
+        """
+        x_min = math.floor(extent[0] / cell_size) * cell_size
+        y_min = math.floor(extent[1] / cell_size) * cell_size
+        x_max = math.ceil(extent[2] / cell_size) * cell_size
+        y_max = math.ceil(extent[3] / cell_size) * cell_size
+        columns = max(1, int(round((x_max - x_min) / cell_size)))
+        rows = max(1, int(round((y_max - y_min) / cell_size)))
+        return cls(x_min, y_max, cell_size, columns, rows)
+
+    @property
+    def shape(self):
+        return self.rows, self.columns
+
+    def geotransform(self):
+        """Returns the GDAL geotransform of the grid."""
+        return self.x_min, self.cell_size, 0.0, self.y_max, 0.0, -self.cell_size
+
+
+def default_cell_size(extent, cells=DEFAULT_GRID_CELLS):
+    """Returns the cell size giving ``cells`` cells along the longer side of ``extent``."""
+    size = max(extent[2] - extent[0], extent[3] - extent[1])
+    return size / cells if size > 0 else 1.0
+
+
+def max_raster_error(cell_size):
+    """Returns the largest error of a distance measured on the grid.
+
+    Both the feature and the tested point are moved to the centre of their
+    cell, each by at most half a cell diagonal.
+    """
+    return cell_size * math.sqrt(2)
+
+
+def row_blocks(rows, columns, block_cells=BLOCK_CELLS):
+    """Yields the ``(start, stop)`` rows of the blocks of a grid, each block
+    holding whole rows and about ``block_cells`` cells."""
+    step = max(1, block_cells // max(columns, 1))
+    for start in range(0, rows, step):
+        yield start, min(start + step, rows)
+
+
+def _squared_distance_1d(values):
+    """Returns the one dimensional squared distance transform of every row.
+
+    This is the lower envelope algorithm of Felzenszwalb and Huttenlocher:
+    ``result[r, q]`` is the minimum over ``p`` of ``(q - p) ** 2 +
+    values[r, p]``. The scan along a row is sequential, so the loops run
+    over the columns and every step updates all the rows at once.
+    """
+    lines, length = values.shape
+    rows = np.arange(lines)
+    # Parabolas of the lower envelope and the boundaries between them
+    vertices = np.zeros((lines, length), dtype=np.int64)
+    boundaries = np.empty((lines, length + 1))
+    boundaries[:, 0] = -np.inf
+    boundaries[:, 1] = np.inf
+    top = np.zeros(lines, dtype=np.int64)
+
+    def intersection(q, vertex):
+        return (values[:, q] + q * q - values[rows, vertex] - vertex * vertex) / (2.0 * (q - vertex))
+
+    for q in range(1, length):
+        crossing = intersection(q, vertices[rows, top])
+        hidden = crossing <= boundaries[rows, top]
+        while hidden.any():
+            # The parabola on top of the envelope is hidden by the new one
+            top[hidden] -= 1
+            crossing[hidden] = intersection(q, vertices[rows, top])[hidden]
+            hidden &= crossing <= boundaries[rows, top]
+        top += 1
+        vertices[rows, top] = q
+        boundaries[rows, top] = crossing
+        boundaries[rows, top + 1] = np.inf
+
+    result = np.empty((lines, length))
+    current = np.zeros(lines, dtype=np.int64)
+    for q in range(length):
+        behind = boundaries[rows, current + 1] < q
+        while behind.any():
+            current[behind] += 1
+            behind &= boundaries[rows, current + 1] < q
+        vertex = vertices[rows, current]
+        result[:, q] = (q - vertex) ** 2 + values[rows, vertex]
+    return result
+
+
+def distance_transform(mask, cell_size=1.0, out=None, block_cells=BLOCK_CELLS):
+    """Returns the distance from every cell to the nearest cell set in ``mask``.
+
+    Distances are exact Euclidean distances between cell centres. The grid
+    is swept down and then up one block of rows at a time, carrying the
+    nearest set row of every column from block to block; a block is
+    finished on the way up, so only one block is ever held in memory.
+
+    :param mask: Grid of the cells holding a feature, non zero where set.
+    :type mask: numpy.ndarray
+
+    :param out: Float grid receiving the distances, such as a
+        :class:`numpy.memmap`; a new array when None.
+    :type out: numpy.ndarray
+
+    :returns: ``out``, infinite everywhere when ``mask`` is empty.
+    :rtype: numpy.ndarray
+    """
+    rows, columns = mask.shape
+    if out is None:
+        out = np.empty((rows, columns))
+    blocks = list(row_blocks(rows, columns, block_cells))
+
+    # Rows to the nearest set cell above, any value beyond the grid standing for infinity
+    far = rows + columns
+    above = np.full(columns, -far)
+    found = False
+    for start, stop in blocks:
+        block = np.asarray(mask[start:stop], dtype=bool)
+        found = found or block.any()
+        index = np.arange(start, stop)[:, np.newaxis]
+        nearest = np.maximum.accumulate(np.vstack([above, np.where(block, index, -far)]), axis=0)[1:]
+        out[start:stop] = index - nearest
+        above = nearest[-1]
+
+    if not found:
+        for start, stop in blocks:
+            out[start:stop] = np.inf
+        return out
+
+    below = np.full(columns, 2 * far)
+    for start, stop in reversed(blocks):
+        block = np.asarray(mask[start:stop], dtype=bool)
+        index = np.arange(start, stop)[:, np.newaxis]
+        flipped = np.where(block, index, 2 * far)[::-1]
+        nearest = np.minimum.accumulate(np.vstack([below, flipped]), axis=0)[1:][::-1]
+        column_distances = np.minimum(np.asarray(out[start:stop], dtype=float), nearest - index)
+        out[start:stop] = np.sqrt(_squared_distance_1d(column_distances ** 2)) * cell_size
+        below = nearest[0]
+    return out
+
+
+def suitable_cells(population_ids, boundary, school_distances, river_distances,
+                   school_distance, river_distance):
+    """Returns the population polygon owning every suitable cell.
+
+    :param population_ids: Grid of the population polygon ids, 0 outside
+        the high population polygons.
+    :param boundary: Boolean grid of the cells within the boundary.
+    :param school_distances: Grid of the distances to the nearest school.
+    :param river_distances: Grid of the distances to the nearest river.
+
+    :returns: ``population_ids`` with the unsuitable cells set to 0.
+    :rtype: numpy.ndarray
+    """
+    suitable = boundary & (school_distances >= school_distance) & (river_distances >= river_distance)
+    return np.where(suitable, population_ids, 0)
@@ -0,0 +1,212 @@
+"""GDAL reading and writing of the raster suitability engine.
+
+The layers are burnt onto tiled GeoTIFFs with GDAL, handed a block of rows
+at a time to the array operations of :mod:`raster_engine`, and the
+suitable cells are polygonized back into features carrying the attributes
+of the population polygon they lie in.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+from osgeo import gdal, ogr
+from qgis.core import QgsFeature, QgsGeometry
+
+from .exclusion_engine import memory_layer_like
+from .raster_engine import (Grid, default_cell_size, distance_transform, max_raster_error, row_blocks,
+                            suitable_cells)
+from .tiling import expand
+
+
+def ogr_layer(features, dataset, name, fields=()):
+    """Copies the geometries of ``features`` into a new layer of the OGR ``dataset``.
+
+    :param fields: Names of the integer attributes to create; every
+        feature then takes its position in ``features``, from 1, as value.
+    """
+    output = dataset.CreateLayer(name, srs=None)
+    for field in fields:
+        output.CreateField(ogr.FieldDefn(field, ogr.OFTInteger))
+    definition = output.GetLayerDefn()
+    for position, feature in enumerate(features, 1):
+        geometry = feature.geometry()
+        if geometry.isNull():
+            continue
+        out_feature = ogr.Feature(definition)
+        out_feature.SetGeometry(ogr.CreateGeometryFromWkb(bytes(geometry.asWkb())))
+        for field in fields:
+            out_feature.SetField(field, position)
+        output.CreateFeature(out_feature)
+    return output
+
+
+def create_raster(grid, path):
+    """Creates a tiled single band integer GeoTIFF covering ``grid`` at ``path``.
+
+    Tiles let GDAL read and write any window through its bounded block
+    cache, so the raster is never held in memory as a whole.
+    """
+    raster = gdal.GetDriverByName("GTiff").Create(
+        path, grid.columns, grid.rows, 1, gdal.GDT_Int32,
+        ["TILED=YES", "BLOCKXSIZE=256", "BLOCKYSIZE=256", "SPARSE_OK=TRUE", "BIGTIFF=IF_SAFER"])
+    raster.SetGeoTransform(grid.geotransform())
+    return raster
+
+
+class BandRows:
+    """The first band of a GDAL raster, read a window of rows at a time
+    when sliced like an array."""
+
+    def __init__(self, raster):
+        self.band = raster.GetRasterBand(1)
+        self.shape = (raster.RasterYSize, raster.RasterXSize)
+
+    def __getitem__(self, rows):
+        start, stop, _ = rows.indices(self.shape[0])
+        return self.band.ReadAsArray(0, start, self.shape[1], stop - start)
+
+
+def burn(features, grid, path, all_touched=False, attribute=None):
+    """Burns ``features`` onto a raster of ``grid`` written to ``path``.
+
+    Cells take the value of the ``attribute`` written by :func:`ogr_layer`,
+    or 1, and 0 where there is no feature. Without ``all_touched`` a cell
+    is only covered when its centre is.
+
+    :returns: The raster, see :func:`create_raster`.
+    :rtype: gdal.Dataset
+    """
+    dataset = ogr.GetDriverByName("Memory").CreateDataSource("burn")
+    source = ogr_layer(features, dataset, "burn", [attribute] if attribute else [])
+
+    raster = create_raster(grid, path)
+    options = [f"ALL_TOUCHED={'TRUE' if all_touched else 'FALSE'}"]
+    if attribute:
+        options.append(f"ATTRIBUTE={attribute}")
+        gdal.RasterizeLayer(raster, [1], source, options=options)
+    else:
+        gdal.RasterizeLayer(raster, [1], source, burn_values=[1], options=options)
+    return raster
+
+
+def polygonize(raster, feedback=None):
+    """Returns the polygons of the cells of ``raster`` sharing a non zero value.
+
+    :returns: Maps every value to the list of its polygons.
+    :rtype: dict
+    """
+    band = raster.GetRasterBand(1)
+    dataset = ogr.GetDriverByName("Memory").CreateDataSource("polygonize")
+    output = dataset.CreateLayer("polygons", srs=None)
+    output.CreateField(ogr.FieldDefn("value", ogr.OFTInteger))
+    # The band is its own mask, so cells set to 0 are not polygonized
+    gdal.Polygonize(band, band, output, 0, [])
+
+    polygons = {}
+    for feature in output:
+        if feedback and feedback.isCanceled():
+            break
+        geometry = QgsGeometry()
+        geometry.fromWkb(bytes(feature.GetGeometryRef().ExportToWkb()))
+        polygons.setdefault(feature.GetField(0), []).append(geometry)
+    return polygons
+
+
+def write_suitable_cells(suitable, population_ids, boundary, distances, school_distance, river_distance):
+    """Writes the suitable cells to the ``suitable`` raster, one block of rows at a time.
+
+    :param distances: The school and river distance grids, None when the
+        distance is not used.
+    """
+    band = suitable.GetRasterBand(1)
+    population_rows, boundary_rows = BandRows(population_ids), BandRows(boundary)
+    rows, columns = population_rows.shape
+    for start, stop in row_blocks(rows, columns):
+        school_distances, river_distances = [np.inf if values is None else values[start:stop]
+                                             for values in distances]
+        band.WriteArray(suitable_cells(population_rows[start:stop], boundary_rows[start:stop] > 0,
+                                       school_distances, river_distances, school_distance, river_distance),
+                        0, start)
+    band.FlushCache()
+
+
+def raster_suitability(parameters, feedback=None):
+    """Raster replacement for the vector overlays of the analysis.
+
+    ``parameters`` holds the high population polygons as ``INPUT``, the
+    ``SCHOOLS``, ``RIVERS`` and ``BOUNDARY`` layers, the ``SCHOOL_DISTANCE``
+    and ``RIVER_DISTANCE`` and the ``CELL_SIZE`` of the grid, chosen from
+    the boundary extent when 0. All layers must share a CRS.
+
+    The layers are burnt onto a grid covering the boundary and the zone
+    within the distances around it; distances come from
+    :func:`raster_engine.distance_transform` and the suitable cells are
+    turned back into polygons carrying the attributes of the population
+    polygon they lie in. Every intermediate grid lives in a temporary file,
+    tiled GeoTIFFs for the burnt layers and the suitable cells and memory
+    mapped arrays for the distances, and is processed in blocks of rows, so
+    memory use does not grow with the grid.
+
+    :returns: The suitable areas, with the fields of ``INPUT``.
+    :rtype: QgsVectorLayer
+    """
+    population_layer = parameters['INPUT']
+    school_distance = parameters['SCHOOL_DISTANCE']
+    river_distance = parameters['RIVER_DISTANCE']
+    boundary_extent = parameters['BOUNDARY'].extent()
+    extent = expand((boundary_extent.xMinimum(), boundary_extent.yMinimum(),
+                     boundary_extent.xMaximum(), boundary_extent.yMaximum()),
+                    max(school_distance, river_distance))
+    cell_size = parameters.get('CELL_SIZE') or default_cell_size(extent)
+    grid = Grid.covering(extent, cell_size)
+    if feedback:
+        feedback.pushInfo(f"Raster grid of {grid.columns} x {grid.rows} cells of {cell_size:g}, "
+                          f"distances within {max_raster_error(cell_size):.3g}")
+
+    output = memory_layer_like(population_layer, "raster_suitability")
+    population = list(population_layer.getFeatures())
+    with tempfile.TemporaryDirectory(prefix="school_locator_raster_") as directory:
+        population_ids = burn(population, grid, os.path.join(directory, "population.tif"), attribute="position")
+        boundary = burn(parameters['BOUNDARY'].getFeatures(), grid, os.path.join(directory, "boundary.tif"))
+        if feedback:
+            feedback.setProgress(20)
+
+        distances = []
+        for name, layer, distance in (("school", parameters['SCHOOLS'], school_distance),
+                                      ("river", parameters['RIVERS'], river_distance)):
+            if feedback and feedback.isCanceled():
+                break
+            if distance <= 0:
+                # Nothing is excluded, the distances are never needed
+                distances.append(None)
+                continue
+            burnt = burn(layer.getFeatures(), grid, os.path.join(directory, f"{name}.tif"), all_touched=True)
+            grid_distances = np.memmap(os.path.join(directory, f"{name}_distance.dat"), dtype=np.float32,
+                                       mode="w+", shape=grid.shape)
+            distances.append(distance_transform(BandRows(burnt), cell_size, grid_distances))
+            burnt = None
+            if feedback:
+                feedback.setProgress(20 + 20 * len(distances))
+
+        polygons = {}
+        if not (feedback and feedback.isCanceled()):
+            suitable = create_raster(grid, os.path.join(directory, "suitable.tif"))
+            write_suitable_cells(suitable, population_ids, boundary, distances, school_distance, river_distance)
+            polygons = polygonize(suitable, feedback)
+            suitable = None
+        # Close every file before the directory is removed
+        population_ids = boundary = distances = grid_distances = None
+
+    features = []
+    for position, parts in polygons.items():
+        out_feature = QgsFeature(output.fields())
+        out_feature.setGeometry(QgsGeometry.collectGeometry(parts))
+        out_feature.setAttributes(population[position - 1].attributes())
+        features.append(out_feature)
+
+    output.dataProvider().addFeatures(features)
+    output.updateExtents()
+    if feedback:
+        feedback.setProgress(100)
+    return output
@@ -1,15 +1,37 @@
-from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication
+from qgis.PyQt.QtCore import QSettings, QTimer, QTranslator, QCoreApplication
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction, QMessageBox
-from qgis.core import QgsProcessingFeedback, QgsProject, QgsVectorLayer, QgsDataSourceUri
-import psycopg2  # PostgreSQL adapter for Python
-import processing
+from qgis.core import Qgis, QgsApplication, QgsMessageLog, QgsProject, QgsVectorLayer
 import os.path
 
 # Initialize Qt resources from file resources.py
 from .resources import *
 # Import the code for the dialog
 from .school_locator_dialog import SchoolLocatorDialog
+from .pipeline import (ENGINE_DISTANCE_ATTRIBUTES, ENGINE_PROCESSING, ENGINE_RASTER, ENGINE_SPATIAL_INDEX,
+                       suitability_expression)
+from .incremental import IncrementalState
+from .postgis_backend import ConnectionPool
+from .stage_cache import StageCache
+from .school_locator_provider import SchoolLocatorProvider
+from .school_locator_task import (STORAGE_AUTO, STORAGE_GEOPACKAGE, STORAGE_MEMORY, PostgisTask, PreviewTask,
+                                  PlacementTask, ScoringTask, SchoolLocatorTask, SweepTask)
+from .scoring import ScoreWeights
+from .sweep import scenario_field, scenario_grid, value_range
+
+
+# Delay without parameter changes before the live preview is updated
+PREVIEW_DELAY_MS = 300
+
+# libpq SSL modes of the names and QgsDataSourceUri.SslMode values saved by QGIS
+SSL_MODES = {
+    'SslPrefer': 'prefer', '0': 'prefer',
+    'SslDisable': 'disable', '1': 'disable',
+    'SslAllow': 'allow', '2': 'allow',
+    'SslRequire': 'require', '3': 'require',
+    'SslVerifyCa': 'verify-ca', '4': 'verify-ca',
+    'SslVerifyFull': 'verify-full', '5': 'verify-full',
+}
 
 
 class SchoolLocator:
@@ -34,6 +56,23 @@ class SchoolLocator:
         self.actions = []
         self.menu = self.tr(u'&school_locator')
         self.dlg = None
+        self.provider = None
+        # Database connections reused by the PostGIS analysis runs
+        self.connection_pool = None
+        # Keep a reference to the running task so it is not garbage collected
+        self.task = None
+        # Step timings of the last analysis run
+        self.timing_feedback = None
+        # Cache of stage outputs, created on first use
+        self.cache = None
+        # Live preview: distance attributes of the polygons around the map extent
+        self.preview_timer = None
+        self.preview_task = None
+        self.preview_pending = False
+        self.preview_layer_id = None
+        # Layer paths and map CRS the preview layer was computed for, and the extent it covers
+        self.preview_key = None
+        self.preview_extent = None
 
     def tr(self, message):
         """Translate a string using Qt translation API."""
@@ -71,7 +110,15 @@ class SchoolLocator:
         self.actions.append(action)
         return action
 
+    def initProcessing(self):
+        """Registers the processing provider of the plugin."""
+        self.provider = SchoolLocatorProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
+
     def initGui(self):
+        self.initProcessing()
+        self.connection_pool = ConnectionPool()
+
         icon_path = ':/plugins/school_locator/icon.png'
         self.add_action(
             icon_path,
@@ -81,10 +128,28 @@ class SchoolLocator:
         )
 
     def unload(self):
+        if self.task is not None:
+            self.task.cancel()
+
+        if self.dlg is not None:
+            self.iface.mapCanvas().extentsChanged.disconnect(self.schedule_preview)
+            # The dialog may outlive the plugin, its changes must not update the preview
+            self.preview_timer.stop()
+            self.preview_timer.timeout.disconnect(self.update_preview)
+            self.dlg.close()
+        if self.preview_task is not None:
+            self.preview_task.cancel()
+
         for action in self.actions:
             self.iface.removePluginMenu(self.menu, action)
             self.iface.removeToolBarIcon(action)
 
+        QgsApplication.processingRegistry().removeProvider(self.provider)
+
+        if self.connection_pool is not None:
+            self.connection_pool.close()
+            self.connection_pool = None
+
     def run(self):
         if not self.dlg:
             self.dlg = SchoolLocatorDialog()
@@ -92,6 +157,34 @@ class SchoolLocator:
             # Connect dialog buttons to their respective methods
             self.dlg.btn_close.clicked.connect(self.close_dialog)
             self.dlg.btn_run_analysis.clicked.connect(self.run_analysis)
+            self.dlg.btn_save_timing_report.clicked.connect(self.save_timing_report)
+
+            self.dlg.combo_exclusion_engine.addItem(self.tr(u'Buffer overlay'), ENGINE_PROCESSING)
+            self.dlg.combo_exclusion_engine.addItem(self.tr(u'Spatial index'), ENGINE_SPATIAL_INDEX)
+            self.dlg.combo_exclusion_engine.addItem(self.tr(u'Distance attributes (whole polygons)'),
+                                                    ENGINE_DISTANCE_ATTRIBUTES)
+            self.dlg.combo_exclusion_engine.addItem(self.tr(u'Raster grid'), ENGINE_RASTER)
+
+            self.dlg.combo_intermediate_storage.addItem(self.tr(u'Memory'), STORAGE_MEMORY)
+            self.dlg.combo_intermediate_storage.addItem(self.tr(u'Temporary GeoPackage'), STORAGE_GEOPACKAGE)
+            self.dlg.combo_intermediate_storage.addItem(self.tr(u'Automatic (memory limit)'), STORAGE_AUTO)
+
+            # Connections saved in the QGIS data source manager
+            settings = QSettings()
+            settings.beginGroup('PostgreSQL/connections')
+            self.dlg.combo_postgis_connection.addItems(settings.childGroups())
+            settings.endGroup()
+
+            # Parameter changes only refilter the preview once they have settled
+            self.preview_timer = QTimer()
+            self.preview_timer.setSingleShot(True)
+            self.preview_timer.setInterval(PREVIEW_DELAY_MS)
+            self.preview_timer.timeout.connect(self.update_preview)
+            self.dlg.spin_population_threshold.valueChanged.connect(self.schedule_preview)
+            self.dlg.spin_distance_from_schools.valueChanged.connect(self.schedule_preview)
+            self.dlg.spin_river_distance_buffer.valueChanged.connect(self.schedule_preview)
+            self.dlg.chk_live_preview.toggled.connect(self.on_live_preview_toggled)
+            self.iface.mapCanvas().extentsChanged.connect(self.schedule_preview)
 
         self.dlg.show()
 
@@ -99,8 +192,14 @@ class SchoolLocator:
         self.dlg.close()
 
     def run_analysis(self):
-        """Runs the school suitability analysis using uploaded shapefiles."""
-        feedback = QgsProcessingFeedback()
+        """Starts the school suitability analysis in the background."""
+        if self.task is not None:
+            QMessageBox.warning(self.dlg, "Analysis Running", "An analysis is already running.")
+            return
+
+        if self.dlg.groupBoxDatabase.isChecked():
+            self.run_database_analysis()
+            return
 
         try:
             # Retrieve uploaded file paths
@@ -112,7 +211,7 @@ class SchoolLocator:
 
             # Validate that all files have been uploaded
             if not all([population_path, school_path, river_path, boundary_path]):
-                QMessageBox.warning(self.dlg, "Input Error", "Please upload all required shapefiles.")
+                QMessageBox.warning(self.dlg, "Input Error", "Please upload all required layers.")
                 return
 
             # Load layers
@@ -136,66 +235,269 @@ class SchoolLocator:
             population_threshold = self.dlg.spin_population_threshold.value()
             school_distance = self.dlg.spin_distance_from_schools.value()
             river_distance = self.dlg.spin_river_distance_buffer.value()
-
-            # Step 1: Clip population data to the boundary layer
-            clipped_population = processing.run("native:clip", {
-                'INPUT': population_layer,
-                'OVERLAY': boundary_layer,
-                'OUTPUT': 'memory:clipped_population'
-            }, feedback=feedback)['OUTPUT']
-
-            # Step 2: Filter high population areas
-            high_population = processing.run("native:extractbyattribute", {
-                'INPUT': clipped_population,
-                'FIELD': 'population',  # Adjust field name as needed
-                'OPERATOR': '>=',
-                'VALUE': population_threshold,
-                'OUTPUT': 'memory:high_population'
-            }, feedback=feedback)['OUTPUT']
-
-            # Step 3: Buffer existing schools
-            school_buffer = processing.run("native:buffer", {
-                'INPUT': school_layer,
-                'DISTANCE': school_distance,
-                'SEGMENTS': 5,
-                'DISSOLVE': True,
-                'OUTPUT': 'memory:school_buffer'
-            }, feedback=feedback)['OUTPUT']
-
-            # Step 4: Buffer rivers
-            river_buffer = processing.run("native:buffer", {
-                'INPUT': river_layer,
-                'DISTANCE': river_distance,
-                'SEGMENTS': 5,
-                'DISSOLVE': True,
-                'OUTPUT': 'memory:river_buffer'
-            }, feedback=feedback)['OUTPUT']
-
-            # Step 5: Combine buffers
-            combined_buffer = processing.run("native:mergevectorlayers", {
-                'LAYERS': [school_buffer, river_buffer],
-                'OUTPUT': 'memory:combined_buffer'
-            }, feedback=feedback)['OUTPUT']
-
-            # Step 6: Identify suitable areas by removing buffered zones from high population
-            suitable_areas = processing.run("native:difference", {
-                'INPUT': high_population,
-                'OVERLAY': combined_buffer,
-                'OUTPUT': 'memory:suitable_areas'
-            }, feedback=feedback)['OUTPUT']
-
-            # Step 7: Clip suitable areas to boundary
-            final_suitable_areas = processing.run("native:clip", {
-                'INPUT': suitable_areas,
-                'OVERLAY': boundary_layer,
-                'OUTPUT': 'memory:final_suitable_areas'
-            }, feedback=feedback)['OUTPUT']
-
-            # Add the final suitable areas to QGIS
-            suitable_layer = QgsVectorLayer(final_suitable_areas, "Suitable Areas", "memory")
-            QgsProject.instance().addMapLayer(suitable_layer)
-
-            QMessageBox.information(self.dlg, "Analysis Complete", "Suitable areas for schools have been identified.")
+            engine = self.dlg.combo_exclusion_engine.currentData()
+            storage = self.dlg.combo_intermediate_storage.currentData()
+            memory_limit = self.dlg.spin_memory_limit.value()
+            cache = self.stage_cache() if self.dlg.chk_use_cache.isChecked() else None
+            max_workers = self.dlg.spin_parallel_stages.value()
+            tile_size = self.dlg.spin_tile_size.value()
+            incremental = self.incremental_state() if self.dlg.chk_incremental.isChecked() else None
+            segments = self.dlg.spin_buffer_segments.value()
+            simplify_ratio = self.dlg.spin_simplify_ratio.value() / 100.0
+            snap_grid = self.dlg.spin_snap_grid.value()
+            cell_size = self.dlg.spin_cell_size.value()
+            catchment_distance = self.dlg.spin_catchment_radius.value()
+
+            # The task reopens the layers from their paths in its own thread
+            if self.dlg.groupBoxSweep.isChecked():
+                scenarios = scenario_grid(
+                    value_range(population_threshold, self.dlg.spin_population_threshold_to.value(),
+                                self.dlg.spin_population_threshold_step.value()),
+                    value_range(school_distance, self.dlg.spin_distance_from_schools_to.value(),
+                                self.dlg.spin_distance_from_schools_step.value()),
+                    value_range(river_distance, self.dlg.spin_river_distance_buffer_to.value(),
+                                self.dlg.spin_river_distance_buffer_step.value()))
+                self.task = SweepTask(dict(layer_paths), scenarios, storage, memory_limit,
+                                      cache, max_workers, tile_size)
+            elif self.dlg.groupBoxPlacement.isChecked():
+                self.task = PlacementTask(dict(layer_paths), self.dlg.spin_site_count.value(),
+                                          self.dlg.spin_catchment_distance.value(),
+                                          self.dlg.spin_candidate_spacing.value(), river_distance,
+                                          storage, memory_limit, cache, max_workers, tile_size)
+            elif self.dlg.groupBoxScoring.isChecked():
+                weights = ScoreWeights(self.dlg.spin_weight_population.value(), self.dlg.spin_weight_school.value(),
+                                       self.dlg.spin_weight_river.value())
+                self.task = ScoringTask(dict(layer_paths), population_threshold, school_distance, river_distance,
+                                        self.dlg.spin_top_count.value(), weights, storage, memory_limit,
+                                        cache, max_workers, tile_size)
+            else:
+                self.task = SchoolLocatorTask(dict(layer_paths), population_threshold,
+                                              school_distance, river_distance, engine,
+                                              storage, memory_limit, cache, max_workers, tile_size,
+                                              incremental, segments, simplify_ratio, snap_grid, cell_size,
+                                              catchment_distance)
+            self.start_task()
 
         except Exception as e:
             QMessageBox.critical(self.dlg, "Error", f"An error occurred: {str(e)}")
+
+    def run_database_analysis(self):
+        """Starts the analysis of PostGIS tables inside their database."""
+        tables = {
+            "population": self.dlg.line_population_table.text().strip(),
+            "school": self.dlg.line_school_table.text().strip(),
+            "river": self.dlg.line_river_table.text().strip(),
+            "boundary": self.dlg.line_boundary_table.text().strip(),
+        }
+        connection_name = self.dlg.combo_postgis_connection.currentText()
+        if not connection_name or not all(tables.values()):
+            QMessageBox.warning(self.dlg, "Input Error", "Please select a connection and all tables.")
+            return
+
+        self.task = PostgisTask(self.connection_parameters(connection_name), tables,
+                                self.dlg.spin_population_threshold.value(),
+                                self.dlg.spin_distance_from_schools.value(),
+                                self.dlg.spin_river_distance_buffer.value(), pool=self.connection_pool)
+        self.start_task()
+
+    def connection_parameters(self, name):
+        """Returns the psycopg2 connection parameters of a saved PostgreSQL connection."""
+        settings = QSettings()
+        settings.beginGroup(f'PostgreSQL/connections/{name}')
+        keys = {'service': 'service', 'host': 'host', 'port': 'port', 'database': 'dbname',
+                'username': 'user', 'password': 'password', 'sslmode': 'sslmode'}
+        parameters = {}
+        for key, parameter in keys.items():
+            value = settings.value(key, '')
+            if value:
+                parameters[parameter] = str(value)
+        settings.endGroup()
+
+        if 'sslmode' in parameters:
+            parameters['sslmode'] = SSL_MODES.get(parameters['sslmode'], parameters['sslmode'])
+        return parameters
+
+    def start_task(self):
+        """Connects the dialog to :attr:`task` and starts it in the background."""
+        self.task.stepChanged.connect(self.on_analysis_step)
+        self.task.stepFinished.connect(self.on_analysis_step_finished)
+        self.task.progressChanged.connect(self.on_analysis_progress)
+        self.task.taskCompleted.connect(self.on_analysis_completed)
+        self.task.taskTerminated.connect(self.on_analysis_terminated)
+
+        self.dlg.btn_run_analysis.setEnabled(False)
+        self.dlg.progress_bar.setValue(0)
+        self.dlg.lbl_status_message.setText("Status: Starting analysis...")
+        QgsApplication.taskManager().addTask(self.task)
+
+    def schedule_preview(self, *args):
+        """Updates the live preview once the parameters stop changing."""
+        if self.dlg.chk_live_preview.isChecked():
+            self.preview_timer.start()
+
+    def on_live_preview_toggled(self, checked):
+        if checked:
+            self.schedule_preview()
+        else:
+            self.preview_timer.stop()
+            self.remove_preview_layer()
+
+    def update_preview(self):
+        """Shows the suitable areas of the current parameters around the map extent.
+
+        The distance attributes of the polygons are computed in the background
+        for an area larger than the map extent; until the map leaves that
+        area or the layers change, parameter changes only refilter them.
+        """
+        if not self.dlg.chk_live_preview.isChecked():
+            return
+
+        layer_paths = self.dlg.get_layer_paths()
+        if not all(layer_paths.values()):
+            self.dlg.lbl_status_message.setText("Status: Upload all layers to preview the analysis")
+            return
+
+        canvas = self.iface.mapCanvas()
+        extent = canvas.extent()
+        crs = canvas.mapSettings().destinationCrs()
+        key = (tuple(sorted(layer_paths.items())), crs.authid())
+
+        preview_layer = QgsProject.instance().mapLayer(self.preview_layer_id) if self.preview_layer_id else None
+        if preview_layer is not None and self.preview_key == key and self.preview_extent.contains(extent):
+            self.apply_preview_filter(preview_layer)
+            return
+
+        if self.preview_task is not None:
+            # Updated again once the running preview has finished
+            self.preview_pending = True
+            return
+
+        # Leave room to pan without computing the distances again
+        requested = extent.buffered(max(extent.width(), extent.height()) / 2)
+        self.preview_task = PreviewTask(dict(layer_paths), requested, crs, QgsProject.instance().transformContext())
+        self.preview_task.taskCompleted.connect(lambda: self.on_preview_finished(key, requested))
+        self.preview_task.taskTerminated.connect(lambda: self.on_preview_finished(key, requested))
+        self.preview_pending = False
+        self.dlg.lbl_status_message.setText("Status: Computing the preview...")
+        QgsApplication.taskManager().addTask(self.preview_task)
+
+    def on_preview_finished(self, key, extent):
+        """Replaces the preview layer with the result of the preview task."""
+        task = self.preview_task
+        self.preview_task = None
+
+        if task.result_layer is None:
+            if task.exception is not None and not task.isCanceled():
+                self.dlg.lbl_status_message.setText(f"Status: Preview failed: {task.exception}")
+        elif self.dlg.chk_live_preview.isChecked():
+            self.remove_preview_layer()
+            QgsProject.instance().addMapLayer(task.result_layer)
+            self.preview_layer_id = task.result_layer.id()
+            self.preview_key = key
+            self.preview_extent = extent
+            self.apply_preview_filter(task.result_layer)
+
+        if self.preview_pending:
+            self.schedule_preview()
+
+    def apply_preview_filter(self, layer):
+        """Filters the preview polygons with the parameters of the dialog."""
+        layer.setSubsetString(suitability_expression(self.dlg.spin_population_threshold.value(),
+                                                     self.dlg.spin_distance_from_schools.value(),
+                                                     self.dlg.spin_river_distance_buffer.value()))
+        layer.triggerRepaint()
+        self.dlg.lbl_status_message.setText(f"Status: Preview shows {layer.featureCount()} suitable areas")
+
+    def remove_preview_layer(self):
+        if self.preview_layer_id and QgsProject.instance().mapLayer(self.preview_layer_id):
+            QgsProject.instance().removeMapLayer(self.preview_layer_id)
+        self.preview_layer_id = None
+        self.preview_key = None
+        self.preview_extent = None
+
+    def stage_cache(self):
+        """Returns the cache of stage outputs shared by all analysis runs."""
+        directory = QSettings().value(
+            'school_locator/cache_directory',
+            os.path.join(QgsApplication.qgisSettingsDirPath(), 'school_locator', 'cache'))
+        max_bytes = self.dlg.spin_cache_size.value() * 1024 * 1024
+
+        if self.cache is None or self.cache.directory != directory:
+            self.cache = StageCache(directory, max_bytes)
+        self.cache.max_bytes = max_bytes
+        return self.cache
+
+    def incremental_state(self):
+        """Returns the state of the previous run used to patch its result."""
+        return IncrementalState(os.path.join(QgsApplication.qgisSettingsDirPath(), 'school_locator', 'incremental'))
+
+    def on_analysis_step(self, description):
+        """Shows the step currently executed by the analysis task."""
+        self.dlg.lbl_status_message.setText(f"Status: {description}")
+
+    def on_analysis_progress(self, progress):
+        """Shows the overall progress of the analysis task."""
+        self.dlg.progress_bar.setValue(int(progress))
+
+    def on_analysis_step_finished(self, summary):
+        """Logs the timing summary of a finished analysis step."""
+        QgsMessageLog.logMessage(summary, "School Locator", Qgis.Info)
+        self.dlg.lbl_status_message.setText(f"Status: {summary}")
+
+    def on_analysis_completed(self):
+        """Adds the result layer to the project once the task has finished."""
+        task = self._finish_task()
+        QgsProject.instance().addMapLayer(task.result_layer)
+        if getattr(task, "school_catchments", None) is not None:
+            QgsProject.instance().addMapLayer(task.school_catchments)
+
+        if isinstance(task, SweepTask):
+            for index, (scenario, count) in enumerate(zip(task.scenarios, task.scenario_counts)):
+                QgsMessageLog.logMessage(f"{scenario_field(index)}: {scenario.describe()}: {count} suitable areas",
+                                         "School Locator", Qgis.Info)
+        elif isinstance(task, PlacementTask):
+            existing, total = task.covered_population
+            QgsMessageLog.logMessage(f"{task.result_layer.featureCount()} new schools raise the population served "
+                                     f"from {existing:g} to {total:g}", "School Locator", Qgis.Info)
+        elif isinstance(task, ScoringTask):
+            QgsMessageLog.logMessage(f"Ranked {len(task.ranking)} sites by {task.weights.describe()}",
+                                     "School Locator", Qgis.Info)
+
+        slowest = self.timing_feedback.slowest_step()
+        if slowest is None:
+            self.dlg.lbl_status_message.setText("Status: Analysis complete (all results cached)")
+        else:
+            self.dlg.lbl_status_message.setText(
+                f"Status: Analysis complete in {self.timing_feedback.total_time():.1f} s "
+                f"(slowest step: {slowest['name']}, {slowest['wall_time']:.1f} s)"
+            )
+        QMessageBox.information(self.dlg, "Analysis Complete", "Suitable areas for schools have been identified.")
+
+    def on_analysis_terminated(self):
+        """Reports a failed or canceled analysis task."""
+        task = self._finish_task()
+        if task.exception is not None and not task.isCanceled():
+            self.dlg.lbl_status_message.setText("Status: Analysis failed")
+            QMessageBox.critical(self.dlg, "Error", f"An error occurred: {str(task.exception)}")
+        else:
+            self.dlg.lbl_status_message.setText("Status: Analysis canceled")
+
+    def _finish_task(self):
+        task = self.task
+        self.task = None
+        self.timing_feedback = task.feedback
+        self.dlg.btn_run_analysis.setEnabled(True)
+        self.dlg.btn_save_timing_report.setEnabled(bool(task.feedback and task.feedback.steps))
+        return task
+
+    def save_timing_report(self):
+        """Saves the step timings of the last analysis as a JSON report."""
+        if not self.timing_feedback:
+            return
+
+        file_path = self.dlg.get_timing_report_path()
+        if file_path:
+            try:
+                self.timing_feedback.write_report(file_path)
+            except OSError as e:
+                QMessageBox.critical(self.dlg, "Error", f"Could not save the timing report: {str(e)}")
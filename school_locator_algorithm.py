@@ -0,0 +1,136 @@
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (QgsFeatureSink, QgsProcessing, QgsProcessingAlgorithm, QgsProcessingException,
+                       QgsProcessingParameterDistance, QgsProcessingParameterEnum,
+                       QgsProcessingParameterFeatureSink, QgsProcessingParameterField,
+                       QgsProcessingParameterNumber, QgsProcessingParameterVectorLayer)
+
+from .pipeline import (ENGINE_DISTANCE_ATTRIBUTES, ENGINE_PROCESSING, ENGINE_RASTER, ENGINE_SPATIAL_INDEX,
+                       build_suitability_pipeline, plan)
+from .school_locator_task import run_plan_in_memory
+
+
+class SchoolSuitabilityAlgorithm(QgsProcessingAlgorithm):
+    """Processing algorithm running the school suitability analysis.
+
+    Exposes the pipeline of the plugin dialog to the Graphical Modeler,
+    ``processing.run`` and the batch processing interface.
+    """
+
+    POPULATION = 'POPULATION'
+    POPULATION_FIELD = 'POPULATION_FIELD'
+    POPULATION_THRESHOLD = 'POPULATION_THRESHOLD'
+    SCHOOLS = 'SCHOOLS'
+    SCHOOL_DISTANCE = 'SCHOOL_DISTANCE'
+    RIVERS = 'RIVERS'
+    RIVER_DISTANCE = 'RIVER_DISTANCE'
+    BOUNDARY = 'BOUNDARY'
+    ENGINE = 'ENGINE'
+    SEGMENTS = 'SEGMENTS'
+    SIMPLIFY_RATIO = 'SIMPLIFY_RATIO'
+    SNAP_GRID = 'SNAP_GRID'
+    CELL_SIZE = 'CELL_SIZE'
+    CATCHMENT_DISTANCE = 'CATCHMENT_DISTANCE'
+    OUTPUT = 'OUTPUT'
+
+    ENGINES = [ENGINE_PROCESSING, ENGINE_SPATIAL_INDEX, ENGINE_DISTANCE_ATTRIBUTES, ENGINE_RASTER]
+
+    def tr(self, message):
+        return QCoreApplication.translate('SchoolSuitabilityAlgorithm', message)
+
+    def createInstance(self):
+        return SchoolSuitabilityAlgorithm()
+
+    def name(self):
+        return 'schoolsuitability'
+
+    def displayName(self):
+        return self.tr('School suitability analysis')
+
+    def shortHelpString(self):
+        return self.tr('Finds the high population areas within the boundary which are farther than '
+                       'the given distances from existing schools and from rivers.')
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.POPULATION, self.tr('Population layer'), [QgsProcessing.TypeVectorPolygon]))
+        self.addParameter(QgsProcessingParameterField(
+            self.POPULATION_FIELD, self.tr('Population field'), 'population', self.POPULATION,
+            QgsProcessingParameterField.Numeric))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.POPULATION_THRESHOLD, self.tr('Population threshold'),
+            QgsProcessingParameterNumber.Double, 0, minValue=0))
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.SCHOOLS, self.tr('Existing schools'), [QgsProcessing.TypeVectorAnyGeometry]))
+        self.addParameter(QgsProcessingParameterDistance(
+            self.SCHOOL_DISTANCE, self.tr('Distance from schools'), 0, self.SCHOOLS, minValue=0))
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.RIVERS, self.tr('Rivers'), [QgsProcessing.TypeVectorAnyGeometry]))
+        self.addParameter(QgsProcessingParameterDistance(
+            self.RIVER_DISTANCE, self.tr('Distance from rivers'), 0, self.RIVERS, minValue=0))
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.BOUNDARY, self.tr('Boundary layer'), [QgsProcessing.TypeVectorPolygon]))
+        self.addParameter(QgsProcessingParameterEnum(
+            self.ENGINE, self.tr('Exclusion engine'),
+            [self.tr('Buffer overlay'), self.tr('Spatial index'), self.tr('Distance attributes (whole polygons)'),
+             self.tr('Raster grid')],
+            defaultValue=0))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.SEGMENTS, self.tr('Buffer segments per quarter circle'),
+            QgsProcessingParameterNumber.Integer, 5, minValue=1))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.SIMPLIFY_RATIO, self.tr('River simplification tolerance, as a fraction of the river distance'),
+            QgsProcessingParameterNumber.Double, 0, minValue=0, maxValue=0.5))
+        self.addParameter(QgsProcessingParameterDistance(
+            self.SNAP_GRID, self.tr('Buffer snapping grid (buffer overlay only)'), 0, self.RIVERS, minValue=0))
+        self.addParameter(QgsProcessingParameterDistance(
+            self.CELL_SIZE, self.tr('Raster cell size, 0 for automatic (raster grid only)'), 0, self.BOUNDARY,
+            minValue=0))
+        self.addParameter(QgsProcessingParameterDistance(
+            self.CATCHMENT_DISTANCE, self.tr('Sum the population within this distance, 0 to skip'), 0,
+            self.POPULATION, minValue=0))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT, self.tr('Suitable areas'), QgsProcessing.TypeVectorPolygon))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        sources = {
+            "population": self.parameterAsVectorLayer(parameters, self.POPULATION, context),
+            "school": self.parameterAsVectorLayer(parameters, self.SCHOOLS, context),
+            "river": self.parameterAsVectorLayer(parameters, self.RIVERS, context),
+            "boundary": self.parameterAsVectorLayer(parameters, self.BOUNDARY, context),
+        }
+        for name, layer in sources.items():
+            if layer is None:
+                raise QgsProcessingException(self.tr('Invalid {} layer').format(name))
+
+        # The provider filter push down is not used, the input layers belong to the caller
+        analysis_plan = plan(build_suitability_pipeline(
+            self.parameterAsDouble(parameters, self.POPULATION_THRESHOLD, context),
+            self.parameterAsDouble(parameters, self.SCHOOL_DISTANCE, context),
+            self.parameterAsDouble(parameters, self.RIVER_DISTANCE, context),
+            self.ENGINES[self.parameterAsEnum(parameters, self.ENGINE, context)],
+            self.parameterAsString(parameters, self.POPULATION_FIELD, context),
+            self.parameterAsInt(parameters, self.SEGMENTS, context),
+            self.parameterAsDouble(parameters, self.SIMPLIFY_RATIO, context),
+            self.parameterAsDouble(parameters, self.SNAP_GRID, context),
+            self.parameterAsDouble(parameters, self.CELL_SIZE, context),
+            self.parameterAsDouble(parameters, self.CATCHMENT_DISTANCE, context),
+        ))
+        for note in analysis_plan.notes:
+            feedback.pushInfo(note)
+
+        try:
+            result = run_plan_in_memory(analysis_plan, sources, feedback, context)
+        except RuntimeError as e:
+            raise QgsProcessingException(str(e))
+
+        sink, dest_id = self.parameterAsSink(parameters, self.OUTPUT, context, result.fields(),
+                                             result.wkbType(), result.sourceCrs())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        for feature in result.getFeatures():
+            if feedback.isCanceled():
+                break
+            sink.addFeature(feature, QgsFeatureSink.FastInsert)
+
+        return {self.OUTPUT: dest_id}
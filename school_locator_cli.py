@@ -0,0 +1,302 @@
+"""Headless command line entry point for batch suitability runs.
+
+Runs the same analysis pipeline as the plugin dialog without starting the
+QGIS desktop. From the directory containing the plugin::
+
+    python -m school_locator.school_locator_cli \\
+        --population population.shp --schools schools.shp \\
+        --rivers rivers.shp --boundary boundary.shp \\
+        --population-threshold 500 --school-distance 2000 \\
+        --river-distance 100 --output suitable_areas.gpkg
+
+Inputs may be shapefiles, GeoPackages, FlatGeobuf or GeoParquet files; a
+layer of a multi-layer file is given as ``data.gpkg|layername=schools``.
+
+Many scenarios can share a single QGIS start up and stage cache by listing
+them in a CSV file with ``population_threshold``, ``school_distance``,
+``river_distance`` and ``output`` columns, passed with ``--scenarios``.
+
+Ranges given with ``--population-threshold-range``, ``--school-distance-range``
+or ``--river-distance-range`` run a parameter sweep instead: every
+combination is evaluated in a single pass and written to ``--output`` as
+one layer with a flag attribute per scenario.
+
+With ``--top`` the candidates meeting the population threshold are ranked
+by a score weighted with ``--weights`` instead, and the best ones are
+written to ``--output`` with their ``score`` and ``rank``.
+
+With ``--place`` the given number of new school sites covering the most
+population not yet within ``--catchment`` of a school are written to
+``--output`` instead, as points.
+
+With ``--catchment-population`` the population within ``--catchment`` of
+every suitable area is added to ``--output``, and that of every existing
+school is written next to it, with a ``_school_catchments`` suffix.
+
+Invalid arguments, including missing input files, exit with status 2
+before QGIS is started; the exit status is 1 when any run fails.
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+from .scoring import ScoreWeights
+from .sweep import scenario_field, scenario_grid, value_range
+
+
+def non_negative(value):
+    """Parses a number which must not be negative."""
+    number = float(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative: {value}")
+    return number
+
+
+def positive_int(value):
+    """Parses a whole number of at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+    return number
+
+
+def layer_file(source):
+    """Returns the file of a layer source such as ``data.gpkg|layername=schools``."""
+    return source.split("|", 1)[0]
+
+
+def parse_arguments(argv=None):
+    """Parses and checks the command line, exiting with status 2 when it is invalid."""
+    parser = argparse.ArgumentParser(
+        description="Locate suitable areas for new schools without the QGIS desktop.")
+    parser.add_argument("--population", required=True, help="Population polygon layer")
+    parser.add_argument("--schools", required=True, help="Existing school layer")
+    parser.add_argument("--rivers", required=True, help="River layer")
+    parser.add_argument("--boundary", required=True, help="Boundary polygon layer")
+
+    parser.add_argument("--population-threshold", type=int, default=0,
+                        help="Minimum population of a suitable area")
+    parser.add_argument("--school-distance", type=non_negative, default=0.0,
+                        help="Distance to keep from existing schools, in layer units")
+    parser.add_argument("--river-distance", type=non_negative, default=0.0,
+                        help="Distance to keep from rivers, in layer units")
+    parser.add_argument("--output", help="Output file, its extension selects the format")
+    parser.add_argument("--scenarios", help="CSV file listing the scenarios to run")
+    for name in ("population-threshold", "school-distance", "river-distance"):
+        parser.add_argument(f"--{name}-range", type=non_negative, nargs=3, metavar=("START", "STOP", "STEP"),
+                            help=f"Sweep the {name.replace('-', ' ')} over a range of values")
+    parser.add_argument("--top", type=positive_int, help="Rank the candidates and keep this many best sites")
+    parser.add_argument("--weights", type=non_negative, nargs=3, default=[1.0, 1.0, 1.0],
+                        metavar=("POPULATION", "SCHOOLS", "RIVERS"), help="Weights of the site score")
+    parser.add_argument("--place", type=positive_int, help="Place this many new schools serving the most population")
+    parser.add_argument("--catchment", type=non_negative, default=2000.0,
+                        help="Distance within which a school serves the population, in layer units")
+    parser.add_argument("--catchment-population", action="store_true",
+                        help="Sum the population within --catchment of the suitable areas and schools")
+    parser.add_argument("--candidate-spacing", type=non_negative, default=0.0,
+                        help="Spacing of the candidate sites, 0 for half the catchment distance")
+
+    parser.add_argument("--engine", choices=["processing", "spatial_index", "distance_attributes", "raster"],
+                        default="processing",
+                        help="Engine removing the zones near schools and rivers")
+    parser.add_argument("--storage", choices=["memory", "geopackage", "auto"], default="memory",
+                        help="Where intermediate outputs are stored")
+    parser.add_argument("--memory-limit", type=positive_int, default=4096,
+                        help="Memory limit in MB of the automatic storage mode")
+    parser.add_argument("--workers", type=positive_int, default=1,
+                        help="Number of stages or tiles run at the same time")
+    parser.add_argument("--tile-size", type=non_negative, default=0.0,
+                        help="Size of the processing tiles, 0 to disable tiling")
+    parser.add_argument("--cache-dir", help="Directory caching stage outputs between runs")
+    parser.add_argument("--cache-size", type=positive_int, default=2048, help="Cache size limit in MB")
+    parser.add_argument("--segments", type=positive_int, default=5, help="Segments per quarter circle of the buffers")
+    parser.add_argument("--simplify-ratio", type=non_negative, default=0.0,
+                        help="Simplify rivers with this fraction of the river distance as tolerance")
+    parser.add_argument("--snap-grid", type=non_negative, default=0.0, help="Snap the buffers to a grid of this spacing")
+    parser.add_argument("--cell-size", type=non_negative, default=0.0,
+                        help="Cell size of the raster engine, 0 to derive it from the boundary extent")
+    parser.add_argument("--incremental-dir",
+                        help="Directory keeping the last result, patched when only schools or rivers change")
+    parser.add_argument("--timing-report", help="Write the step timings of each run to this JSON file")
+
+    arguments = parser.parse_args(argv)
+    for name in ("population", "schools", "rivers", "boundary", "scenarios"):
+        source = getattr(arguments, name)
+        if source and not os.path.exists(layer_file(source)):
+            parser.error(f"--{name} file does not exist: {layer_file(source)}")
+    if not arguments.output and not arguments.scenarios:
+        parser.error("one of --output or --scenarios is required")
+    if is_sweep(arguments) and (arguments.scenarios or not arguments.output):
+        parser.error("a parameter sweep requires --output and cannot be combined with --scenarios")
+    if arguments.top is not None and (is_sweep(arguments) or arguments.scenarios or not arguments.output):
+        parser.error("--top requires --output and cannot be combined with a sweep or --scenarios")
+    if arguments.place is not None and (arguments.top is not None or is_sweep(arguments) or arguments.scenarios
+                                        or not arguments.output):
+        parser.error("--place requires --output and cannot be combined with --top, a sweep or --scenarios")
+    return arguments
+
+
+def is_sweep(arguments):
+    return any([arguments.population_threshold_range, arguments.school_distance_range,
+                arguments.river_distance_range])
+
+
+def sweep_scenarios(arguments):
+    """Returns the scenarios of the parameter sweep."""
+    def values(value_range_arguments, value):
+        return value_range(*value_range_arguments) if value_range_arguments else [value]
+
+    return scenario_grid(values(arguments.population_threshold_range, arguments.population_threshold),
+                         values(arguments.school_distance_range, arguments.school_distance),
+                         values(arguments.river_distance_range, arguments.river_distance))
+
+
+def read_scenarios(arguments):
+    """Returns the scenarios to run as dictionaries of parameters."""
+    if not arguments.scenarios:
+        return [{
+            "population_threshold": arguments.population_threshold,
+            "school_distance": arguments.school_distance,
+            "river_distance": arguments.river_distance,
+            "output": arguments.output,
+        }]
+
+    with open(arguments.scenarios, newline="", encoding="utf-8") as scenarios_file:
+        return [{
+            "population_threshold": int(row["population_threshold"]),
+            "school_distance": float(row["school_distance"]),
+            "river_distance": float(row["river_distance"]),
+            "output": row["output"],
+        } for row in csv.DictReader(scenarios_file)]
+
+
+def write_layer(layer, path):
+    """Writes ``layer`` to ``path`` in the format matching its extension."""
+    from qgis.core import QgsCoordinateTransformContext, QgsVectorFileWriter
+
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = QgsVectorFileWriter.driverForExtension(os.path.splitext(path)[1]) or "GPKG"
+    options.layerName = "suitable_areas"
+    result = QgsVectorFileWriter.writeAsVectorFormatV2(layer, path, QgsCoordinateTransformContext(), options)
+    if result[0] != QgsVectorFileWriter.NoError:
+        raise RuntimeError(f"Could not write {path}: {result[1]}")
+
+
+def run_scenarios(arguments):
+    """Runs every scenario and returns the number of failed runs."""
+    from qgis.PyQt.QtCore import Qt
+    # Processing can only be imported once QGIS is initialised
+    from .school_locator_task import PlacementTask, SchoolLocatorTask, ScoringTask, SweepTask
+    from .incremental import IncrementalState
+    from .stage_cache import StageCache
+
+    layer_paths = {
+        "Population Data": arguments.population,
+        "School Layer": arguments.schools,
+        "River Layer": arguments.rivers,
+        "Boundary Layer": arguments.boundary,
+    }
+    cache = None
+    if arguments.cache_dir:
+        cache = StageCache(arguments.cache_dir, arguments.cache_size * 1024 * 1024)
+    incremental = IncrementalState(arguments.incremental_dir) if arguments.incremental_dir else None
+
+    if is_sweep(arguments):
+        task = SweepTask(layer_paths, sweep_scenarios(arguments), arguments.storage, arguments.memory_limit,
+                         cache, arguments.workers, arguments.tile_size)
+        task.stepFinished.connect(lambda summary: print(summary, file=sys.stderr), Qt.DirectConnection)
+        if not task.run():
+            print(f"{arguments.output}: {task.exception}", file=sys.stderr)
+            return 1
+
+        write_layer(task.result_layer, arguments.output)
+        if arguments.timing_report:
+            task.feedback.write_report(arguments.timing_report)
+        for index, (scenario, count) in enumerate(zip(task.scenarios, task.scenario_counts)):
+            print(f"{scenario_field(index)}: {scenario.describe()}: {count} suitable areas", file=sys.stderr)
+        return 0
+
+    if arguments.place is not None:
+        task = PlacementTask(layer_paths, arguments.place, arguments.catchment, arguments.candidate_spacing,
+                             arguments.river_distance, arguments.storage, arguments.memory_limit, cache,
+                             arguments.workers, arguments.tile_size)
+        task.stepFinished.connect(lambda summary: print(summary, file=sys.stderr), Qt.DirectConnection)
+        if not task.run():
+            print(f"{arguments.output}: {task.exception}", file=sys.stderr)
+            return 1
+
+        write_layer(task.result_layer, arguments.output)
+        if arguments.timing_report:
+            task.feedback.write_report(arguments.timing_report)
+        existing, total = task.covered_population
+        print(f"{arguments.output}: {task.result_layer.featureCount()} new schools raise the population served "
+              f"from {existing:g} to {total:g}", file=sys.stderr)
+        return 0
+
+    if arguments.top is not None:
+        task = ScoringTask(layer_paths, arguments.population_threshold, arguments.school_distance,
+                           arguments.river_distance, arguments.top, ScoreWeights(*arguments.weights),
+                           arguments.storage, arguments.memory_limit, cache, arguments.workers, arguments.tile_size)
+        task.stepFinished.connect(lambda summary: print(summary, file=sys.stderr), Qt.DirectConnection)
+        if not task.run():
+            print(f"{arguments.output}: {task.exception}", file=sys.stderr)
+            return 1
+
+        write_layer(task.result_layer, arguments.output)
+        if arguments.timing_report:
+            task.feedback.write_report(arguments.timing_report)
+        for rank, (feature_id, score) in enumerate(task.ranking, 1):
+            print(f"{rank}: feature {feature_id}, score {score:.3f}", file=sys.stderr)
+        return 0
+
+    failures = 0
+    for scenario in read_scenarios(arguments):
+        task = SchoolLocatorTask(layer_paths, scenario["population_threshold"], scenario["school_distance"],
+                                 scenario["river_distance"], arguments.engine, arguments.storage,
+                                 arguments.memory_limit, cache, arguments.workers, arguments.tile_size,
+                                 incremental, arguments.segments, arguments.simplify_ratio, arguments.snap_grid,
+                                 arguments.cell_size,
+                                 arguments.catchment if arguments.catchment_population else 0.0)
+        # Stages may finish on worker threads and there is no event loop to queue to
+        task.stepFinished.connect(lambda summary: print(summary, file=sys.stderr), Qt.DirectConnection)
+
+        if not task.run():
+            print(f"{scenario['output']}: {task.exception}", file=sys.stderr)
+            failures += 1
+            continue
+
+        write_layer(task.result_layer, scenario["output"])
+        if task.school_catchments is not None:
+            root, extension = os.path.splitext(scenario["output"])
+            write_layer(task.school_catchments, f"{root}_school_catchments{extension}")
+        if arguments.timing_report:
+            root, extension = os.path.splitext(arguments.timing_report)
+            suffix = f"_{os.path.splitext(os.path.basename(scenario['output']))[0]}" if arguments.scenarios else ""
+            task.feedback.write_report(f"{root}{suffix}{extension}")
+        print(f"{scenario['output']}: {task.result_layer.featureCount()} suitable areas "
+              f"in {task.feedback.total_time():.1f} s", file=sys.stderr)
+
+    return failures
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    # QGIS is only started once the arguments are known to be valid
+    from qgis.core import QgsApplication
+
+    application = QgsApplication([], False)
+    application.initQgis()
+    try:
+        sys.path.append(os.path.join(QgsApplication.pkgDataPath(), "python", "plugins"))
+        from processing.core.Processing import Processing
+        Processing.initialize()
+
+        return 1 if run_scenarios(arguments) else 0
+    finally:
+        application.exitQgis()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
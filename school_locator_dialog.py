@@ -1,11 +1,22 @@
 import os
 from qgis.PyQt import uic
 from qgis.PyQt import QtWidgets
-from PyQt5.QtWidgets import QFileDialog
+from PyQt5.QtWidgets import QFileDialog, QInputDialog
+from osgeo import ogr
 
 
 
 
+# Vector formats accepted as inputs; all but shapefiles carry a spatial index
+VECTOR_FILE_FILTER = ";;".join([
+    "Vector files (*.shp *.gpkg *.fgb *.parquet)",
+    "Shapefiles (*.shp)",
+    "GeoPackage (*.gpkg)",
+    "FlatGeobuf (*.fgb)",
+    "GeoParquet (*.parquet)",
+])
+
+
 # This loads your .ui file so that PyQt can populate your plugin with the elements from Qt Designer
 FORM_CLASS, _ = uic.loadUiType(os.path.join(
     os.path.dirname(__file__), 'school_locator_dialog_base.ui'))
@@ -18,16 +29,20 @@ class SchoolLocatorDialog(QtWidgets.QDialog, FORM_CLASS):
         # Set up the user interface from Designer through FORM_CLASS
         self.setupUi(self)
 
-        # Set the size of the window programmatically
-        self.setFixedSize(500, 600)  # Fixed window size
+        # Open at a size that fits a 1080p screen; the options scroll and the
+        # window can be resized
+        self.setMinimumWidth(500)
+        self.resize(520, 760)
 
         # Set the size of the 'Close' and 'Run Analysis' buttons
         self.btn_close.setFixedSize(100, 30)  # Set fixed size for Close button
         self.btn_run_analysis.setFixedSize(100, 30)  # Set fixed size for Run Analysis button
+        self.btn_save_timing_report.setFixedSize(100, 30)  # Set fixed size for Save Timings button
 
         # To ensure the buttons don't resize with the dialog, set their size policies
         self.btn_close.setSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
         self.btn_run_analysis.setSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
+        self.btn_save_timing_report.setSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
 
         # Connect upload buttons to their file selection actions
         self.btn_population_layer.clicked.connect(lambda: self.upload_layer("Population Data"))
@@ -46,12 +61,15 @@ class SchoolLocatorDialog(QtWidgets.QDialog, FORM_CLASS):
     def upload_layer(self, layer_name):
         """Handles file upload for the specified layer."""
         file_path, _ = QFileDialog.getOpenFileName(
-            self, 
-            f"Select Shapefile for {layer_name}", 
-            "", 
-            "Shapefiles (*.shp)"
+            self,
+            f"Select File for {layer_name}",
+            "",
+            VECTOR_FILE_FILTER
         )
 
+        if file_path:
+            file_path = self.choose_sublayer(file_path, layer_name)
+
         if file_path:
             # Store the file path in the dictionary
             self.layer_paths[layer_name] = file_path
@@ -59,6 +77,34 @@ class SchoolLocatorDialog(QtWidgets.QDialog, FORM_CLASS):
         else:
             QtWidgets.QMessageBox.warning(self, "File Not Selected", f"No file selected for {layer_name}.")
 
+    def choose_sublayer(self, file_path, layer_name):
+        """Asks which layer to use when a file, such as a GeoPackage, holds several.
+
+        :returns: The layer source, ``file_path|layername=<layer>`` for
+            multi-layer files, or None when the choice was canceled.
+        """
+        dataset = ogr.Open(file_path)
+        if dataset is None or dataset.GetLayerCount() < 2:
+            return file_path
+
+        names = [dataset.GetLayer(index).GetName() for index in range(dataset.GetLayerCount())]
+        name, accepted = QInputDialog.getItem(self, f"Select Layer for {layer_name}",
+                                              f"{os.path.basename(file_path)} contains several layers:",
+                                              names, 0, False)
+        if not accepted:
+            return None
+        return f"{file_path}|layername={name}"
+
     def get_layer_paths(self):
         """Returns the file paths for all uploaded layers."""
         return self.layer_paths
+
+    def get_timing_report_path(self):
+        """Asks the user where the JSON timing report should be saved."""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Timing Report",
+            "school_locator_timings.json",
+            "JSON files (*.json)"
+        )
+        return file_path
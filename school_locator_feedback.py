@@ -0,0 +1,224 @@
+import json
+import os
+import sys
+import threading
+import time
+
+from qgis.core import QgsProcessingFeedback, QgsVectorLayer
+
+
+def current_memory_bytes():
+    """Returns the resident memory of the QGIS process in bytes.
+
+    This is the memory in use now rather than the peak of the process
+    lifetime, so it falls again once a step releases its data. Returns None
+    when the platform does not expose the value.
+    """
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD),
+                        ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t),
+                        ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t),
+                        ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+
+    try:
+        # The second field is the number of resident pages
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def reset_peak_memory():
+    """Restarts the peak resident memory the kernel records for the process,
+    read back with :func:`peak_memory_bytes`.
+
+    :returns: Whether the peak was reset, which only Linux supports.
+    :rtype: bool
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_memory_bytes():
+    """Returns the peak resident memory of the process in bytes since the
+    last :func:`reset_peak_memory`, or None when it is not exposed."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def count_features(value):
+    """Counts the features held by a layer, a file or a list of them."""
+    if isinstance(value, (list, tuple)):
+        counts = [count_features(item) for item in value]
+        return None if None in counts else sum(counts)
+    if isinstance(value, str):
+        # Output written to disk
+        value = QgsVectorLayer(value, "", "ogr")
+    if isinstance(value, QgsVectorLayer):
+        count = value.featureCount()
+        return count if count >= 0 else None
+    return None
+
+
+class StepTimingFeedback(QgsProcessingFeedback):
+    """Processing feedback recording timing statistics for each pipeline step.
+
+    Every step is delimited by :meth:`start_step` and :meth:`end_step`; the
+    wall time, the number of features consumed and produced, the process
+    memory once the step has finished, its change over the step and the
+    peak memory during the step are recorded and can be exported with
+    :meth:`to_json`.
+    Steps running concurrently pass the value returned by :meth:`start_step`
+    to :meth:`end_step`.
+
+    The peak is the one the kernel records where it can be reset, see
+    :func:`reset_peak_memory`; elsewhere the memory is sampled every
+    :attr:`SAMPLE_INTERVAL` seconds while steps run. Steps running
+    concurrently share the process, so their peaks cover each other.
+    """
+
+    SAMPLE_INTERVAL = 0.05
+
+    def __init__(self):
+        super().__init__()
+        self.steps = []
+        self._current = None
+        self._lock = threading.Lock()
+        self._active = []
+        self._kernel_peak = False
+        self._stop_sampling = None
+
+    def start_step(self, name, inputs=None):
+        """Starts timing the step ``name`` reading the ``inputs`` layer(s)."""
+        start_memory = current_memory_bytes()
+        step = {
+            "name": name,
+            "features_in": count_features(inputs),
+            "start": time.perf_counter(),
+            "start_memory": start_memory,
+            "peak_memory": start_memory,
+        }
+        with self._lock:
+            if not self._active:
+                self._kernel_peak = reset_peak_memory()
+                if not self._kernel_peak:
+                    self._start_sampling()
+            self._active.append(step)
+        self._current = step
+        return step
+
+    def end_step(self, output=None, step=None):
+        """Finishes ``step``, or the last started step, and returns its statistics."""
+        if step is None:
+            step = self._current
+
+        start = step.pop("start")
+        start_memory = step.pop("start_memory")
+        step["wall_time"] = time.perf_counter() - start
+        step["features_out"] = count_features(output)
+        step["memory"] = current_memory_bytes()
+        # Steps running concurrently share the process, their changes overlap
+        step["memory_change"] = (None if step["memory"] is None or start_memory is None
+                                 else step["memory"] - start_memory)
+        with self._lock:
+            self._active = [active for active in self._active if active is not step]
+            peaks = [step["peak_memory"], step["memory"]]
+            if self._kernel_peak:
+                peaks.append(peak_memory_bytes())
+            elif not self._active:
+                self._stop_sampling.set()
+            peaks = [peak for peak in peaks if peak is not None]
+            step["peak_memory"] = max(peaks) if peaks else None
+            self.steps.append(step)
+
+        self.pushInfo(self.format_step(step))
+        return step
+
+    def sample_memory(self):
+        """Raises the peak memory of the running steps to the memory in use now."""
+        memory = current_memory_bytes()
+        if memory is None:
+            return
+        with self._lock:
+            for step in self._active:
+                if step["peak_memory"] is None or memory > step["peak_memory"]:
+                    step["peak_memory"] = memory
+
+    def _start_sampling(self):
+        """Samples the memory in a background thread until the running steps end."""
+        stop = self._stop_sampling = threading.Event()
+
+        def sample():
+            while not stop.wait(self.SAMPLE_INTERVAL):
+                self.sample_memory()
+
+        threading.Thread(target=sample, name="step_memory", daemon=True).start()
+
+    @staticmethod
+    def format_step(step):
+        """Formats the statistics of a step as a single line of text."""
+        text = f"{step['name']}: {step['wall_time']:.2f} s"
+        if step["features_in"] is not None or step["features_out"] is not None:
+            features_in = "?" if step["features_in"] is None else step["features_in"]
+            features_out = "?" if step["features_out"] is None else step["features_out"]
+            text += f", {features_in} -> {features_out} features"
+        if step["memory"] is not None:
+            text += f", {step['memory'] / (1024 * 1024):.0f} MB in use"
+        if step["memory_change"] is not None:
+            text += f" ({step['memory_change'] / (1024 * 1024):+.0f} MB)"
+        if step["peak_memory"] is not None:
+            text += f", peak {step['peak_memory'] / (1024 * 1024):.0f} MB"
+        return text
+
+    def total_time(self):
+        """Returns the summed wall time of all recorded steps."""
+        return sum(step["wall_time"] for step in self.steps)
+
+    def slowest_step(self):
+        """Returns the statistics of the slowest recorded step, if any."""
+        if not self.steps:
+            return None
+        return max(self.steps, key=lambda step: step["wall_time"])
+
+    def report(self):
+        """Returns the timing report as a dictionary."""
+        return {
+            "total_time": self.total_time(),
+            "steps": list(self.steps),
+        }
+
+    def to_json(self, indent=2):
+        """Returns the timing report serialized as JSON."""
+        return json.dumps(self.report(), indent=indent)
+
+    def write_report(self, path):
+        """Writes the JSON timing report to ``path``."""
+        with open(path, "w", encoding="utf-8") as report_file:
+            report_file.write(self.to_json())
@@ -0,0 +1,20 @@
+from qgis.PyQt.QtGui import QIcon
+from qgis.core import QgsProcessingProvider
+
+from .school_locator_algorithm import SchoolSuitabilityAlgorithm
+
+
+class SchoolLocatorProvider(QgsProcessingProvider):
+    """Processing provider exposing the school locator algorithms."""
+
+    def loadAlgorithms(self):
+        self.addAlgorithm(SchoolSuitabilityAlgorithm())
+
+    def id(self):
+        return 'school_locator'
+
+    def name(self):
+        return 'School Locator'
+
+    def icon(self):
+        return QIcon(':/plugins/school_locator/icon.png')
@@ -0,0 +1,1269 @@
+import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+import numpy as np
+
+from qgis.PyQt.QtCore import QVariant, pyqtSignal
+from qgis.core import (QgsApplication, QgsCoordinateTransform, QgsCoordinateTransformContext, QgsFeature,
+                       QgsFeatureRequest, QgsField, QgsGeometry, QgsProcessingContext, QgsProcessingFeedback,
+                       QgsPointXY, QgsProcessingMultiStepFeedback, QgsProcessingUtils, QgsRectangle, QgsTask,
+                       QgsVectorFileWriter, QgsVectorLayer)
+import processing
+
+from .catchment import PointIndex, catchment_points
+from .exclusion_engine import (add_distance_attributes, aggregate_catchments, attribute_value,
+                               exclude_schools_and_rivers, geometry_index, memory_layer_like, nearest_distance,
+                               outline, population_points)
+from .incremental import PATCHABLE_SOURCES, changed_geometries
+from .postgis_backend import BATCH_SIZE, execute_suitability_query
+from .pipeline import (CATCHMENT_POPULATION, ENGINE_DISTANCE_ATTRIBUTES, ENGINE_PROCESSING, ENGINE_RASTER,
+                       NEAREST_DISTANCES, Plan,
+                       RASTER_SUITABILITY, RIVER_DISTANCE_FIELD, SCHOOL_DISTANCE_FIELD, SPATIAL_INDEX_EXCLUSION,
+                       build_distance_pipeline, build_suitability_pipeline, max_buffer_error,
+                       plan as plan_pipeline)
+from .raster_engine import default_cell_size, max_raster_error
+from .raster_io import raster_suitability
+from .school_locator_feedback import StepTimingFeedback, current_memory_bytes
+from .stage_cache import plan_keys, source_key
+from .placement import candidate_points, lazy_greedy
+from .scoring import rank_sites
+from .sweep import scenario_field
+from .tiling import expand, tile_grid
+
+# Pipeline algorithms implemented in Python rather than by a processing provider
+PYTHON_ALGORITHMS = {
+    SPATIAL_INDEX_EXCLUSION: exclude_schools_and_rivers,
+    NEAREST_DISTANCES: add_distance_attributes,
+    RASTER_SUITABILITY: raster_suitability,
+    CATCHMENT_POPULATION: aggregate_catchments,
+}
+
+# Where intermediate stage outputs are stored
+STORAGE_MEMORY = "memory"          # memory layers, fastest for small jobs
+STORAGE_GEOPACKAGE = "geopackage"  # temporary GeoPackages with spatial indexes
+STORAGE_AUTO = "auto"              # memory while the process uses less than the memory limit
+
+# Source the catchments are counted from when the population source is a subset
+SERVED_POPULATION = "served_population"
+
+
+def as_layer(value):
+    """Opens a stage output written to disk as a vector layer."""
+    if isinstance(value, str):
+        return QgsVectorLayer(value, os.path.splitext(os.path.basename(value))[0], "ogr")
+    return value
+
+
+def reopen_layer(layer):
+    """Opens a new layer on the data of ``layer`` in the current thread."""
+    copy = QgsVectorLayer(layer.source(), layer.name(), layer.providerType())
+    copy.setSubsetString(layer.subsetString())
+    return copy
+
+
+def write_geopackage(layer, path, selected_only=False):
+    """Writes a memory layer produced by a Python algorithm to a GeoPackage."""
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = "GPKG"
+    options.onlySelectedFeatures = selected_only
+    result = QgsVectorFileWriter.writeAsVectorFormatV2(layer, path, QgsCoordinateTransformContext(), options)
+    if result[0] != QgsVectorFileWriter.NoError:
+        raise RuntimeError(f"Could not write {path}: {result[1]}")
+
+
+def rect_tuple(rectangle):
+    return (rectangle.xMinimum(), rectangle.yMinimum(), rectangle.xMaximum(), rectangle.yMaximum())
+
+
+def run_plan_in_memory(plan, sources, feedback, context=None):
+    """Runs every stage of ``plan`` in the current thread with memory outputs.
+
+    :returns: The output layer of the plan.
+    :rtype: QgsVectorLayer
+    """
+    outputs = dict(sources)
+    steps = QgsProcessingMultiStepFeedback(len(plan), feedback)
+    for index, stage in enumerate(plan):
+        if feedback.isCanceled():
+            raise RuntimeError("Analysis canceled.")
+        steps.setCurrentStep(index)
+
+        parameters = dict(stage.parameters)
+        for key, value in stage.inputs.items():
+            if isinstance(value, (list, tuple)):
+                parameters[key] = [outputs[name] for name in value]
+            else:
+                parameters[key] = outputs[value]
+
+        algorithm = PYTHON_ALGORITHMS.get(stage.algorithm)
+        if algorithm is not None:
+            outputs[stage.name] = algorithm(parameters, steps)
+        else:
+            parameters['OUTPUT'] = f'memory:{stage.name}'
+            outputs[stage.name] = processing.run(stage.algorithm, parameters,
+                                                 context=context or QgsProcessingContext(),
+                                                 feedback=steps)['OUTPUT']
+    return outputs[plan.output]
+
+
+def count_whole_population(plan, sources, population, extent):
+    """Makes the catchment stage of ``plan``, if any, count the polygons of
+    ``population`` within its distance of ``extent`` rather than the
+    population source, when that source only holds the polygons being
+    processed.
+
+    :returns: The changed plan and sources.
+    :rtype: tuple
+    """
+    stage = plan.pipeline.stages.get("catchment_population")
+    if stage is None:
+        return plan, sources
+
+    pipeline = plan.pipeline.copy()
+    pipeline.sources.append(SERVED_POPULATION)
+    pipeline.stages[stage.name].inputs['POPULATION'] = SERVED_POPULATION
+    reach = QgsRectangle(*expand(rect_tuple(extent), stage.parameters['DISTANCE']))
+    sources = dict(sources)
+    sources[SERVED_POPULATION] = population.materialize(QgsFeatureRequest(reach))
+    return Plan(pipeline, plan.notes, plan.source_filters), sources
+
+
+def geometry_key(geometry):
+    """Returns the WKB of ``geometry`` as multi-part, so that the parts read
+    from a layer and from its GeoPackage snapshot compare equal."""
+    geometry = QgsGeometry(geometry)
+    geometry.convertToMultiType()
+    return bytes(geometry.asWkb())
+
+
+def copy_features(layer, fields, request=None):
+    """Returns the features of ``layer`` with their attributes matched to ``fields`` by name."""
+    features = []
+    for feature in layer.getFeatures(request or QgsFeatureRequest()):
+        out_feature = QgsFeature(fields)
+        out_feature.setGeometry(feature.geometry())
+        out_feature.setAttributes([feature[name] if layer.fields().indexOf(name) >= 0 else None
+                                   for name in fields.names()])
+        features.append(out_feature)
+    return features
+
+
+def release_output(value):
+    """Deletes a stage output written to disk once it is no longer needed."""
+    if not isinstance(value, str):
+        return
+    for path in (value, value + "-wal", value + "-shm"):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class SchoolLocatorTask(QgsTask):
+    """Runs the school suitability analysis in a background thread.
+
+    The input layers are reopened from their file paths inside :meth:`run`
+    so that no layer object is shared with the main thread. The resulting
+    layer is handed back through :attr:`result_layer` once the task has
+    finished; it is never added to the project from the worker thread.
+    """
+
+    # Name of the result layer
+    result_name = "Suitable Areas"
+
+    # Emitted with a human readable description of the step being executed
+    stepChanged = pyqtSignal(str)
+    # Emitted with the timing summary of each step once it has finished
+    stepFinished = pyqtSignal(str)
+
+    def __init__(self, layer_paths, population_threshold, school_distance, river_distance,
+                 engine=ENGINE_PROCESSING, storage=STORAGE_MEMORY, memory_limit_mb=4096, cache=None,
+                 max_workers=1, tile_size=0, incremental=None, segments=5, simplify_ratio=0.0, snap_grid=0.0,
+                 cell_size=0.0, catchment_distance=0.0):
+        super().__init__("School suitability analysis", QgsTask.CanCancel)
+        self.layer_paths = layer_paths
+        self.population_threshold = population_threshold
+        self.school_distance = school_distance
+        self.river_distance = river_distance
+        self.engine = engine
+        self.storage = storage
+        self.memory_limit_mb = memory_limit_mb
+        # Optional stage_cache.StageCache reusing outputs of previous runs
+        self.cache = cache
+        # Number of independent stages allowed to run at the same time
+        self.max_workers = max_workers
+        # Size of the tiles the boundary extent is split into, 0 to disable tiling
+        self.tile_size = tile_size
+        # Optional incremental.IncrementalState used to patch the previous result
+        self.incremental = incremental
+        # Precision of the buffers, see pipeline.build_suitability_pipeline
+        self.segments = segments
+        self.simplify_ratio = simplify_ratio
+        self.snap_grid = snap_grid
+        # Cell size of the raster engine, 0 to derive it from the boundary extent
+        self.cell_size = cell_size
+        # Distance within which the population served by the suitable areas
+        # and the existing schools is summed, 0 to skip it
+        self.catchment_distance = catchment_distance
+        self.step_count = 0
+
+        self.feedback = None
+        self.result_layer = None
+        # Existing schools with the population of their catchment, see catchment_distance
+        self.school_catchments = None
+        self.exception = None
+
+        self._lock = threading.Lock()
+        self._active_feedbacks = set()
+        self._stage_progress = {}
+        self._started_steps = 0
+
+    def cancel(self):
+        """Cancels the task and the processing algorithms currently running."""
+        if self.feedback:
+            self.feedback.cancel()
+        self._cancel_active_stages()
+        super().cancel()
+
+    def run(self):
+        """Executes the analysis pipeline. Called from a worker thread."""
+        self.feedback = StepTimingFeedback()
+        restricted_paths = []
+
+        try:
+            population_layer = QgsVectorLayer(self.layer_paths["Population Data"], "Population Layer", "ogr")
+            school_layer = QgsVectorLayer(self.layer_paths["School Layer"], "School Layer", "ogr")
+            river_layer = QgsVectorLayer(self.layer_paths["River Layer"], "River Layer", "ogr")
+            boundary_layer = QgsVectorLayer(self.layer_paths["Boundary Layer"], "Boundary Layer", "ogr")
+
+            if not all([population_layer.isValid(), school_layer.isValid(),
+                        river_layer.isValid(), boundary_layer.isValid()]):
+                raise RuntimeError("One or more layers could not be loaded.")
+
+            sources = {
+                "population": population_layer,
+                "school": school_layer,
+                "river": river_layer,
+                "boundary": boundary_layer,
+            }
+            filterable_sources = [name for name, layer in sources.items()
+                                  if layer.dataProvider().supportsSubsetString()]
+
+            plan = self.plan(filterable_sources)
+            for note in plan.notes:
+                self.feedback.pushInfo(note)
+            self.report_precision()
+
+            # Rows rejected by a pushed down filter are never read by the provider
+            for name, expression in plan.source_filters.items():
+                layer = sources[name]
+                if layer.subsetString():
+                    expression = f"({layer.subsetString()}) AND ({expression})"
+                if not layer.setSubsetString(expression):
+                    raise RuntimeError(f"Could not filter the {layer.name()} with: {expression}")
+
+            settings = {"engine": self.engine, "population_threshold": self.population_threshold,
+                        "school_distance": self.school_distance, "river_distance": self.river_distance,
+                        "segments": self.segments, "simplify_ratio": self.simplify_ratio,
+                        "snap_grid": self.snap_grid, "cell_size": self.cell_size,
+                        "catchment_distance": self.catchment_distance}
+            boundary_key = source_key(boundary_layer.source(), boundary_layer.subsetString())
+            source_keys = {}
+            for name, layer in sources.items():
+                # Restricted sources depend on the boundary too
+                reach = self.source_reach(name)
+                restriction = None if reach is None else {"boundary": boundary_key, "reach": reach}
+                source_keys[name] = source_key(layer.source(), layer.subsetString(), restriction)
+            sources = self._restrict_sources(sources, restricted_paths)
+
+            changed = None
+            # Distance attributes of unaffected polygons may change too, and
+            # raster cells may stray into the neighbouring polygon, so the
+            # previous pieces could not be matched to theirs; neither is patched
+            if self.incremental is not None and self.engine not in (ENGINE_DISTANCE_ATTRIBUTES, ENGINE_RASTER):
+                changed = self.incremental.changed_sources(settings, source_keys)
+
+            if changed is not None:
+                final_suitable_areas = self._execute_incremental(plan, sources, changed)
+            elif self.tile_size > 0:
+                final_suitable_areas = self._execute_tiled(plan, sources)
+            else:
+                final_suitable_areas = self._execute(plan, sources, source_keys)
+
+            if self.cache is not None and isinstance(final_suitable_areas, str):
+                # Do not keep the cache file open, it may be evicted
+                final_suitable_areas = as_layer(final_suitable_areas).materialize(QgsFeatureRequest())
+                self.cache.trim()
+            else:
+                final_suitable_areas = as_layer(final_suitable_areas)
+
+            if self.incremental is not None:
+                self._save_incremental_state(final_suitable_areas, sources, settings, source_keys)
+
+            final_suitable_areas = self.process_result(final_suitable_areas, sources)
+            final_suitable_areas.setName(self.result_name)
+            # Hand the layer over to the main thread so it can be added to the project
+            final_suitable_areas.moveToThread(QgsApplication.instance().thread())
+            self.result_layer = final_suitable_areas
+
+        except Exception as e:
+            self.exception = e
+            return False
+
+        finally:
+            sources = None
+            for path in restricted_paths:
+                release_output(path)
+
+        return True
+
+    def plan(self, filterable_sources=()):
+        """Returns the optimised plan of the analysis pipeline."""
+        return plan_pipeline(build_suitability_pipeline(self.population_threshold, self.school_distance,
+                                                        self.river_distance, self.engine,
+                                                        segments=self.segments, simplify_ratio=self.simplify_ratio,
+                                                        snap_grid=self.snap_grid, cell_size=self.cell_size,
+                                                        catchment_distance=self.catchment_distance),
+                             filterable_sources)
+
+    def buffer_errors(self, boundary_extent):
+        """Returns the largest error the buffer precision settings allow
+        around schools and around rivers.
+
+        :param boundary_extent: Extent of the boundary, which the raster
+            engine chooses its cell size from.
+        :rtype: tuple
+        """
+        if self.engine == ENGINE_DISTANCE_ATTRIBUTES:
+            # Distances are exact, only the simplification moves the rivers
+            return 0.0, self.river_distance * self.simplify_ratio
+        if self.engine == ENGINE_RASTER:
+            cell_size = self.cell_size or default_cell_size(
+                expand(rect_tuple(boundary_extent), max(self.school_distance, self.river_distance)))
+            school_error = max_raster_error(cell_size)
+            return school_error, school_error + self.river_distance * self.simplify_ratio
+
+        snap_grid = self.snap_grid if self.engine == ENGINE_PROCESSING else 0.0
+        return (max_buffer_error(self.school_distance, self.segments, snap_grid=snap_grid),
+                max_buffer_error(self.river_distance, self.segments, self.river_distance * self.simplify_ratio,
+                                 snap_grid))
+
+    def report_precision(self):
+        """Reports the largest error the buffer precision settings allow."""
+        if self.engine == ENGINE_RASTER and self.cell_size <= 0:
+            # The raster stage reports the error of the cell size it chooses
+            return
+        school_error, river_error = self.buffer_errors(None)
+        self.feedback.pushInfo(f"Maximum buffer error: {school_error:.3g} around schools, "
+                               f"{river_error:.3g} around rivers")
+
+    def process_result(self, layer, sources):
+        """Returns the layer handed back for the plan output ``layer``
+        computed from the input layers ``sources``.
+
+        With a catchment distance, the population served by each existing
+        school is summed too, into :attr:`school_catchments`.
+        """
+        if self.catchment_distance > 0:
+            self.stepChanged.emit("Summing the population within the school catchments")
+            school_catchments = aggregate_catchments(
+                {'INPUT': sources["school"], 'POPULATION': sources["population"],
+                 'DISTANCE': self.catchment_distance}, self.feedback)
+            school_catchments.setName("School Catchments")
+            school_catchments.moveToThread(QgsApplication.instance().thread())
+            self.school_catchments = school_catchments
+        return layer
+
+    def source_reach(self, name):
+        """Returns how far outside the boundary features of the source ``name``
+        can still change the result, or None when every feature is read."""
+        if name == "population":
+            # People beyond the boundary may live in a catchment
+            return self.catchment_distance
+        # Distances to the nearest school or river may lie beyond any threshold
+        if self.engine == ENGINE_DISTANCE_ATTRIBUTES:
+            return None
+        return {"school": self.school_distance, "river": self.river_distance}.get(name)
+
+    def _restrict_sources(self, sources, paths):
+        """Copies the features of the sources within reach of the boundary
+        to temporary GeoPackages, whose paths are added to ``paths``, or to
+        memory layers when the stages run in memory on the current thread.
+
+        Features are first read through a filter rectangle, which the
+        provider answers from the spatial index of the file if it has one,
+        so features far from the boundary are never decoded; the remaining
+        ones are then tested against the boundary geometry itself. Sources
+        lying within the rectangle are left as they are, a copy would hardly
+        be smaller.
+        """
+        boundary = sources["boundary"]
+        boundary_geometry = QgsGeometry.unaryUnion([feature.geometry() for feature in boundary.getFeatures()])
+        if boundary_geometry.isEmpty():
+            return sources
+
+        # Worker threads reopen the sources from their files
+        in_memory = self.storage == STORAGE_MEMORY and self.max_workers <= 1 and self.tile_size <= 0
+        restricted = dict(sources)
+        for name, layer in sources.items():
+            reach = self.source_reach(name)
+            if reach is None:
+                continue
+
+            region = QgsGeometry(boundary_geometry)
+            region.transform(QgsCoordinateTransform(boundary.crs(), layer.crs(), QgsCoordinateTransformContext()))
+            rectangle = QgsRectangle(*expand(rect_tuple(region.boundingBox()), reach))
+            if rectangle.contains(layer.extent()):
+                self.feedback.pushInfo(f"Reading every {name} feature, they all lie near the boundary")
+                continue
+
+            step = self.feedback.start_step(f"read_{name}", layer)
+            engine = QgsGeometry.createGeometryEngine(region.constGet())
+            engine.prepareGeometry()
+
+            request = QgsFeatureRequest(rectangle)
+            request.setNoAttributes()
+            within_reach = []
+            for feature in layer.getFeatures(request):
+                geometry = feature.geometry()
+                if geometry.isNull():
+                    continue
+                if reach <= 0:
+                    inside = engine.intersects(geometry.constGet())
+                else:
+                    inside = engine.distance(geometry.constGet()) <= reach
+                if inside:
+                    within_reach.append(feature.id())
+
+            if in_memory:
+                restricted[name] = layer.materialize(QgsFeatureRequest().setFilterFids(within_reach))
+                restricted[name].setName(layer.name())
+            else:
+                path = QgsProcessingUtils.generateTempFilename(f"{name}.gpkg")
+                layer.selectByIds(within_reach)
+                write_geopackage(layer, path, selected_only=True)
+                paths.append(path)
+                restricted[name] = QgsVectorLayer(path, layer.name(), "ogr")
+            self.feedback.end_step(restricted[name], step)
+            self.feedback.pushInfo(f"Read {len(within_reach)} of {layer.featureCount()} {name} features "
+                                   f"within reach of the boundary")
+        return restricted
+
+    def _execute(self, plan, sources, source_keys):
+        """Runs the stages of ``plan`` and returns the plan output.
+
+        When a cache is set, stage outputs are stored in it and stages whose
+        output is already cached are not run, nor are the stages only
+        feeding them. Every temporary output is released as soon as the last
+        stage reading it has finished.
+        """
+        keys = {}
+        if self.cache is not None:
+            keys = plan_keys(plan, source_keys)
+
+        cached = {}
+        stages = self._required_stages(plan, keys, cached)
+        for name in cached:
+            self.feedback.pushInfo(f"Reusing cached output of {name}")
+
+        self.step_count = len(stages)
+        self._started_steps = 0
+        self._stage_progress = {stage.name: 0.0 for stage in stages}
+
+        outputs = dict(sources)
+        outputs.update(cached)
+        temporary = set()
+        pending_consumers = {stage.name: 0 for stage in stages}
+        for stage in stages:
+            for name in set(stage.dependencies()):
+                if name in pending_consumers:
+                    pending_consumers[name] += 1
+
+        def store(stage, result):
+            output, is_temporary = result
+            outputs[stage.name] = output
+            if is_temporary:
+                temporary.add(stage.name)
+
+            for name in set(stage.dependencies()):
+                if name not in pending_consumers:
+                    continue
+                pending_consumers[name] -= 1
+                if pending_consumers[name] == 0 and name != plan.output:
+                    output = outputs.pop(name)
+                    if name in temporary:
+                        release_output(output)
+
+        if self.max_workers > 1 and len(stages) > 1:
+            self._execute_parallel(stages, outputs, keys, store)
+        else:
+            for stage in stages:
+                store(stage, self._run_stage(stage, outputs, keys))
+
+        return outputs[plan.output]
+
+    def _execute_parallel(self, stages, outputs, keys, store):
+        """Runs every stage on a worker pool as soon as its inputs are ready.
+
+        Layers must not be shared between threads, so sources are reopened
+        by the worker reading them and outputs are always written to files.
+        """
+        pending = list(stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                while pending or running:
+                    for stage in [stage for stage in pending
+                                  if all(name in outputs for name in stage.dependencies())]:
+                        pending.remove(stage)
+                        future = executor.submit(self._run_stage, stage, dict(outputs), keys, True)
+                        running[future] = stage
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        store(running.pop(future), future.result())
+            except Exception:
+                # Stop the stages still running before the pool shuts down
+                self._cancel_active_stages()
+                raise
+
+    def _execute_incremental(self, plan, sources, changed):
+        """Patches the previous result after changes to schools or rivers.
+
+        Only population polygons within reach of a school or river added,
+        removed or moved since the previous run can have different suitable
+        areas. The previous pieces of those polygons are replaced with the
+        output of ``plan`` run on them alone; population polygons are
+        assumed not to overlap each other.
+        """
+        step = self.feedback.start_step("incremental_update", sources["population"])
+        self.stepChanged.emit("Updating the previous result around changed features")
+
+        previous = as_layer(self.incremental.path("result"))
+        output = memory_layer_like(previous, "suitable_areas")
+        if previous.fields().indexOf("fid") >= 0:
+            # Do not carry over the GeoPackage primary key
+            output.dataProvider().deleteAttributes([output.fields().indexOf("fid")])
+            output.updateFields()
+        output.dataProvider().addFeatures(copy_features(previous, output.fields()))
+        del previous
+
+        # Zones may reach beyond the exact distance by their buffer error
+        school_error, river_error = self.buffer_errors(sources["boundary"].extent())
+        zone_reach = {"school": self.school_distance + school_error, "river": self.river_distance + river_error}
+        population = sources["population"]
+        affected = set()
+        for name in changed:
+            snapshot = as_layer(self.incremental.path(name))
+            old = {geometry_key(feature.geometry()): feature.geometry() for feature in snapshot.getFeatures()}
+            new = {geometry_key(feature.geometry()): feature.geometry() for feature in sources[name].getFeatures()}
+            removed, added = changed_geometries(list(old), list(new))
+            self.feedback.pushInfo(f"{name}: {len(removed)} features removed and {len(added)} added")
+
+            for geometry in [old[key] for key in removed] + [new[key] for key in added]:
+                request = QgsFeatureRequest(geometry.boundingBox().buffered(zone_reach[name])).setNoAttributes()
+                affected.update(feature.id() for feature in population.getFeatures(request)
+                                if feature.geometry().distance(geometry) <= zone_reach[name])
+
+        if changed:
+            affected = list(affected)
+            self.feedback.pushInfo(f"Recomputing {len(affected)} population polygons")
+
+            if affected:
+                affected_layer = population.materialize(QgsFeatureRequest().setFilterFids(affected))
+                index = geometry_index(affected_layer)
+
+                # Every previous piece lies within the population polygon it was cut from
+                stale = []
+                for feature in output.getFeatures():
+                    point = feature.geometry().pointOnSurface()
+                    if any(index.geometry(candidate).contains(point)
+                           for candidate in index.intersects(point.boundingBox())):
+                        stale.append(feature.id())
+                output.dataProvider().deleteFeatures(stale)
+
+                affected_extent = affected_layer.extent()
+                affected_sources = {
+                    "population": affected_layer,
+                    "boundary": sources["boundary"].materialize(QgsFeatureRequest(affected_extent)),
+                }
+                for name in ("school", "river"):
+                    reach = QgsRectangle(*expand(rect_tuple(affected_extent), zone_reach[name]))
+                    affected_sources[name] = sources[name].materialize(QgsFeatureRequest(reach))
+                # Catchments also count the people of the polygons left as they were
+                affected_plan, affected_sources = count_whole_population(plan, affected_sources, population,
+                                                                         affected_extent)
+                result = run_plan_in_memory(affected_plan, affected_sources, self.feedback)
+                output.dataProvider().addFeatures(copy_features(result, output.fields()))
+
+        output.updateExtents()
+        step = self.feedback.end_step(output, step)
+        self.stepFinished.emit(self.feedback.format_step(step))
+        return output
+
+    def _save_incremental_state(self, result, sources, settings, source_keys):
+        """Keeps ``result`` and snapshots of the patchable sources for the next run."""
+        previous = self.incremental.load()
+        # The state must not describe files being rewritten if writing fails
+        self.incremental.invalidate()
+
+        write_geopackage(result, self.incremental.path("result"))
+        for name in PATCHABLE_SOURCES:
+            if (previous is None or previous["sources"].get(name) != source_keys[name]
+                    or not os.path.exists(self.incremental.path(name))):
+                write_geopackage(sources[name], self.incremental.path(name))
+
+        self.incremental.save(settings, source_keys)
+
+    def _execute_tiled(self, plan, sources):
+        """Runs the whole ``plan`` separately on every tile of the boundary extent.
+
+        Each population polygon is processed by the single tile owning it,
+        together with the boundary parts around it, the schools and rivers
+        within reach, see :meth:`source_reach`, and the population counted by
+        the catchments, see :func:`count_whole_population`, so appending the
+        tile results gives the untiled result, with the fields the stages add
+        to the population polygons. Tiles run concurrently on up to
+        :attr:`max_workers` threads; the stage cache is not used.
+        """
+        tiles = tile_grid(rect_tuple(sources["boundary"].extent()), self.tile_size)
+        self.step_count = len(tiles)
+        self._started_steps = 0
+        self._stage_progress = {tile.name: 0.0 for tile in tiles}
+
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._run_tile, plan, sources, tile) for tile in tiles]
+            try:
+                for future in as_completed(futures):
+                    if future.result() is not None:
+                        results.append(future.result())
+            except Exception:
+                self._cancel_active_stages()
+                raise
+
+        if results:
+            fields = results[0][0]
+        else:
+            # Stages may add attributes, the plan output of no polygon still has them
+            empty = dict(sources, population=sources["population"].materialize(
+                QgsFeatureRequest().setFilterFids([])))
+            fields = run_plan_in_memory(plan, empty, QgsProcessingFeedback()).fields()
+
+        output = memory_layer_like(sources["population"], "suitable_areas", fields)
+        for _, features in results:
+            output.dataProvider().addFeatures(features)
+        output.updateExtents()
+        return output
+
+    def _run_tile(self, plan, sources, tile):
+        """Runs ``plan`` on the part of the sources handled by ``tile``.
+
+        Called from a worker thread, which reopens the sources it reads.
+
+        :returns: The fields of the plan output and the suitable area
+            features of the tile, or None when the tile owns no polygon.
+        :rtype: tuple
+        """
+        if self.isCanceled():
+            raise RuntimeError("Analysis canceled.")
+
+        layers = {name: reopen_layer(layer) for name, layer in sources.items()}
+        population = layers["population"]
+
+        # Keep the polygons whose bounding box centre lies in the tile
+        request = QgsFeatureRequest(QgsRectangle(*tile.ownership_rect(rect_tuple(population.extent()))))
+        request.setNoAttributes()
+        owned = []
+        owned_extent = QgsRectangle()
+        owned_extent.setMinimal()
+        for feature in population.getFeatures(request):
+            bounding_box = feature.geometry().boundingBox()
+            if tile.owns(bounding_box.center().x(), bounding_box.center().y()):
+                owned.append(feature.id())
+                owned_extent.combineExtentWith(bounding_box)
+
+        if not owned:
+            self._set_stage_progress(tile.name, 1.0)
+            return None
+
+        tile_sources = {
+            "population": population.materialize(QgsFeatureRequest().setFilterFids(owned)),
+            "boundary": layers["boundary"].materialize(QgsFeatureRequest(owned_extent)),
+        }
+        for name in ("school", "river"):
+            reach = self.source_reach(name)
+            if reach is None:
+                # Nearest distances may be measured to any feature
+                tile_sources[name] = layers[name]
+            else:
+                tile_sources[name] = layers[name].materialize(
+                    QgsFeatureRequest(QgsRectangle(*expand(rect_tuple(owned_extent), reach))))
+        # Catchments also count the people of the polygons owned by other tiles
+        tile_plan, tile_sources = count_whole_population(plan, tile_sources, population, owned_extent)
+
+        feedback = QgsProcessingFeedback()
+        feedback.progressChanged.connect(lambda value: self._set_stage_progress(tile.name, value / 100.0))
+        with self._lock:
+            self._active_feedbacks.add(feedback)
+            self._started_steps += 1
+            self.stepChanged.emit(f"Tile {self._started_steps}/{self.step_count}: {tile.name}")
+
+        step = self.feedback.start_step(tile.name, tile_sources["population"])
+        try:
+            result = run_plan_in_memory(tile_plan, tile_sources, feedback)
+        finally:
+            with self._lock:
+                self._active_feedbacks.discard(feedback)
+
+        step = self.feedback.end_step(result, step)
+        self.stepFinished.emit(self.feedback.format_step(step))
+        self._set_stage_progress(tile.name, 1.0)
+        return result.fields(), list(result.getFeatures())
+
+    def _required_stages(self, plan, keys, cached):
+        """Returns the stages of ``plan`` which must run to compute its output.
+
+        Stages found in the cache are added to ``cached`` instead, with the
+        file holding their output, and their inputs are not required by them.
+        """
+        required = set()
+
+        def require(name):
+            if name not in plan.pipeline.stages or name in required or name in cached:
+                return
+
+            path = self.cache.get(keys[name]) if self.cache is not None else None
+            if path:
+                cached[name] = path
+                return
+
+            required.add(name)
+            for dependency in plan.pipeline.stages[name].dependencies():
+                require(dependency)
+
+        require(plan.output)
+        return [stage for stage in plan if stage.name in required]
+
+    def _run_stage(self, stage, outputs, keys, in_worker=False):
+        """Runs ``stage`` on the ``outputs`` of the stages it depends on.
+
+        :returns: The stage output and whether it is a temporary file.
+        :rtype: tuple
+        """
+        algorithm = PYTHON_ALGORITHMS.get(stage.algorithm)
+
+        parameters = dict(stage.parameters)
+        for key, value in stage.inputs.items():
+            names = value if isinstance(value, (list, tuple)) else [value]
+            inputs = []
+            for name in names:
+                layer = outputs[name]
+                if in_worker and isinstance(layer, QgsVectorLayer):
+                    layer = reopen_layer(layer)
+                elif algorithm is not None:
+                    layer = as_layer(layer)
+                inputs.append(layer)
+            parameters[key] = inputs if isinstance(value, (list, tuple)) else inputs[0]
+
+        if self.cache is not None:
+            destination = self.cache.path_for(keys[stage.name])
+        else:
+            destination = self._output_destination(stage, in_worker)
+
+        if algorithm is None:
+            algorithm = stage.algorithm
+            parameters['OUTPUT'] = destination
+
+        output = self._run_step(stage, algorithm, parameters)
+        if not isinstance(output, str) and (self.cache is not None or in_worker):
+            write_geopackage(output, destination)
+            output = destination
+
+        if self.cache is not None:
+            self.cache.add(keys[stage.name])
+            return output, False
+        return output, isinstance(output, str)
+
+    def _output_destination(self, stage, on_disk=False):
+        """Returns where the processing output of ``stage`` is written."""
+        use_disk = on_disk or self.storage == STORAGE_GEOPACKAGE
+        if self.storage == STORAGE_AUTO:
+            memory = current_memory_bytes()
+            use_disk = use_disk or (memory is not None and memory >= self.memory_limit_mb * 1024 * 1024)
+
+        if use_disk:
+            # GDAL creates the GeoPackage R-tree spatial index by default
+            return QgsProcessingUtils.generateTempFilename(f"{stage.name}.gpkg")
+        return f'memory:{stage.name}'
+
+    def _run_step(self, stage, algorithm, parameters):
+        """Runs a single processing algorithm, or a Python callable taking the
+        parameters and the feedback, and records its timing."""
+        if self.isCanceled():
+            raise RuntimeError("Analysis canceled.")
+
+        feedback = QgsProcessingFeedback()
+        feedback.progressChanged.connect(lambda value: self._set_stage_progress(stage.name, value / 100.0))
+        with self._lock:
+            self._active_feedbacks.add(feedback)
+            self._started_steps += 1
+            self.stepChanged.emit(f"Step {self._started_steps}/{self.step_count}: {stage.description}")
+
+        step = self.feedback.start_step(stage.name, parameters.get('INPUT', parameters.get('LAYERS')))
+        try:
+            if callable(algorithm):
+                output = algorithm(parameters, feedback)
+            else:
+                output = processing.run(algorithm, parameters, context=QgsProcessingContext(),
+                                        feedback=feedback)['OUTPUT']
+        finally:
+            with self._lock:
+                self._active_feedbacks.discard(feedback)
+
+        if feedback.isCanceled():
+            raise RuntimeError("Analysis canceled.")
+
+        step = self.feedback.end_step(output, step)
+        self.stepFinished.emit(self.feedback.format_step(step))
+        self._set_stage_progress(stage.name, 1.0)
+        return output
+
+    def _set_stage_progress(self, name, fraction):
+        """Updates the task progress from the progress of a single stage."""
+        with self._lock:
+            self._stage_progress[name] = fraction
+            self.setProgress(sum(self._stage_progress.values()) * 100.0 / len(self._stage_progress))
+
+    def _cancel_active_stages(self):
+        with self._lock:
+            for feedback in self._active_feedbacks:
+                feedback.cancel()
+
+
+class SweepTask(SchoolLocatorTask):
+    """Evaluates many scenarios of the analysis in a single background run.
+
+    The distances to the nearest school and river are measured once for
+    the polygons meeting the lowest population threshold; the result layer
+    holds those polygons with one 0/1 attribute per scenario, named by
+    :func:`sweep.scenario_field`, flagging where they are suitable.
+    :attr:`scenario_counts` holds the number of suitable polygons of each
+    scenario once the task has finished.
+    """
+
+    def __init__(self, layer_paths, scenarios, storage=STORAGE_MEMORY, memory_limit_mb=4096, cache=None,
+                 max_workers=1, tile_size=0, population_field="population"):
+        # Tiles must reach the schools and rivers within the largest distances
+        super().__init__(layer_paths,
+                         min(scenario.population_threshold for scenario in scenarios),
+                         max(scenario.school_distance for scenario in scenarios),
+                         max(scenario.river_distance for scenario in scenarios),
+                         storage=storage, memory_limit_mb=memory_limit_mb, cache=cache,
+                         max_workers=max_workers, tile_size=tile_size)
+        self.scenarios = list(scenarios)
+        self.population_field = population_field
+        self.scenario_counts = []
+
+    def source_reach(self, name):
+        """Returns how far outside the boundary features of the source ``name``
+        can still change the result, or None when every feature is read."""
+        return 0.0 if name == "population" else None
+
+    def report_precision(self):
+        """Distances are measured on the exact geometries, nothing to report."""
+
+    def plan(self, filterable_sources=()):
+        """Returns the optimised plan measuring the polygon distances."""
+        return plan_pipeline(build_distance_pipeline(self.population_threshold, self.population_field),
+                             filterable_sources)
+
+    def process_result(self, layer, sources):
+        """Flags the polygons of ``layer`` suitable in each scenario."""
+        output = memory_layer_like(layer, "suitable_areas")
+        provider = output.dataProvider()
+        provider.addAttributes([QgsField(scenario_field(index), QVariant.Int)
+                                for index in range(len(self.scenarios))])
+        output.updateFields()
+
+        fields = layer.fields()
+        population_index = fields.indexOf(self.population_field)
+        school_index = fields.indexOf(SCHOOL_DISTANCE_FIELD)
+        river_index = fields.indexOf(RIVER_DISTANCE_FIELD)
+
+        self.scenario_counts = [0] * len(self.scenarios)
+        features = []
+        for feature in layer.getFeatures():
+            attributes = feature.attributes()
+            population, school_distance, river_distance = [
+                attribute_value(attributes[index]) for index in (population_index, school_index, river_index)]
+
+            flags = []
+            for index, scenario in enumerate(self.scenarios):
+                suitable = scenario.is_suitable(population, school_distance, river_distance)
+                self.scenario_counts[index] += suitable
+                flags.append(int(suitable))
+
+            out_feature = QgsFeature(output.fields())
+            out_feature.setGeometry(feature.geometry())
+            out_feature.setAttributes(attributes + flags)
+            features.append(out_feature)
+
+        provider.addFeatures(features)
+        output.updateExtents()
+        return output
+
+
+class ScoringTask(SchoolLocatorTask):
+    """Ranks the candidate sites of the analysis by a weighted score.
+
+    Every polygon of the boundary meeting the population threshold is a
+    candidate; the school and river distances are scored rather than used
+    as cut offs, scaled by ``school_distance`` and ``river_distance``, see
+    :mod:`scoring`. The result layer holds the ``top_count`` best candidates
+    with their ``score`` and ``rank``; :attr:`ranking` holds the ``(feature
+    id, score)`` pairs of the plan output once the task has finished.
+    """
+
+    result_name = "Ranked Sites"
+
+    def __init__(self, layer_paths, population_threshold, school_distance, river_distance, top_count, weights,
+                 storage=STORAGE_MEMORY, memory_limit_mb=4096, cache=None, max_workers=1, tile_size=0,
+                 population_field="population"):
+        super().__init__(layer_paths, population_threshold, school_distance, river_distance,
+                         storage=storage, memory_limit_mb=memory_limit_mb, cache=cache,
+                         max_workers=max_workers, tile_size=tile_size)
+        self.top_count = top_count
+        # scoring.ScoreWeights of the population and distances
+        self.weights = weights
+        self.population_field = population_field
+        self.ranking = []
+
+    def source_reach(self, name):
+        """Returns how far outside the boundary features of the source ``name``
+        can still change the result, or None when every feature is read."""
+        return 0.0 if name == "population" else None
+
+    def report_precision(self):
+        """Distances are measured on the exact geometries, nothing to report."""
+
+    def plan(self, filterable_sources=()):
+        """Returns the optimised plan measuring the candidate distances."""
+        return plan_pipeline(build_distance_pipeline(self.population_threshold, self.population_field),
+                             filterable_sources)
+
+    def process_result(self, layer, sources):
+        """Returns the best scored candidates of ``layer``, best first."""
+        fields = layer.fields()
+        indexes = [fields.indexOf(name) for name in (self.population_field, SCHOOL_DISTANCE_FIELD,
+                                                     RIVER_DISTANCE_FIELD)]
+        # Only the scored attributes are read, the geometries of the top sites come later
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes(indexes)
+        ids = []
+        columns = ([], [], [])
+        for feature in layer.getFeatures(request):
+            ids.append(feature.id())
+            for column, index in zip(columns, indexes):
+                column.append(attribute_value(feature.attributes()[index]))
+
+        self.ranking = rank_sites(ids, *columns, self.weights, self.top_count,
+                                  self.school_distance, self.river_distance)
+
+        output = memory_layer_like(layer, "ranked_sites")
+        provider = output.dataProvider()
+        provider.addAttributes([QgsField("score", QVariant.Double), QgsField("rank", QVariant.Int)])
+        output.updateFields()
+
+        top_features = {feature.id(): feature for feature in
+                        layer.getFeatures(QgsFeatureRequest().setFilterFids([fid for fid, _ in self.ranking]))}
+        features = []
+        for rank, (feature_id, score) in enumerate(self.ranking, 1):
+            feature = top_features[feature_id]
+            out_feature = QgsFeature(output.fields())
+            out_feature.setGeometry(feature.geometry())
+            out_feature.setAttributes(feature.attributes() + [score, rank])
+            features.append(out_feature)
+
+        provider.addFeatures(features)
+        output.updateExtents()
+        return output
+
+
+class PlacementTask(SchoolLocatorTask):
+    """Chooses where to build new schools to cover the most unserved population.
+
+    Population polygons of the boundary count as served when their
+    representative point lies within ``catchment_distance`` of a school,
+    the rule the catchment populations of the analysis follow, see
+    :mod:`catchment`. Candidate sites are the centres of a
+    ``candidate_spacing`` grid inside the boundary, farther than
+    ``river_distance`` from any river; the polygons each of them would
+    serve are found once through an index of the points before
+    :func:`placement.lazy_greedy` picks ``site_count`` of them. The result
+    is a point layer of the sites in the order they were chosen, with the
+    population each newly covers; :attr:`covered_population` holds the
+    population served by the existing schools and by the new sites. Unlike
+    the catchment populations, which also count people living beyond the
+    boundary, only the population polygons clipped to the boundary are
+    served. All layers are expected to share a CRS.
+    """
+
+    result_name = "New School Sites"
+
+    def __init__(self, layer_paths, site_count, catchment_distance, candidate_spacing=0.0, river_distance=0.0,
+                 storage=STORAGE_MEMORY, memory_limit_mb=4096, cache=None, max_workers=1, tile_size=0,
+                 population_field="population"):
+        super().__init__(layer_paths, 0, catchment_distance, river_distance,
+                         storage=storage, memory_limit_mb=memory_limit_mb, cache=cache,
+                         max_workers=max_workers, tile_size=tile_size)
+        self.site_count = site_count
+        self.catchment_distance = catchment_distance
+        # Spacing of the candidate grid, half the catchment distance when 0
+        self.candidate_spacing = candidate_spacing or catchment_distance / 2
+        self.population_field = population_field
+        self.covered_population = (0.0, 0.0)
+
+    def source_reach(self, name):
+        """Returns how far outside the boundary features of the source ``name``
+        can still change the result, or None when every feature is read."""
+        return 0.0 if name == "population" else None
+
+    def report_precision(self):
+        """Distances are measured on the exact geometries, nothing to report."""
+
+    def plan(self, filterable_sources=()):
+        """Returns the optimised plan measuring the distance of the
+        population polygons to the existing schools."""
+        return plan_pipeline(build_distance_pipeline(population_field=self.population_field), filterable_sources)
+
+    def process_result(self, layer, sources):
+        """Returns the new school sites chosen to serve the population of ``layer``."""
+        x, y, population = population_points(layer, self.population_field)
+        index = PointIndex(x, y)
+        covered = np.zeros(len(population), dtype=bool)
+        for feature in sources["school"].getFeatures(QgsFeatureRequest().setNoAttributes()):
+            if not feature.geometry().isNull():
+                covered[catchment_points(index, *outline(feature.geometry()), self.catchment_distance)] = True
+
+        self.stepChanged.emit("Finding the population each candidate site would serve")
+        boundary = QgsGeometry.unaryUnion([feature.geometry() for feature in sources["boundary"].getFeatures()])
+        engine = QgsGeometry.createGeometryEngine(boundary.constGet())
+        engine.prepareGeometry()
+        rivers = geometry_index(sources["river"]) if self.river_distance > 0 else None
+
+        sites = []
+        coverage = []
+        for x, y in candidate_points(rect_tuple(boundary.boundingBox()), self.candidate_spacing):
+            if self.isCanceled():
+                raise RuntimeError("Analysis canceled.")
+            site = QgsGeometry.fromPointXY(QgsPointXY(x, y))
+            if not engine.contains(site.constGet()):
+                continue
+            if rivers is not None:
+                river_distance = nearest_distance(rivers, site)
+                if river_distance is not None and river_distance < self.river_distance:
+                    continue
+            served = catchment_points(index, [], np.array([[x, y]]), np.array([[x, y]]), self.catchment_distance)
+            if len(served):
+                sites.append(site)
+                coverage.append(served)
+        self.feedback.pushInfo(f"{len(sites)} candidate sites serve some population")
+
+        self.stepChanged.emit(f"Choosing {self.site_count} new school sites")
+        chosen = lazy_greedy(coverage, population, self.site_count, covered)
+
+        served_population = float(np.nansum(population[covered]))
+        self.covered_population = (served_population, served_population + sum(gain for _, gain in chosen))
+
+        output = QgsVectorLayer(f"Point?crs={layer.crs().authid()}", "new_school_sites", "memory")
+        output.setCrs(layer.crs())
+        provider = output.dataProvider()
+        provider.addAttributes([QgsField("rank", QVariant.Int), QgsField("new_pop", QVariant.Double)])
+        output.updateFields()
+
+        features = []
+        for rank, (position, gain) in enumerate(chosen, 1):
+            feature = QgsFeature(output.fields())
+            feature.setGeometry(sites[position])
+            feature.setAttributes([rank, gain])
+            features.append(feature)
+        provider.addFeatures(features)
+        output.updateExtents()
+        return output
+
+
+class PreviewTask(QgsTask):
+    """Measures the nearest school and river distances of the population
+    polygons within an extent, for the live preview of the dialog.
+
+    The thresholds are applied afterwards as a subset string of
+    :attr:`result_layer`, see :func:`pipeline.suitability_expression`, so
+    changing them does not need another task.
+    """
+
+    def __init__(self, layer_paths, extent, crs, transform_context):
+        super().__init__("School suitability preview", QgsTask.CanCancel)
+        self.layer_paths = layer_paths
+        # Extent to preview, in the coordinate reference system ``crs``
+        self.extent = extent
+        self.crs = crs
+        self.transform_context = transform_context
+
+        self.feedback = None
+        self.result_layer = None
+        self.exception = None
+
+    def cancel(self):
+        if self.feedback:
+            self.feedback.cancel()
+        super().cancel()
+
+    def run(self):
+        """Computes the distance attributes. Called from a worker thread."""
+        self.feedback = QgsProcessingFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+
+        try:
+            population_layer = QgsVectorLayer(self.layer_paths["Population Data"], "Population Layer", "ogr")
+            school_layer = QgsVectorLayer(self.layer_paths["School Layer"], "School Layer", "ogr")
+            river_layer = QgsVectorLayer(self.layer_paths["River Layer"], "River Layer", "ogr")
+            boundary_layer = QgsVectorLayer(self.layer_paths["Boundary Layer"], "Boundary Layer", "ogr")
+
+            if not all([population_layer.isValid(), school_layer.isValid(),
+                        river_layer.isValid(), boundary_layer.isValid()]):
+                raise RuntimeError("One or more layers could not be loaded.")
+
+            population_extent = QgsCoordinateTransform(
+                self.crs, population_layer.crs(), self.transform_context).transformBoundingBox(self.extent)
+            boundary_extent = QgsCoordinateTransform(
+                self.crs, boundary_layer.crs(), self.transform_context).transformBoundingBox(self.extent)
+
+            # Distances are measured against every school and river, only the polygons are restricted
+            sources = {
+                "population": population_layer.materialize(QgsFeatureRequest(population_extent)),
+                "school": school_layer,
+                "river": river_layer,
+                "boundary": boundary_layer.materialize(QgsFeatureRequest(boundary_extent)),
+            }
+            result = run_plan_in_memory(plan_pipeline(build_distance_pipeline()), sources, self.feedback)
+            result.setName("Suitable Areas Preview")
+            result.moveToThread(QgsApplication.instance().thread())
+            self.result_layer = result
+
+        except Exception as e:
+            self.exception = e
+            return False
+
+        return True
+
+
+class PostgisTask(QgsTask):
+    """Runs the school suitability analysis inside a PostGIS database.
+
+    ``tables`` maps the ``population``, ``school``, ``river`` and
+    ``boundary`` sources to ``schema.table`` names of the database reached
+    with the ``psycopg2.connect`` keyword arguments ``connection_parameters``,
+    borrowing the connection from ``pool`` when one is given. The suitable
+    areas are streamed back through a server side cursor into the memory
+    layer :attr:`result_layer`.
+    """
+
+    stepChanged = pyqtSignal(str)
+    stepFinished = pyqtSignal(str)
+
+    def __init__(self, connection_parameters, tables, population_threshold, school_distance, river_distance,
+                 population_field="population", pool=None):
+        super().__init__("School suitability analysis (PostGIS)", QgsTask.CanCancel)
+        self.connection_parameters = connection_parameters
+        # Optional postgis_backend.ConnectionPool shared by the runs
+        self.pool = pool
+        self.tables = tables
+        self.population_threshold = population_threshold
+        self.school_distance = school_distance
+        self.river_distance = river_distance
+        self.population_field = population_field
+
+        self.feedback = None
+        self.result_layer = None
+        self.exception = None
+        self._connection = None
+
+    def cancel(self):
+        """Cancels the task and the query running in the database."""
+        if self._connection is not None:
+            self._connection.cancel()
+        super().cancel()
+
+    def run(self):
+        """Executes the analysis query. Called from a worker thread."""
+        self.feedback = StepTimingFeedback()
+        try:
+            with self._connect() as connection:
+                self._connection = connection
+                try:
+                    self.stepChanged.emit("Running the analysis in the database")
+                    step = self.feedback.start_step("postgis_query")
+                    srid, cursor = execute_suitability_query(connection, self.tables, self.population_threshold,
+                                                             self.school_distance, self.river_distance,
+                                                             self.population_field, "school_locator_suitable_areas")
+                    with cursor:
+                        self.result_layer = self._read_result(srid, cursor)
+                    step = self.feedback.end_step(self.result_layer, step)
+                    self.stepFinished.emit(self.feedback.format_step(step))
+                finally:
+                    self._connection = None
+
+            self.result_layer.moveToThread(QgsApplication.instance().thread())
+
+        except Exception as e:
+            self.exception = e
+            return False
+
+        return True
+
+    @contextmanager
+    def _connect(self):
+        if self.pool is not None:
+            with self.pool.connection(self.connection_parameters) as connection:
+                yield connection
+            return
+
+        # psycopg2 is only needed by the database backend
+        import psycopg2
+        connection = psycopg2.connect(**self.connection_parameters)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def _read_result(self, srid, cursor):
+        """Reads the ``(population, wkb)`` rows of ``cursor`` into a memory layer.
+
+        Rows are added to the layer batch by batch as they arrive.
+        """
+        layer = QgsVectorLayer(f"MultiPolygon?crs=EPSG:{srid}", "Suitable Areas", "memory")
+        layer.dataProvider().addAttributes([QgsField("population", QVariant.Double)])
+        layer.updateFields()
+
+        features = []
+        for population, wkb in cursor:
+            if self.isCanceled():
+                raise RuntimeError("Analysis canceled.")
+            geometry = QgsGeometry()
+            geometry.fromWkb(bytes(wkb))
+            feature = QgsFeature(layer.fields())
+            feature.setGeometry(geometry)
+            # numeric columns come back as Decimal
+            feature.setAttributes([None if population is None else float(population)])
+            features.append(feature)
+
+            if len(features) >= BATCH_SIZE:
+                layer.dataProvider().addFeatures(features)
+                features = []
+
+        layer.dataProvider().addFeatures(features)
+        layer.updateExtents()
+        return layer
@@ -0,0 +1,135 @@
+"""Ranking of candidate sites by a weighted suitability score.
+
+Rather than a suitable or unsuitable answer, every candidate population
+polygon gets a score between 0 and 1 adding up, with user weights, the
+population it would serve and how far it lies from the nearest existing
+school and from rivers. Each criterion is scaled to [0, 1] first: the
+population by the largest population of the candidates and the distances
+by a reference distance, beyond which a site scores fully.
+
+Scores are computed on arrays of the candidate attributes, a batch at a
+time, and only the best candidates are kept in a heap, so the geometries
+of the top sites alone need reading.
+"""
+
+import heapq
+
+import numpy as np
+
+# Candidates scored at a time
+BATCH_SIZE = 10000
+
+
+class ScoreWeights:
+    """Relative importance of the population served and of the distances
+    to the nearest school and river."""
+
+    def __init__(self, population=1.0, school=1.0, river=1.0):
+        self.population = population
+        self.school = school
+        self.river = river
+
+    def normalised(self):
+        """Returns the weights scaled to add up to 1, equal when all are 0."""
+        total = self.population + self.school + self.river
+        if total <= 0:
+            return 1 / 3, 1 / 3, 1 / 3
+        return self.population / total, self.school / total, self.river / total
+
+    def describe(self):
+        return f"population {self.population:g}, schools {self.school:g}, rivers {self.river:g}"
+
+
+def distance_scores(distances, reference):
+    """Returns ``distances`` scaled by ``reference`` and capped at 1.
+
+    Missing distances, NaN when there is no school or river at all, and any
+    distance when ``reference`` is not positive score 1.
+    """
+    distances = np.asarray(distances, dtype=float)
+    if reference <= 0:
+        return np.ones_like(distances)
+    return np.where(np.isnan(distances), 1.0, np.minimum(distances / reference, 1.0))
+
+
+def site_scores(population, school_distances, river_distances, weights,
+                population_reference, school_reference, river_reference):
+    """Returns the score of every candidate.
+
+    :param population: Population of the candidates, NaN counting as 0.
+    :param school_distances: Distances to the nearest school.
+    :param river_distances: Distances to the nearest river.
+    :param weights: Weights of the criteria.
+    :type weights: ScoreWeights
+
+    :param population_reference: Population scoring 1, usually the largest.
+    :param school_reference: Distance from schools scoring 1.
+    :param river_reference: Distance from rivers scoring 1.
+
+    :returns: Scores between 0 and 1.
+    :rtype: numpy.ndarray
+    """
+    population = np.nan_to_num(np.asarray(population, dtype=float))
+    if population_reference > 0:
+        population_scores = np.clip(population / population_reference, 0.0, 1.0)
+    else:
+        population_scores = np.zeros_like(population)
+
+    population_weight, school_weight, river_weight = weights.normalised()
+    return (population_weight * population_scores
+            + school_weight * distance_scores(school_distances, school_reference)
+            + river_weight * distance_scores(river_distances, river_reference))
+
+
+def top_k(batches, k):
+    """Returns the ``k`` best scored candidates.
+
+    Each batch only offers its own ``k`` best candidates to a heap holding
+    the best ones seen so far. Ties go to the lowest id.
+
+    :param batches: Pairs of arrays of candidate ids and of their scores.
+    :returns: ``(id, score)`` pairs, best first.
+    :rtype: list
+    """
+    if k <= 0:
+        return []
+
+    heap = []
+    for ids, scores in batches:
+        ids, scores = np.asarray(ids), np.asarray(scores, dtype=float)
+        if len(scores) > k:
+            # Keep every candidate tied with the k-th best, the heap settles ties
+            best = scores >= np.partition(scores, -k)[-k]
+            ids, scores = ids[best], scores[best]
+        for identifier, score in zip(ids.tolist(), scores.tolist()):
+            # The smallest entry is the worst candidate, the highest id among ties
+            entry = (score, -identifier)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+    return [(-negative_id, score) for score, negative_id in sorted(heap, reverse=True)]
+
+
+def rank_sites(ids, population, school_distances, river_distances, weights, k,
+               school_reference, river_reference, batch_size=BATCH_SIZE):
+    """Scores every candidate and returns the ``k`` best, see :func:`top_k`.
+
+    The candidates are given as arrays of their ids and attributes; the
+    population is scaled by its largest value.
+    """
+    ids = np.asarray(ids)
+    population = np.asarray(population, dtype=float)
+    school_distances = np.asarray(school_distances, dtype=float)
+    river_distances = np.asarray(river_distances, dtype=float)
+    known = population[~np.isnan(population)]
+    population_reference = float(known.max()) if len(known) else 0.0
+
+    def batches():
+        for start in range(0, len(ids), batch_size):
+            stop = start + batch_size
+            yield ids[start:stop], site_scores(population[start:stop], school_distances[start:stop],
+                                               river_distances[start:stop], weights, population_reference,
+                                               school_reference, river_reference)
+
+    return top_k(batches(), k)
@@ -0,0 +1,166 @@
+"""On-disk cache of pipeline stage outputs.
+
+Every stage output is stored as a GeoPackage named after a key hashing the
+stage algorithm, its parameters and the keys of its inputs. Source keys
+hash the input files themselves, so a cached output is reused whenever the
+same stage runs again on unchanged data, and nothing else needs to be
+invalidated when an input file changes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Files making up a single shapefile dataset
+SHAPEFILE_SIDECARS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(path):
+    """Returns a digest of the path, size and modification time of a dataset.
+
+    ``path`` may be a layer source such as ``data.gpkg|layername=schools``;
+    the sidecar files of a shapefile are fingerprinted along with it.
+    """
+    file_path, _, options = path.partition("|")
+    file_path = os.path.abspath(file_path)
+
+    stem, extension = os.path.splitext(file_path)
+    files = [file_path]
+    if extension.lower() == ".shp":
+        files = [stem + sidecar for sidecar in SHAPEFILE_SIDECARS]
+
+    stats = []
+    for name in files:
+        if os.path.exists(name):
+            stat = os.stat(name)
+            stats.append([name, stat.st_size, stat.st_mtime_ns])
+    return _digest({"path": file_path, "options": options, "files": stats})
+
+
+def source_key(path, subset="", restriction=None):
+    """Returns the cache key of a source read from ``path`` with ``subset``.
+
+    :param restriction: Any JSON value describing how the features read
+        were further restricted, such as the key of the study area.
+    """
+    key = {"source": file_fingerprint(path), "subset": subset}
+    if restriction is not None:
+        key["restriction"] = restriction
+    return _digest(key)
+
+
+def stage_key(stage, input_keys):
+    """Returns the cache key of ``stage`` given the keys of its inputs.
+
+    :param stage: The stage to key.
+    :type stage: pipeline.Stage
+
+    :param input_keys: Maps source and stage names to their keys.
+    :type input_keys: dict
+    """
+    inputs = {}
+    for parameter, value in stage.inputs.items():
+        if isinstance(value, (list, tuple)):
+            inputs[parameter] = [input_keys[name] for name in value]
+        else:
+            inputs[parameter] = input_keys[value]
+    return _digest({"algorithm": stage.algorithm, "parameters": stage.parameters, "inputs": inputs})
+
+
+def plan_keys(plan, source_keys):
+    """Returns the cache keys of all sources and stages of ``plan``."""
+    keys = dict(source_keys)
+    for stage in plan:
+        keys[stage.name] = stage_key(stage, keys)
+    return keys
+
+
+class StageCache:
+    """Least recently used cache of stage outputs stored in ``directory``.
+
+    :meth:`trim` shrinks the cache back to ``max_bytes`` by evicting the
+    least recently used outputs first; it is not called while a pipeline
+    may still read cached files. An index of the entries is kept in
+    ``index.json`` so that usage survives between QGIS sessions.
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._entries = self._load_index()
+
+    def path_for(self, key):
+        """Returns the file the output keyed ``key`` is stored in."""
+        return os.path.join(self.directory, f"{key}.gpkg")
+
+    def get(self, key):
+        """Returns the cached file for ``key``, or None on a cache miss."""
+        with self._lock:
+            path = self.path_for(key)
+            if key not in self._entries or not os.path.exists(path):
+                self._entries.pop(key, None)
+                return None
+            self._entries[key]["last_used"] = time.time()
+            self._save_index()
+            return path
+
+    def __contains__(self, key):
+        return key in self._entries and os.path.exists(self.path_for(key))
+
+    def add(self, key):
+        """Registers the file written to :meth:`path_for` for ``key``."""
+        with self._lock:
+            path = self.path_for(key)
+            self._entries[key] = {"size": os.path.getsize(path), "last_used": time.time()}
+            self._save_index()
+
+    def trim(self):
+        """Evicts the least recently used outputs until the cache fits ``max_bytes``."""
+        with self._lock:
+            by_age = sorted(self._entries, key=lambda key: self._entries[key]["last_used"])
+            for key in by_age:
+                if self.size() <= self.max_bytes:
+                    break
+                self._remove(key)
+            self._save_index()
+
+    def size(self):
+        """Returns the total size in bytes of the cached outputs."""
+        return sum(entry["size"] for entry in self._entries.values())
+
+    def clear(self):
+        """Removes every cached output."""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+            self._save_index()
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        path = self.path_for(key)
+        for name in (path, path + "-wal", path + "-shm"):
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, self.INDEX_FILE), encoding="utf-8") as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        with open(os.path.join(self.directory, self.INDEX_FILE), "w", encoding="utf-8") as index_file:
+            json.dump(self._entries, index_file)
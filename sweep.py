@@ -0,0 +1,83 @@
+"""Evaluation of many analysis scenarios from a single pass over the data.
+
+A scenario is one combination of population threshold, school distance and
+river distance. Rather than running the analysis once per scenario, the
+distance from every population polygon to the nearest school and river is
+measured once; each scenario then only compares numbers. A polygon is
+suitable in a scenario when it has enough people and lies entirely beyond
+both distances, so polygons the full analysis would only cut are left out.
+"""
+
+import itertools
+
+
+class Scenario:
+    """A single combination of analysis parameters."""
+
+    def __init__(self, population_threshold, school_distance, river_distance):
+        self.population_threshold = population_threshold
+        self.school_distance = school_distance
+        self.river_distance = river_distance
+
+    def is_suitable(self, population, school_distance, river_distance):
+        """Returns whether a polygon is suitable in this scenario.
+
+        :param population: Population of the polygon.
+        :param school_distance: Distance to the nearest school, None if there
+            are no schools.
+        :param river_distance: Distance to the nearest river, None if there
+            are no rivers.
+        """
+        if population is None or population < self.population_threshold:
+            return False
+        if school_distance is not None and school_distance < self.school_distance:
+            return False
+        if river_distance is not None and river_distance < self.river_distance:
+            return False
+        return True
+
+    def describe(self):
+        return (f"population >= {self.population_threshold:g}, "
+                f"schools >= {self.school_distance:g}, rivers >= {self.river_distance:g}")
+
+    def __eq__(self, other):
+        return isinstance(other, Scenario) and self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        return f"Scenario({self.population_threshold!r}, {self.school_distance!r}, {self.river_distance!r})"
+
+    def _values(self):
+        return self.population_threshold, self.school_distance, self.river_distance
+
+
+def value_range(start, stop, step):
+    """Returns the values from ``start`` to ``stop`` included, ``step`` apart.
+
+    A non positive ``step`` or a ``stop`` below ``start`` gives ``[start]``.
+    """
+    if step <= 0 or stop <= start:
+        return [start]
+
+    count = int((stop - start) / step + 1e-9)
+    # Multiply rather than accumulate so that float steps do not drift
+    return [start + index * step for index in range(count + 1)]
+
+
+def scenario_grid(population_thresholds, school_distances, river_distances):
+    """Returns every combination of the given parameter values.
+
+    :rtype: list of Scenario
+    """
+    return [Scenario(*values) for values in
+            itertools.product(population_thresholds, school_distances, river_distances)]
+
+
+def scenario_field(index):
+    """Returns the name of the attribute flagging the scenario at ``index``.
+
+    Names are kept within the ten characters allowed in shapefiles.
+    """
+    return f"scen_{index + 1}"
@@ -0,0 +1,82 @@
+# coding=utf-8
+"""Catchment population test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import unittest
+
+import numpy as np
+
+from catchment import PointIndex, catchment_points, catchment_population, points_in_rings, segment_distances
+
+SQUARE = np.array([[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 10.0]])
+HOLE = np.array([[4.0, 4.0], [6.0, 4.0], [6.0, 6.0], [4.0, 6.0]])
+
+
+def ring_segments(ring):
+    return ring, np.roll(ring, -1, axis=0)
+
+
+class CatchmentTest(unittest.TestCase):
+    """Test the population within a catchment distance is summed exactly."""
+
+    def test_point_index(self):
+        """Test the index returns exactly the points within a rectangle."""
+        generator = np.random.default_rng(25)
+        x, y = generator.random(2000) * 100, generator.random(2000) * 50
+        index = PointIndex(x, y)
+        rect = (20.0, 10.0, 45.0, 30.0)
+
+        expected = np.flatnonzero((x >= 20) & (x <= 45) & (y >= 10) & (y <= 30))
+        self.assertEqual(sorted(index.query(rect).tolist()), expected.tolist())
+        self.assertEqual(len(PointIndex([], []).query(rect)), 0)
+
+    def test_points_in_rings(self):
+        """Test points in a hole are outside the polygon."""
+        inside = points_in_rings([5.0, 2.0, 12.0], [5.0, 2.0, 5.0], [SQUARE, HOLE])
+        self.assertEqual(inside.tolist(), [False, True, False])
+
+    def test_segment_distances(self):
+        """Test distances to segments and to segments reduced to a point."""
+        starts = np.array([[0.0, 0.0], [20.0, 0.0]])
+        ends = np.array([[10.0, 0.0], [20.0, 0.0]])
+
+        distances = segment_distances([5.0, -3.0, 20.0, 17.0], [2.0, 4.0, 3.0, 0.0], starts, ends)
+        np.testing.assert_allclose(distances, [2.0, 5.0, 3.0, 3.0])
+        self.assertTrue(np.isinf(segment_distances([1.0], [1.0], np.empty((0, 2)), np.empty((0, 2)))).all())
+
+    def test_catchment_population(self):
+        """Test the sum matches checking every point against the polygon."""
+        generator = np.random.default_rng(25)
+        x, y = generator.random(5000) * 40 - 15, generator.random(5000) * 40 - 15
+        population = generator.integers(0, 100, 5000).astype(float)
+        population[::7] = np.nan
+        starts, ends = zip(*(ring_segments(ring) for ring in (SQUARE, HOLE)))
+        starts, ends = np.concatenate(starts), np.concatenate(ends)
+
+        within = (segment_distances(x, y, starts, ends) <= 3.0) | points_in_rings(x, y, [SQUARE, HOLE])
+        total = catchment_population(PointIndex(x, y), population, [SQUARE, HOLE], starts, ends, 3.0)
+        self.assertAlmostEqual(total, np.nansum(population[within]))
+
+        # A point site has no rings, only its distance counts
+        point = np.array([[0.0, 0.0]])
+        near = np.hypot(x, y) <= 5.0
+        self.assertAlmostEqual(catchment_population(PointIndex(x, y), population, [], point, point, 5.0),
+                               np.nansum(population[near]))
+        self.assertEqual(sorted(catchment_points(PointIndex(x, y), [], point, point, 5.0)),
+                         list(np.flatnonzero(near)))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CatchmentTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
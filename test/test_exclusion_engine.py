@@ -0,0 +1,81 @@
+# coding=utf-8
+"""Exclusion engine test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import math
+import unittest
+
+from qgis.core import QgsGeometry, QgsPointXY, QgsRectangle
+
+from ..exclusion_engine import exclude_schools_and_rivers, split_lines
+
+from .utilities import get_qgis_app, memory_layer
+QGIS_APP = get_qgis_app()
+
+SEGMENTS = 8
+
+
+def population_grid():
+    return [QgsGeometry.fromRect(QgsRectangle(x * 100, y * 100, x * 100 + 100, y * 100 + 100))
+            for x in range(10) for y in range(10)]
+
+
+def winding_river():
+    """A river of 200 vertices winding across the grid, and a second part."""
+    points = ", ".join(f"{x * 5} {500 + 120 * math.sin(x / 6)}" for x in range(200))
+    return QgsGeometry.fromWkt(f"MULTILINESTRING(({points}), (150 50, 150 950))")
+
+
+class ExclusionEngineTest(unittest.TestCase):
+    """Test the spatial index engine matches the buffer, dissolve and difference chain."""
+
+    def test_same_as_dissolved_buffer_difference(self):
+        """Test the suitable areas equal the polygons cut by the dissolved buffers."""
+        population = memory_layer("Polygon", population_grid(), [float(index) for index in range(100)])
+        schools = memory_layer("Point", [QgsGeometry.fromWkt("POINT(250 250)"),
+                                         QgsGeometry.fromWkt("POINT(720 810)")])
+        rivers = memory_layer("MultiLineString", [winding_river()])
+
+        result = exclude_schools_and_rivers({'INPUT': population, 'SCHOOLS': schools, 'RIVERS': rivers,
+                                             'SCHOOL_DISTANCE': 120.0, 'RIVER_DISTANCE': 30.0,
+                                             'SEGMENTS': SEGMENTS})
+
+        dissolved = QgsGeometry.unaryUnion(
+            [feature.geometry().buffer(120.0, SEGMENTS) for feature in schools.getFeatures()]
+            + [feature.geometry().buffer(30.0, SEGMENTS) for feature in rivers.getFeatures()])
+        expected = QgsGeometry.unaryUnion([feature.geometry().difference(dissolved)
+                                           for feature in population.getFeatures()])
+        actual = QgsGeometry.unaryUnion([feature.geometry() for feature in result.getFeatures()])
+
+        # Buffers of the river pieces only differ from the whole river buffer
+        # by the approximation of the round joins where the pieces meet
+        self.assertLess(actual.symDifference(expected).area(), 1e-3 * expected.area())
+        self.assertEqual(sorted(feature["population"] for feature in result.getFeatures()),
+                         sorted(feature["population"] for feature in population.getFeatures()
+                                if not feature.geometry().difference(dissolved).isEmpty()))
+
+    def test_split_lines(self):
+        """Test long lines are cut into pieces covering them exactly."""
+        river = winding_river()
+        pieces = split_lines(river, 32)
+
+        self.assertTrue(all(len(piece.asPolyline()) <= 32 for piece in pieces))
+        self.assertAlmostEqual(sum(piece.length() for piece in pieces), river.length())
+        # The short part is kept whole
+        self.assertEqual(pieces[-1].asPolyline(), [QgsPointXY(150, 50), QgsPointXY(150, 950)])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ExclusionEngineTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
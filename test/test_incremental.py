@@ -0,0 +1,66 @@
+# coding=utf-8
+"""Incremental re-analysis test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from incremental import IncrementalState, changed_geometries
+
+
+class IncrementalStateTest(unittest.TestCase):
+    """Test changes since the previous run are detected."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.state = IncrementalState(self.directory)
+        self.settings = {"engine": "processing", "school_distance": 500.0}
+        self.keys = {"population": "p1", "school": "s1", "river": "r1", "boundary": "b1"}
+        for name in ("result", "school", "river"):
+            open(self.state.path(name), "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_changed_geometries(self):
+        """Test moved features are removed and added, whatever their order."""
+        removed, added = changed_geometries([b"a", b"b", b"c"], [b"c", b"d", b"a"])
+
+        self.assertEqual(removed, [b"b"])
+        self.assertEqual(added, [b"d"])
+        self.assertEqual(changed_geometries([b"a", b"a"], [b"a"]), ([b"a"], []))
+
+    def test_changed_sources(self):
+        """Test only school and river changes can be patched."""
+        self.assertIsNone(self.state.changed_sources(self.settings, self.keys))
+
+        self.state.save(self.settings, self.keys)
+        self.assertEqual(self.state.changed_sources(self.settings, self.keys), [])
+        self.assertEqual(self.state.changed_sources(self.settings, dict(self.keys, school="s2")), ["school"])
+        self.assertIsNone(self.state.changed_sources(self.settings, dict(self.keys, population="p2")))
+        self.assertIsNone(self.state.changed_sources(dict(self.settings, school_distance=800.0), self.keys))
+
+    def test_missing_result(self):
+        """Test a run is not patched when its result is gone."""
+        self.state.save(self.settings, self.keys)
+        os.remove(self.state.path("result"))
+
+        self.assertIsNone(self.state.changed_sources(self.settings, self.keys))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(IncrementalStateTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,133 @@
+# coding=utf-8
+"""Pipeline planner test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import math
+import unittest
+
+from pipeline import (ENGINE_DISTANCE_ATTRIBUTES, ENGINE_RASTER, ENGINE_SPATIAL_INDEX, KIND_CLIP, Pipeline, Stage,
+                      build_suitability_pipeline, max_buffer_error, plan)
+from stage_cache import plan_keys
+
+
+class PipelinePlannerTest(unittest.TestCase):
+    """Test the planner removes redundant work."""
+
+    def test_final_clip_skipped(self):
+        """Test the second boundary clip is removed."""
+        result = plan(build_suitability_pipeline(100, 500.0, 50.0))
+        names = [stage.name for stage in result]
+
+        self.assertNotIn("final_clip", names)
+        self.assertEqual(result.output, "difference")
+        self.assertEqual(len(result), 6)
+
+    def test_filter_before_clip(self):
+        """Test the population filter runs before the boundary clip."""
+        result = plan(build_suitability_pipeline(100, 500.0, 50.0))
+        stages = {stage.name: stage for stage in result}
+        names = [stage.name for stage in result]
+
+        self.assertEqual(stages["extract_high_population"].inputs["INPUT"], "population")
+        self.assertEqual(stages["clip_population"].inputs["INPUT"], "extract_high_population")
+        self.assertEqual(stages["difference"].inputs["INPUT"], "clip_population")
+        self.assertLess(names.index("extract_high_population"), names.index("clip_population"))
+
+    def test_spatial_index_engine(self):
+        """Test the spatial index engine replaces the buffer stages."""
+        result = plan(build_suitability_pipeline(100, 500.0, 50.0, ENGINE_SPATIAL_INDEX))
+
+        self.assertEqual([stage.name for stage in result],
+                         ["extract_high_population", "clip_population", "spatial_index_exclusion"])
+
+    def test_filter_pushed_into_provider(self):
+        """Test the population threshold becomes a provider filter."""
+        result = plan(build_suitability_pipeline(100, 500.0, 50.0), ["population", "school"])
+        stages = {stage.name: stage for stage in result}
+
+        self.assertNotIn("extract_high_population", stages)
+        self.assertEqual(stages["clip_population"].inputs["INPUT"], "population")
+        self.assertEqual(result.source_filters, {"population": '"population" >= 100'})
+
+    def test_distance_attributes_engine(self):
+        """Test the distance stage does not depend on the thresholds."""
+        sources = {name: name for name in ["population", "school", "river", "boundary"]}
+        first = plan(build_suitability_pipeline(100, 500.0, 50.0, ENGINE_DISTANCE_ATTRIBUTES))
+        second = plan(build_suitability_pipeline(200, 800.0, 20.0, ENGINE_DISTANCE_ATTRIBUTES))
+        first_keys = plan_keys(first, sources)
+        second_keys = plan_keys(second, sources)
+
+        self.assertEqual([stage.name for stage in first],
+                         ["clip_population", "nearest_distances", "select_suitable"])
+        self.assertEqual(first_keys["nearest_distances"], second_keys["nearest_distances"])
+        self.assertNotEqual(first_keys["select_suitable"], second_keys["select_suitable"])
+
+    def test_buffer_precision_stages(self):
+        """Test rivers are simplified before buffering and buffers snapped."""
+        result = plan(build_suitability_pipeline(100, 500.0, 50.0, simplify_ratio=0.1, snap_grid=2.0))
+        stages = {stage.name: stage for stage in result}
+
+        self.assertAlmostEqual(stages["simplify_rivers"].parameters["TOLERANCE"], 5.0)
+        self.assertEqual(stages["river_buffer"].inputs["INPUT"], "simplify_rivers")
+        self.assertEqual(stages["snap_buffers"].inputs["INPUT"], "merge")
+        self.assertEqual(stages["difference"].inputs["OVERLAY"], "snap_buffers")
+
+        unchanged = plan(build_suitability_pipeline(100, 500.0, 50.0))
+        self.assertNotIn("simplify_rivers", [stage.name for stage in unchanged])
+        self.assertNotIn("snap_buffers", [stage.name for stage in unchanged])
+
+    def test_max_buffer_error(self):
+        """Test the buffer error bound shrinks with more segments."""
+        self.assertAlmostEqual(max_buffer_error(1000.0, 1), 1000.0 * (1 - math.cos(math.pi / 4)))
+        self.assertLess(max_buffer_error(1000.0, 16), max_buffer_error(1000.0, 5))
+        self.assertAlmostEqual(max_buffer_error(0.0, 5, 3.0, 2.0), 3.0 + 2.0 ** 0.5)
+
+    def test_raster_engine(self):
+        """Test the raster engine reads the filtered population directly."""
+        result = plan(build_suitability_pipeline(100, 500.0, 50.0, ENGINE_RASTER, cell_size=25.0), ["population"])
+
+        self.assertEqual([stage.name for stage in result], ["raster_suitability"])
+        self.assertEqual(result.source_filters, {"population": '"population" >= 100'})
+        self.assertEqual(result.stages[0].inputs["BOUNDARY"], "boundary")
+        self.assertEqual(result.stages[0].parameters["CELL_SIZE"], 25.0)
+
+    def test_catchment_population_stage(self):
+        """Test the catchment sums run last and keep the whole population source."""
+        result = plan(build_suitability_pipeline(100, 500.0, 50.0, catchment_distance=2000.0), ["population"])
+        stages = {stage.name: stage for stage in result}
+
+        self.assertEqual(result.output, "catchment_population")
+        self.assertEqual(stages["catchment_population"].inputs, {'INPUT': "difference", 'POPULATION': "population"})
+        self.assertEqual(stages["catchment_population"].parameters["DISTANCE"], 2000.0)
+        # The catchments count every population polygon, not only those above the threshold
+        self.assertEqual(result.source_filters, {})
+        self.assertIn("extract_high_population", stages)
+
+    def test_clip_to_other_overlay_kept(self):
+        """Test a clip to a different overlay is not removed."""
+        pipeline = Pipeline(["a", "b", "c"], [
+            Stage("clip_b", "native:clip", {'INPUT': "a", 'OVERLAY': "b"}, kind=KIND_CLIP),
+            Stage("clip_c", "native:clip", {'INPUT': "clip_b", 'OVERLAY': "c"}, kind=KIND_CLIP),
+        ], "clip_c")
+        result = plan(pipeline)
+
+        self.assertEqual([stage.name for stage in result], ["clip_b", "clip_c"])
+        self.assertEqual(result.notes, [])
+        # The original pipeline is left untouched
+        self.assertIn("clip_c", pipeline.stages)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(PipelinePlannerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
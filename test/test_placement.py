@@ -0,0 +1,67 @@
+# coding=utf-8
+"""School placement test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import unittest
+
+import numpy as np
+
+from placement import candidate_points, lazy_greedy
+
+
+def plain_greedy(coverage, weights, count, covered):
+    covered = covered.copy()
+    chosen = []
+    for _ in range(count):
+        gains = [weights[indexes][~covered[indexes]].sum() for indexes in coverage]
+        best = int(np.argmax(gains))
+        if gains[best] <= 0:
+            break
+        chosen.append((best, gains[best]))
+        covered[coverage[best]] = True
+    return chosen
+
+
+class PlacementTest(unittest.TestCase):
+    """Test new sites are chosen to cover the most unserved population."""
+
+    def test_lazy_greedy(self):
+        """Test lazy evaluation chooses the same sites as re-evaluating every candidate."""
+        generator = np.random.default_rng(24)
+        weights = generator.random(80) * 100
+        coverage = [generator.choice(80, generator.integers(0, 10), replace=False) for _ in range(40)]
+        covered = generator.random(80) < 0.2
+
+        chosen = lazy_greedy(coverage, weights, 8, covered)
+        expected = plain_greedy(coverage, weights, 8, covered)
+
+        self.assertEqual([position for position, _ in chosen], [position for position, _ in expected])
+        np.testing.assert_allclose([gain for _, gain in chosen], [gain for _, gain in expected])
+
+    def test_covered_population_not_counted(self):
+        """Test population already served adds nothing, and choices stop once all is covered."""
+        coverage = [[0, 1], [1, 2], [2]]
+        weights = [100.0, 10.0, 50.0]
+
+        self.assertEqual(lazy_greedy(coverage, weights, 3, [True, False, False]), [(1, 60.0)])
+        self.assertEqual(lazy_greedy(coverage, weights, 3), [(0, 110.0), (1, 50.0)])
+
+    def test_candidate_points(self):
+        """Test candidates are the cell centres of the grid."""
+        self.assertEqual(list(candidate_points((0.0, 0.0, 20.0, 10.0), 10.0)), [(5.0, 5.0), (15.0, 5.0)])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(PlacementTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
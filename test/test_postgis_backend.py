@@ -0,0 +1,110 @@
+# coding=utf-8
+"""PostGIS backend test.
+
+Set ``SCHOOL_LOCATOR_TEST_DSN`` to a libpq connection string of a database
+with PostGIS to also run the analysis query; nothing is left in it.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import math
+import os
+import unittest
+
+from postgis_backend import (build_suitability_query, execute_suitability_query, qualified_table,
+                             split_table_name)
+
+TEST_DSN = os.environ.get("SCHOOL_LOCATOR_TEST_DSN")
+
+TABLES = {
+    "population": "school_locator_test.population",
+    "school": "school_locator_test.schools",
+    "river": "school_locator_test.rivers",
+    "boundary": "school_locator_test.boundary",
+}
+
+
+class PostgisQueryTest(unittest.TestCase):
+    """Test the analysis query is built with quoted identifiers."""
+
+    def test_table_names(self):
+        """Test schemas default to public and identifiers are quoted."""
+        self.assertEqual(split_table_name("census.population"), ("census", "population"))
+        self.assertEqual(split_table_name("population"), ("public", "population"))
+        self.assertEqual(qualified_table('odd"name'), '"public"."odd""name"')
+
+    def test_query(self):
+        """Test every table and geometry column is used."""
+        columns = {"population": "geom", "school": "location", "river": "geom", "boundary": "shape"}
+        query = build_suitability_query(TABLES, columns, "total_pop")
+
+        for table in TABLES.values():
+            self.assertIn(qualified_table(table), query)
+        self.assertIn('s."location"', query)
+        self.assertIn('ST_Union("shape")', query)
+        self.assertIn('p."total_pop" >= %(population_threshold)s', query)
+
+
+@unittest.skipUnless(TEST_DSN, "SCHOOL_LOCATOR_TEST_DSN is not set")
+class PostgisExecutionTest(unittest.TestCase):
+    """Test the analysis query against a PostGIS database."""
+
+    def setUp(self):
+        import psycopg2
+        self.connection = psycopg2.connect(TEST_DSN)
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            CREATE SCHEMA school_locator_test;
+            CREATE TABLE school_locator_test.population (population integer, geom geometry(Polygon, 3857));
+            CREATE TABLE school_locator_test.schools (geom geometry(Point, 3857));
+            CREATE TABLE school_locator_test.rivers (geom geometry(LineString, 3857));
+            CREATE TABLE school_locator_test.boundary (geom geometry(Polygon, 3857));
+            INSERT INTO school_locator_test.population VALUES
+                (500, ST_MakeEnvelope(0, 0, 10, 10, 3857)),
+                (50, ST_MakeEnvelope(20, 0, 30, 10, 3857)),
+                (800, ST_MakeEnvelope(100, 0, 110, 10, 3857));
+            INSERT INTO school_locator_test.schools VALUES (ST_SetSRID(ST_MakePoint(5, 5), 3857));
+            INSERT INTO school_locator_test.rivers
+                VALUES (ST_SetSRID(ST_MakeLine(ST_MakePoint(0, 50), ST_MakePoint(40, 50)), 3857));
+            INSERT INTO school_locator_test.boundary VALUES (ST_MakeEnvelope(0, 0, 40, 10, 3857));
+        """)
+
+    def tearDown(self):
+        # Nothing was committed
+        self.connection.rollback()
+        self.connection.close()
+
+    def test_suitable_areas(self):
+        """Test the school surroundings are removed from the populated polygon."""
+        srid, cursor = execute_suitability_query(self.connection, TABLES, 100, 2.0, 5.0)
+        rows = cursor.fetchall()
+
+        self.assertEqual(srid, 3857)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][0], 500)
+
+        cursor.execute("SELECT ST_Area(ST_GeomFromWKB(%s))", (rows[0][1],))
+        self.assertAlmostEqual(cursor.fetchone()[0], 100 - math.pi * 4, delta=0.5)
+
+    def test_server_side_cursor(self):
+        """Test results streamed in small batches are complete."""
+        cursor = execute_suitability_query(self.connection, TABLES, 0, 0.0, 0.0,
+                                           cursor_name="test_suitable_areas", batch_size=1)[1]
+
+        self.assertEqual(cursor.name, "test_suitable_areas")
+        self.assertEqual(sorted(row[0] for row in cursor), [50, 500])
+        cursor.close()
+
+
+if __name__ == "__main__":
+    suite = unittest.TestSuite([unittest.makeSuite(PostgisQueryTest), unittest.makeSuite(PostgisExecutionTest)])
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,85 @@
+# coding=utf-8
+"""Raster engine test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from raster_engine import Grid, distance_transform, row_blocks, suitable_cells
+
+
+def brute_force_distances(mask, cell_size):
+    rows, columns = np.indices(mask.shape)
+    set_rows, set_columns = np.nonzero(mask)
+    squared = (rows[..., np.newaxis] - set_rows) ** 2 + (columns[..., np.newaxis] - set_columns) ** 2
+    return np.sqrt(squared.min(axis=-1)) * cell_size
+
+
+class RasterEngineTest(unittest.TestCase):
+    """Test the grid operations of the raster engine."""
+
+    def test_distance_transform(self):
+        """Test distances are exact Euclidean distances between cell centres."""
+        generator = np.random.default_rng(14)
+        for shape in [(1, 1), (1, 9), (11, 1), (23, 17)]:
+            for density in [0.02, 0.3]:
+                mask = generator.random(shape) < density
+                mask[0, 0] = True
+                np.testing.assert_allclose(distance_transform(mask, 10.0), brute_force_distances(mask, 10.0))
+
+    def test_distance_transform_blocks(self):
+        """Test a memory mapped grid swept in small blocks gives the same distances."""
+        generator = np.random.default_rng(19)
+        mask = generator.random((41, 13)) < 0.03
+        mask[-1, 0] = True
+        with tempfile.TemporaryDirectory() as directory:
+            out = np.memmap(os.path.join(directory, "distances.dat"), dtype=np.float32, mode="w+", shape=mask.shape)
+            distance_transform(mask, 10.0, out, block_cells=20)
+            np.testing.assert_allclose(out, brute_force_distances(mask, 10.0), rtol=1e-6)
+            del out
+
+    def test_row_blocks(self):
+        """Test blocks hold whole rows and cover the grid once."""
+        self.assertEqual(list(row_blocks(10, 4, block_cells=12)), [(0, 3), (3, 6), (6, 9), (9, 10)])
+        self.assertEqual(list(row_blocks(2, 100, block_cells=12)), [(0, 1), (1, 2)])
+
+    def test_distance_transform_empty(self):
+        """Test every cell is infinitely far from an empty mask."""
+        self.assertTrue(np.isinf(distance_transform(np.zeros((3, 4), dtype=bool))).all())
+
+    def test_grid_alignment(self):
+        """Test cell edges fall on multiples of the cell size."""
+        grid = Grid.covering((12.0, 3.0, 57.0, 21.0), 10.0)
+
+        self.assertEqual(grid.geotransform(), (10.0, 10.0, 0.0, 30.0, 0.0, -10.0))
+        self.assertEqual(grid.shape, (3, 5))
+
+    def test_suitable_cells(self):
+        """Test cells are kept within the boundary and beyond both distances."""
+        population_ids = np.array([[1, 1, 2], [0, 2, 2]])
+        boundary = np.array([[True, True, True], [True, True, False]])
+        school_distances = np.array([[0.0, 50.0, 50.0], [50.0, 50.0, 50.0]])
+        river_distances = np.full((2, 3), np.inf)
+
+        np.testing.assert_array_equal(
+            suitable_cells(population_ids, boundary, school_distances, river_distances, 20.0, 10.0),
+            [[0, 1, 2], [0, 2, 0]])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RasterEngineTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
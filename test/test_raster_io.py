@@ -0,0 +1,79 @@
+# coding=utf-8
+"""Raster suitability engine test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import math
+import unittest
+
+from qgis.core import QgsGeometry, QgsRectangle
+
+from ..exclusion_engine import exclude_schools_and_rivers
+from ..raster_engine import max_raster_error
+from ..raster_io import raster_suitability
+
+from .utilities import get_qgis_app, memory_layer
+QGIS_APP = get_qgis_app()
+
+CELL_SIZE = 5.0
+
+
+class RasterSuitabilityTest(unittest.TestCase):
+    """Test the raster engine agrees with the vector engine to the cell size."""
+
+    def setUp(self):
+        squares = [QgsGeometry.fromRect(QgsRectangle(x * 100, y * 100, x * 100 + 100, y * 100 + 100))
+                   for x in range(10) for y in range(10)]
+        river = ", ".join(f"{x * 5} {500 + 120 * math.sin(x / 6)}" for x in range(200))
+        self.parameters = {
+            'INPUT': memory_layer("Polygon", squares, [float(index) for index in range(100)]),
+            'SCHOOLS': memory_layer("Point", [QgsGeometry.fromWkt("POINT(250 250)"),
+                                              QgsGeometry.fromWkt("POINT(720 810)")]),
+            'RIVERS': memory_layer("LineString", [QgsGeometry.fromWkt(f"LINESTRING({river})")]),
+            'BOUNDARY': memory_layer("Polygon", [QgsGeometry.fromRect(QgsRectangle(-100, -100, 1100, 1100))]),
+            'SCHOOL_DISTANCE': 120.0,
+            'RIVER_DISTANCE': 30.0,
+        }
+
+    def test_same_as_vector_engine(self):
+        """Test the suitable cells cover the suitable areas of the vector engine."""
+        raster = raster_suitability(dict(self.parameters, CELL_SIZE=CELL_SIZE))
+        vector = exclude_schools_and_rivers(dict(self.parameters, SEGMENTS=32))
+
+        self.assertEqual(raster.fields().names(), vector.fields().names())
+        actual = QgsGeometry.unaryUnion([feature.geometry() for feature in raster.getFeatures()])
+        expected = QgsGeometry.unaryUnion([feature.geometry() for feature in vector.getFeatures()])
+        # The areas only differ by the cells cut by the outline of the
+        # excluded zones, a strip of about one cell
+        self.assertLess(actual.symDifference(expected).area(), 0.02 * expected.area())
+
+        # No suitable cell lies well inside the excluded zones
+        margin = max_raster_error(CELL_SIZE) + CELL_SIZE
+        inside = QgsGeometry.unaryUnion(
+            [feature.geometry().buffer(120.0 - margin, 32) for feature in self.parameters['SCHOOLS'].getFeatures()]
+            + [feature.geometry().buffer(30.0 - margin, 32) for feature in self.parameters['RIVERS'].getFeatures()])
+        self.assertAlmostEqual(actual.intersection(inside).area(), 0.0)
+
+    def test_suitable_cells_keep_population(self):
+        """Test every suitable cell carries the attributes of the polygon it lies in."""
+        raster = raster_suitability(dict(self.parameters, CELL_SIZE=CELL_SIZE))
+        population = {feature["population"]: feature.geometry() for feature in self.parameters['INPUT'].getFeatures()}
+
+        self.assertGreater(raster.featureCount(), 0)
+        for feature in raster.getFeatures():
+            self.assertTrue(population[feature["population"]].contains(feature.geometry().pointOnSurface()))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RasterSuitabilityTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
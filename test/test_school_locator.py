@@ -0,0 +1,124 @@
+# coding=utf-8
+"""Live preview test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import unittest
+from unittest import mock
+
+from qgis.PyQt.QtCore import QSettings
+from qgis.PyQt.QtTest import QTest
+from qgis.core import QgsFeature, QgsGeometry, QgsProject, QgsRectangle, QgsVectorLayer
+from qgis.gui import QgsMapCanvas
+
+from ..pipeline import suitability_expression
+from ..school_locator import PREVIEW_DELAY_MS, SchoolLocator
+
+from .utilities import get_qgis_app
+QGIS_APP = get_qgis_app()
+
+
+def preview_layer():
+    """Returns a preview layer of three polygons with their distance attributes."""
+    layer = QgsVectorLayer("Polygon?crs=EPSG:3857&field=population:double&field=school_dist:double"
+                           "&field=river_dist:double", "preview", "memory")
+    features = []
+    for population, school_distance, river_distance in ((50.0, 90.0, 90.0), (90.0, 30.0, 90.0),
+                                                        (90.0, 90.0, 10.0)):
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(QgsGeometry.fromRect(QgsRectangle(0, 0, 10, 10)))
+        feature.setAttributes([population, school_distance, river_distance])
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+class SchoolLocatorPreviewTest(unittest.TestCase):
+    """Test the live preview only refilters once the parameters settle."""
+
+    def setUp(self):
+        QSettings().setValue('locale/userLocale', 'en_US')
+        self.canvas = QgsMapCanvas()
+        self.canvas.setExtent(QgsRectangle(0, 0, 100, 100))
+        self.iface = mock.Mock()
+        self.iface.mapCanvas.return_value = self.canvas
+
+        # The timer is connected to the method when the dialog is created
+        patcher = mock.patch.object(SchoolLocator, "update_preview")
+        self.update_preview = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.plugin = SchoolLocator(self.iface)
+        self.plugin.initGui()
+        self.plugin.run()
+
+    def tearDown(self):
+        if self.plugin is not None:
+            self.plugin.unload()
+        QgsProject.instance().removeAllMapLayers()
+
+    def test_debounced_update(self):
+        """Test a burst of parameter changes updates the preview once."""
+        dialog = self.plugin.dlg
+        dialog.chk_live_preview.setChecked(True)
+        for value in (10, 20, 30):
+            dialog.spin_population_threshold.setValue(value)
+        dialog.spin_distance_from_schools.setValue(50.0)
+        self.assertTrue(self.plugin.preview_timer.isActive())
+
+        QTest.qWait(PREVIEW_DELAY_MS * 3)
+        self.assertEqual(self.update_preview.call_count, 1)
+
+    def test_disabled_preview_not_updated(self):
+        """Test parameter changes are ignored while the preview is off."""
+        self.plugin.dlg.spin_population_threshold.setValue(10)
+
+        QTest.qWait(PREVIEW_DELAY_MS * 3)
+        self.assertFalse(self.plugin.preview_timer.isActive())
+        self.update_preview.assert_not_called()
+
+    def test_unload_stops_timer(self):
+        """Test unloading the plugin cancels a pending preview update."""
+        dialog = self.plugin.dlg
+        dialog.chk_live_preview.setChecked(True)
+        self.assertTrue(self.plugin.preview_timer.isActive())
+
+        self.plugin.unload()
+        self.assertFalse(self.plugin.preview_timer.isActive())
+        # Changes made to the dialog left behind do not restart it either
+        dialog.spin_population_threshold.setValue(10)
+        QTest.qWait(PREVIEW_DELAY_MS * 3)
+        self.update_preview.assert_not_called()
+        self.plugin = None
+
+    def test_refilter(self):
+        """Test the preview layer is refiltered with the parameters of the dialog."""
+        dialog = self.plugin.dlg
+        dialog.spin_population_threshold.setValue(80)
+        dialog.spin_distance_from_schools.setValue(50.0)
+        dialog.spin_river_distance_buffer.setValue(40.0)
+        layer = preview_layer()
+        QgsProject.instance().addMapLayer(layer)
+
+        self.plugin.apply_preview_filter(layer)
+        self.assertEqual(layer.subsetString(), suitability_expression(80, 50.0, 40.0))
+        self.assertEqual(layer.featureCount(), 0)
+
+        dialog.spin_distance_from_schools.setValue(20.0)
+        self.plugin.apply_preview_filter(layer)
+        self.assertEqual(layer.featureCount(), 1)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SchoolLocatorPreviewTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,82 @@
+# coding=utf-8
+"""Processing algorithm test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import shutil
+import tempfile
+import unittest
+
+from qgis.core import QgsApplication
+
+from ..exclusion_engine import attribute_value
+from ..pipeline import CATCHMENT_FIELD, ENGINE_SPATIAL_INDEX
+from ..school_locator_provider import SchoolLocatorProvider
+from ..school_locator_task import SchoolLocatorTask
+
+from .utilities import get_qgis_app, init_processing, write_grid_layers
+QGIS_APP = get_qgis_app()
+
+
+def rows(layer):
+    """Returns the population, catchment population and area of every feature, sorted."""
+    return sorted((attribute_value(feature["population"]), round(attribute_value(feature[CATCHMENT_FIELD]), 6),
+                   round(feature.geometry().area(), 3))
+                  for feature in layer.getFeatures())
+
+
+class SchoolSuitabilityAlgorithmTest(unittest.TestCase):
+    """Test the processing algorithm gives the result of the analysis task."""
+
+    @classmethod
+    def setUpClass(cls):
+        init_processing()
+        cls.provider = SchoolLocatorProvider()
+        QgsApplication.processingRegistry().addProvider(cls.provider)
+        cls.directory = tempfile.mkdtemp()
+        cls.layer_paths = write_grid_layers(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        QgsApplication.processingRegistry().removeProvider(cls.provider)
+        shutil.rmtree(cls.directory)
+
+    def test_same_as_task(self):
+        """Test processing.run gives the suitable areas of the analysis task."""
+        import processing
+
+        task = SchoolLocatorTask(self.layer_paths, 20, 150.0, 40.0, ENGINE_SPATIAL_INDEX, catchment_distance=200.0)
+        if not task.run():
+            raise task.exception
+
+        result = processing.run("school_locator:schoolsuitability", {
+            'POPULATION': self.layer_paths["Population Data"],
+            'POPULATION_FIELD': "population",
+            'POPULATION_THRESHOLD': 20,
+            'SCHOOLS': self.layer_paths["School Layer"],
+            'SCHOOL_DISTANCE': 150.0,
+            'RIVERS': self.layer_paths["River Layer"],
+            'RIVER_DISTANCE': 40.0,
+            'BOUNDARY': self.layer_paths["Boundary Layer"],
+            'ENGINE': 1,
+            'CATCHMENT_DISTANCE': 200.0,
+            'OUTPUT': 'memory:',
+        })['OUTPUT']
+
+        self.assertGreater(result.featureCount(), 0)
+        self.assertEqual(rows(result), rows(task.result_layer))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SchoolSuitabilityAlgorithmTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
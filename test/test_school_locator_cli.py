@@ -0,0 +1,125 @@
+# coding=utf-8
+"""Command line argument test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..school_locator_cli import main, parse_arguments, read_scenarios, sweep_scenarios
+from ..sweep import Scenario
+
+
+class SchoolLocatorCliTest(unittest.TestCase):
+    """Test the command line is parsed and checked before QGIS starts."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.inputs = []
+        for name in ("population", "schools", "rivers", "boundary"):
+            path = os.path.join(self.directory, f"{name}.gpkg")
+            open(path, "w").close()
+            self.inputs += [f"--{name}", path]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertRejected(self, *argv):
+        """Asserts the command line exits with the usage error status 2."""
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit) as raised:
+            parse_arguments(self.inputs + list(argv))
+        self.assertEqual(raised.exception.code, 2)
+
+    def test_defaults(self):
+        """Test a single run only needs the inputs and the output."""
+        arguments = parse_arguments(self.inputs + ["--output", "out.gpkg"])
+
+        self.assertEqual(arguments.engine, "processing")
+        self.assertEqual(arguments.storage, "memory")
+        self.assertEqual(arguments.workers, 1)
+        self.assertEqual(arguments.segments, 5)
+        self.assertFalse(arguments.catchment_population)
+        self.assertEqual(read_scenarios(arguments), [{"population_threshold": 0, "school_distance": 0.0,
+                                                      "river_distance": 0.0, "output": "out.gpkg"}])
+
+    def test_layer_name_in_source(self):
+        """Test the layer of a multi-layer file is not part of its path."""
+        schools = self.inputs.index("--schools") + 1
+        self.inputs[schools] += "|layername=schools"
+        arguments = parse_arguments(self.inputs + ["--output", "out.gpkg"])
+        self.assertTrue(arguments.schools.endswith("|layername=schools"))
+
+    def test_invalid_arguments(self):
+        """Test invalid command lines exit with status 2."""
+        self.assertRejected()
+        self.assertRejected("--output", "out.gpkg", "--engine", "unknown")
+        self.assertRejected("--output", "out.gpkg", "--school-distance", "-1")
+        self.assertRejected("--output", "out.gpkg", "--workers", "0")
+        self.assertRejected("--output", "out.gpkg", "--segments", "zero")
+        self.assertRejected("--output", "out.gpkg", "--top", "0")
+
+    def test_missing_input(self):
+        """Test a missing input file is reported before QGIS starts."""
+        self.assertRejected("--scenarios", os.path.join(self.directory, "missing.csv"))
+        os.remove(os.path.join(self.directory, "rivers.gpkg"))
+        self.assertRejected("--output", "out.gpkg")
+
+        # main exits the same way without needing QGIS
+        with contextlib.redirect_stderr(io.StringIO()) as errors, self.assertRaises(SystemExit) as raised:
+            main(self.inputs + ["--output", "out.gpkg"])
+        self.assertEqual(raised.exception.code, 2)
+        self.assertIn("--rivers file does not exist", errors.getvalue())
+
+    def test_exclusive_modes(self):
+        """Test sweeps, rankings and placements cannot be combined."""
+        scenarios = os.path.join(self.directory, "scenarios.csv")
+        open(scenarios, "w").close()
+
+        self.assertRejected("--scenarios", scenarios, "--school-distance-range", "0", "100", "50")
+        self.assertRejected("--school-distance-range", "0", "100", "50")
+        self.assertRejected("--output", "out.gpkg", "--top", "5", "--river-distance-range", "0", "100", "50")
+        self.assertRejected("--output", "out.gpkg", "--place", "3", "--top", "5")
+        self.assertRejected("--scenarios", scenarios, "--place", "3")
+
+    def test_sweep_scenarios(self):
+        """Test the ranges give every combination of the values."""
+        arguments = parse_arguments(self.inputs + ["--output", "out.gpkg", "--population-threshold", "100",
+                                                   "--school-distance-range", "0", "100", "50",
+                                                   "--river-distance-range", "10", "20", "10"])
+        scenarios = sweep_scenarios(arguments)
+
+        self.assertEqual(len(scenarios), 6)
+        self.assertEqual(scenarios[0], Scenario(100, 0.0, 10.0))
+        self.assertEqual(scenarios[-1], Scenario(100, 100.0, 20.0))
+
+    def test_read_scenarios(self):
+        """Test the scenarios file is read with typed values."""
+        scenarios = os.path.join(self.directory, "scenarios.csv")
+        with open(scenarios, "w", encoding="utf-8") as scenarios_file:
+            scenarios_file.write("population_threshold,school_distance,river_distance,output\n"
+                                 "100,500,50,a.gpkg\n200,800.5,20,b.gpkg\n")
+        arguments = parse_arguments(self.inputs + ["--scenarios", scenarios])
+
+        self.assertEqual(read_scenarios(arguments), [
+            {"population_threshold": 100, "school_distance": 500.0, "river_distance": 50.0, "output": "a.gpkg"},
+            {"population_threshold": 200, "school_distance": 800.5, "river_distance": 20.0, "output": "b.gpkg"},
+        ])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SchoolLocatorCliTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
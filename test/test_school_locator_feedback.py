@@ -0,0 +1,108 @@
+# coding=utf-8
+"""Step timing feedback test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import json
+import unittest
+from unittest import mock
+
+from qgis.core import QgsFeature, QgsVectorLayer
+
+from school_locator_feedback import StepTimingFeedback
+
+from utilities import get_qgis_app
+QGIS_APP = get_qgis_app()
+
+MB = 1024 * 1024
+
+
+class StepTimingFeedbackTest(unittest.TestCase):
+    """Test step timings are recorded."""
+
+    def test_step_statistics(self):
+        """Test feature counts and wall time are recorded per step."""
+        layer = QgsVectorLayer("Point?crs=EPSG:4326", "points", "memory")
+        layer.dataProvider().addFeatures([QgsFeature(), QgsFeature()])
+
+        feedback = StepTimingFeedback()
+        feedback.start_step("school_buffer", layer)
+        step = feedback.end_step([layer, layer])
+
+        self.assertEqual(step["name"], "school_buffer")
+        self.assertEqual(step["features_in"], 2)
+        self.assertEqual(step["features_out"], 4)
+        self.assertGreaterEqual(step["wall_time"], 0)
+        self.assertEqual(feedback.slowest_step(), step)
+
+    def test_json_report(self):
+        """Test the timing report can be serialized as JSON."""
+        feedback = StepTimingFeedback()
+        feedback.start_step("merge")
+        feedback.end_step()
+
+        report = json.loads(feedback.to_json())
+        self.assertEqual([step["name"] for step in report["steps"]], ["merge"])
+        self.assertIsNone(report["steps"][0]["features_in"])
+
+    def test_kernel_peak_memory(self):
+        """Test a step reports the peak memory the kernel recorded during it."""
+        feedback = StepTimingFeedback()
+        with mock.patch("school_locator_feedback.current_memory_bytes", side_effect=[100 * MB, 120 * MB]), \
+                mock.patch("school_locator_feedback.reset_peak_memory", return_value=True) as reset, \
+                mock.patch("school_locator_feedback.peak_memory_bytes", return_value=2100 * MB):
+            feedback.start_step("allocate")
+            step = feedback.end_step()
+
+        reset.assert_called_once_with()
+        self.assertEqual(step["memory"], 120 * MB)
+        self.assertEqual(step["memory_change"], 20 * MB)
+        self.assertEqual(step["peak_memory"], 2100 * MB)
+        self.assertIn("120 MB in use (+20 MB), peak 2100 MB", feedback.format_step(step))
+
+    def test_sampled_peak_memory(self):
+        """Test memory released before a step ends still counts towards its peak."""
+        memory = [100 * MB]
+        feedback = StepTimingFeedback()
+        with mock.patch("school_locator_feedback.current_memory_bytes", side_effect=lambda: memory[0]), \
+                mock.patch("school_locator_feedback.reset_peak_memory", return_value=False):
+            feedback.start_step("allocate")
+            memory[0] = 2100 * MB
+            feedback.sample_memory()
+            memory[0] = 100 * MB
+            allocated = feedback.end_step()
+
+            feedback.start_step("idle")
+            idle = feedback.end_step()
+
+        self.assertEqual(allocated["memory_change"], 0)
+        self.assertEqual(allocated["peak_memory"], 2100 * MB)
+        # The peak of a step does not carry over to the next one
+        self.assertEqual(idle["peak_memory"], 100 * MB)
+
+    def test_memory_not_exposed(self):
+        """Test steps are still recorded when the platform exposes no memory."""
+        feedback = StepTimingFeedback()
+        with mock.patch("school_locator_feedback.current_memory_bytes", return_value=None), \
+                mock.patch("school_locator_feedback.reset_peak_memory", return_value=False):
+            feedback.start_step("merge")
+            step = feedback.end_step()
+
+        self.assertIsNone(step["memory_change"])
+        self.assertIsNone(step["peak_memory"])
+        self.assertNotIn("MB", feedback.format_step(step))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(StepTimingFeedbackTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
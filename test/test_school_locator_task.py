@@ -0,0 +1,279 @@
+# coding=utf-8
+"""Analysis task test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from qgis.core import QgsGeometry, QgsRectangle, QgsVectorLayer
+
+from ..exclusion_engine import aggregate_catchments, attribute_value
+from ..incremental import IncrementalState
+from ..pipeline import (CATCHMENT_FIELD, ENGINE_PROCESSING, ENGINE_RASTER, ENGINE_SPATIAL_INDEX,
+                        SCHOOL_DISTANCE_FIELD)
+from .. import school_locator_task
+from ..school_locator_task import (STORAGE_GEOPACKAGE, PlacementTask, SchoolLocatorTask, ScoringTask,
+                                   SweepTask)
+from ..scoring import ScoreWeights
+from ..stage_cache import StageCache
+from ..sweep import scenario_grid
+
+from .utilities import get_qgis_app, init_processing, memory_layer, write_grid_layers, write_layers
+QGIS_APP = get_qgis_app()
+
+# Tiles of 300 split the 1000 wide grid into 4 x 4 tiles
+TILE_SIZE = 300.0
+
+
+def rows(layer, names=None):
+    """Returns the attributes, or those named ``names``, and the area of every feature, sorted."""
+    names = layer.fields().names() if names is None else names
+    return sorted((tuple(round(value, 6) if isinstance(value, float) else value
+                         for value in (attribute_value(feature[name]) for name in names)),
+                   round(feature.geometry().area(), 3))
+                  for feature in layer.getFeatures())
+
+
+def square(x, y, size):
+    return QgsGeometry.fromRect(QgsRectangle(x - size / 2, y - size / 2, x + size / 2, y + size / 2))
+
+
+def run(task):
+    if not task.run():
+        raise task.exception
+    return task
+
+
+class SchoolLocatorTaskTest(unittest.TestCase):
+    """Test the tiled and incremental runs give the result of a full run."""
+
+    @classmethod
+    def setUpClass(cls):
+        init_processing()
+        cls.directory = tempfile.mkdtemp()
+        cls.layer_paths = write_grid_layers(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_geopackage_storage(self):
+        """Test stages written to GeoPackages give the memory result and are released once read."""
+        in_memory = run(SchoolLocatorTask(self.layer_paths, 20, 150.0, 40.0, ENGINE_PROCESSING))
+        with mock.patch.object(school_locator_task, "release_output",
+                               wraps=school_locator_task.release_output) as release:
+            on_disk = run(SchoolLocatorTask(self.layer_paths, 20, 150.0, 40.0, ENGINE_PROCESSING,
+                                            storage=STORAGE_GEOPACKAGE))
+
+        released = [call.args[0] for call in release.call_args_list if isinstance(call.args[0], str)]
+        self.assertGreater(len(released), 1)
+        self.assertFalse([path for path in released if os.path.exists(path)])
+        self.assertEqual(rows(on_disk.result_layer, ["population"]), rows(in_memory.result_layer, ["population"]))
+
+    def test_cached_stages_reused(self):
+        """Test a second run reads every stage from the cache."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = StageCache(directory, 1 << 30)
+
+        def analysis():
+            return SchoolLocatorTask(self.layer_paths, 20, 150.0, 40.0, ENGINE_PROCESSING, cache=cache)
+
+        stages = {stage.name for stage in analysis().plan()}
+        first = run(analysis())
+        second = run(analysis())
+
+        self.assertTrue(stages & {step["name"] for step in first.feedback.steps})
+        self.assertFalse(stages & {step["name"] for step in second.feedback.steps})
+        self.assertEqual(rows(second.result_layer, ["population"]), rows(first.result_layer, ["population"]))
+
+    def test_parallel_stages(self):
+        """Test stages run on a worker pool give the sequential result."""
+        sequential = run(SchoolLocatorTask(self.layer_paths, 20, 150.0, 40.0, ENGINE_PROCESSING))
+        with mock.patch.object(SchoolLocatorTask, "_run_stage", autospec=True,
+                               side_effect=SchoolLocatorTask._run_stage) as run_stage:
+            parallel = run(SchoolLocatorTask(self.layer_paths, 20, 150.0, 40.0, ENGINE_PROCESSING, max_workers=3))
+
+        # Every stage ran in a worker of the pool
+        self.assertGreater(run_stage.call_count, 1)
+        self.assertTrue(all(call.args[4] for call in run_stage.call_args_list))
+        self.assertEqual(rows(parallel.result_layer, ["population"]), rows(sequential.result_layer, ["population"]))
+
+    def test_tiled_suitable_areas(self):
+        """Test tiling the analysis does not change the suitable areas."""
+        full = run(SchoolLocatorTask(self.layer_paths, 20, 150.0, 40.0, ENGINE_SPATIAL_INDEX))
+        tiled = run(SchoolLocatorTask(self.layer_paths, 20, 150.0, 40.0, ENGINE_SPATIAL_INDEX,
+                                      max_workers=2, tile_size=TILE_SIZE))
+
+        self.assertEqual(tiled.result_layer.fields().names(), full.result_layer.fields().names())
+        self.assertEqual(rows(tiled.result_layer), rows(full.result_layer))
+
+    def test_restricted_sources(self):
+        """Test sources are restricted in memory when the stages run in memory."""
+        with mock.patch.object(school_locator_task, "write_geopackage",
+                               wraps=school_locator_task.write_geopackage) as write:
+            in_memory = run(SchoolLocatorTask(self.layer_paths, 20, 150.0, 40.0, ENGINE_SPATIAL_INDEX))
+            write.assert_not_called()
+            on_disk = run(SchoolLocatorTask(self.layer_paths, 20, 150.0, 40.0, ENGINE_SPATIAL_INDEX,
+                                            storage=STORAGE_GEOPACKAGE))
+            self.assertEqual(write.call_count, 1)
+
+        # Only the population reaches beyond the boundary, the schools and
+        # the river are read whole
+        self.assertEqual([step["name"] for step in in_memory.feedback.steps if step["name"].startswith("read_")],
+                         ["read_population"])
+        self.assertEqual(rows(in_memory.result_layer, ["population"]), rows(on_disk.result_layer, ["population"]))
+
+    def test_tiled_sweep(self):
+        """Test tiles keep the distance attributes the scenario flags are computed from."""
+        scenarios = scenario_grid([0, 50], [100.0, 300.0], [20.0, 60.0])
+        full = run(SweepTask(self.layer_paths, scenarios))
+        tiled = run(SweepTask(self.layer_paths, scenarios, max_workers=2, tile_size=TILE_SIZE))
+
+        self.assertGreaterEqual(tiled.result_layer.fields().indexOf(SCHOOL_DISTANCE_FIELD), 0)
+        self.assertEqual(rows(tiled.result_layer), rows(full.result_layer))
+        self.assertEqual(tiled.scenario_counts, full.scenario_counts)
+        # The scenarios do not all agree, so the flags were really computed
+        self.assertGreater(len(set(full.scenario_counts)), 1)
+
+    def test_tiled_scoring(self):
+        """Test tiling does not change the ranking."""
+        weights = ScoreWeights(1.0, 2.0, 1.0)
+        full = run(ScoringTask(self.layer_paths, 10, 400.0, 100.0, 10, weights))
+        tiled = run(ScoringTask(self.layer_paths, 10, 400.0, 100.0, 10, weights, tile_size=TILE_SIZE))
+
+        self.assertEqual(rows(tiled.result_layer), rows(full.result_layer))
+
+    def test_tiled_placement(self):
+        """Test tiling does not change the new school sites."""
+        full = run(PlacementTask(self.layer_paths, 3, 200.0, 100.0, 30.0))
+        tiled = run(PlacementTask(self.layer_paths, 3, 200.0, 100.0, 30.0, tile_size=TILE_SIZE))
+
+        self.assertEqual(tiled.covered_population, full.covered_population)
+        self.assertEqual([feature.geometry().asWkt() for feature in tiled.result_layer.getFeatures()],
+                         [feature.geometry().asWkt() for feature in full.result_layer.getFeatures()])
+
+    def test_placement_served_population(self):
+        """Test placement counts the population served with the rule of the catchments."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # A boundary around every polygon, so the served polygons are not clipped
+        layer_paths = dict(self.layer_paths)
+        layer_paths.update(write_layers(directory, {"boundary": memory_layer("Polygon", [square(500, 500, 1200)])}))
+        placement = run(PlacementTask(layer_paths, 2, 150.0, 100.0))
+        population = QgsVectorLayer(layer_paths["Population Data"], "population", "ogr")
+        schools = [feature.geometry() for feature in
+                   QgsVectorLayer(layer_paths["School Layer"], "schools", "ogr").getFeatures()]
+        sites = [feature.geometry() for feature in placement.result_layer.getFeatures()]
+
+        def served(geometries):
+            catchments = aggregate_catchments({'INPUT': memory_layer("MultiPoint", [QgsGeometry.collectGeometry(
+                geometries)]), 'POPULATION': population, 'DISTANCE': 150.0})
+            return next(catchments.getFeatures())[CATCHMENT_FIELD]
+
+        self.assertEqual(len(sites), 2)
+        self.assertAlmostEqual(placement.covered_population[0], served(schools))
+        self.assertAlmostEqual(placement.covered_population[1], served(schools + sites))
+
+    def test_incremental_near_vertex_gap(self):
+        """Test polygons within the distance of an added school but between
+        the vertices of a coarse buffer are recomputed."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # Small squares 994 from the new school, inside its 16 segment buffer
+        # of 1000 but partly outside a 5 segment one
+        ring = [square(5000 + 994 * math.cos(math.radians(angle)), 5000 + 994 * math.sin(math.radians(angle)), 2)
+                for angle in range(0, 360, 3)]
+        others = [square(x, 8000, 100) for x in range(1000, 9001, 1000)]
+        layer_paths = write_layers(directory, {
+            "population": memory_layer("Polygon", ring + others, [float(index) for index in range(len(ring) + 9)]),
+            "school": memory_layer("Point", [QgsGeometry.fromWkt("POINT(500 9500)")]),
+            "river": memory_layer("LineString", [QgsGeometry.fromWkt("LINESTRING(0 100, 10000 100)")]),
+            "boundary": memory_layer("Polygon", [square(5000, 5000, 10000)]),
+        })
+        state = IncrementalState(os.path.join(directory, "state"))
+
+        def analysis(incremental=None):
+            return SchoolLocatorTask(layer_paths, 0, 1000.0, 10.0, ENGINE_SPATIAL_INDEX,
+                                     incremental=incremental, segments=16)
+
+        run(analysis(state))
+        write_layers(directory, {"school": memory_layer("Point", [QgsGeometry.fromWkt(wkt) for wkt in
+                                                                  ("POINT(500 9500)", "POINT(5000 5000)")])})
+        patched = run(analysis(state))
+        full = run(analysis())
+
+        self.assertIn("incremental_update", [step["name"] for step in patched.feedback.steps])
+        self.assertEqual(rows(patched.result_layer, ["population"]), rows(full.result_layer, ["population"]))
+        self.assertEqual(full.result_layer.featureCount(), len(others))
+
+    def test_catchment_population(self):
+        """Test tiled and incremental runs count the whole population in the catchments."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        schools = ["POINT(250 250)", "POINT(720 810)", "POINT(90 930)"]
+        layer_paths = dict(self.layer_paths)
+        layer_paths.update(write_layers(directory, {
+            "school": memory_layer("Point", [QgsGeometry.fromWkt(wkt) for wkt in schools])}))
+        state = IncrementalState(os.path.join(directory, "state"))
+
+        def analysis(**options):
+            return SchoolLocatorTask(layer_paths, 20, 150.0, 40.0, ENGINE_SPATIAL_INDEX,
+                                     catchment_distance=250.0, **options)
+
+        full = run(analysis(incremental=state))
+        tiled = run(analysis(max_workers=2, tile_size=TILE_SIZE))
+        self.assertEqual(rows(tiled.result_layer), rows(full.result_layer))
+        # Catchments reach the polygons of other tiles and below the threshold
+        self.assertTrue(any(feature[CATCHMENT_FIELD] > feature["population"]
+                            for feature in full.result_layer.getFeatures()))
+
+        write_layers(directory, {"school": memory_layer("Point", [QgsGeometry.fromWkt(wkt) for wkt in
+                                                                  schools + ["POINT(520 130)"]])})
+        patched = run(analysis(incremental=state))
+        full = run(analysis())
+        self.assertIn("incremental_update", [step["name"] for step in patched.feedback.steps])
+        self.assertEqual(rows(patched.result_layer, ["population", CATCHMENT_FIELD]),
+                         rows(full.result_layer, ["population", CATCHMENT_FIELD]))
+
+    def test_raster_not_patched(self):
+        """Test raster runs recompute everything rather than patch the previous cells."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        schools = ["POINT(250 250)", "POINT(720 810)"]
+        layer_paths = dict(self.layer_paths)
+        layer_paths.update(write_layers(directory, {
+            "school": memory_layer("Point", [QgsGeometry.fromWkt(wkt) for wkt in schools])}))
+        state = IncrementalState(os.path.join(directory, "state"))
+
+        def analysis(incremental=None):
+            return SchoolLocatorTask(layer_paths, 20, 150.0, 40.0, ENGINE_RASTER,
+                                     incremental=incremental, cell_size=10.0)
+
+        run(analysis(state))
+        write_layers(directory, {"school": memory_layer("Point", [QgsGeometry.fromWkt(wkt) for wkt in
+                                                                  schools + ["POINT(90 930)"]])})
+        second = run(analysis(state))
+        full = run(analysis())
+
+        self.assertNotIn("incremental_update", [step["name"] for step in second.feedback.steps])
+        self.assertEqual(rows(second.result_layer, ["population"]), rows(full.result_layer, ["population"]))
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SchoolLocatorTaskTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,64 @@
+# coding=utf-8
+"""Site scoring test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import unittest
+
+import numpy as np
+
+from scoring import ScoreWeights, distance_scores, rank_sites, site_scores, top_k
+
+
+class ScoringTest(unittest.TestCase):
+    """Test candidates are scored and the best ones ranked."""
+
+    def test_distance_scores(self):
+        """Test distances are scaled, capped and missing ones score fully."""
+        np.testing.assert_allclose(distance_scores([0.0, 250.0, 1000.0, np.nan], 500.0), [0.0, 0.5, 1.0, 1.0])
+        np.testing.assert_allclose(distance_scores([0.0, 10.0], 0.0), [1.0, 1.0])
+
+    def test_site_scores(self):
+        """Test the criteria are combined with normalised weights."""
+        scores = site_scores([100.0, 50.0], [500.0, 0.0], [np.nan, 50.0], ScoreWeights(2.0, 1.0, 1.0),
+                             100.0, 500.0, 100.0)
+        np.testing.assert_allclose(scores, [1.0, 0.25 + 0.125])
+
+    def test_top_k(self):
+        """Test the best candidates are kept across batches, ties to the lowest id."""
+        batches = [(np.array([7, 3, 9]), np.array([0.5, 0.9, 0.1])),
+                   (np.array([4, 1]), np.array([0.9, 0.2]))]
+
+        self.assertEqual(top_k(batches, 3), [(3, 0.9), (4, 0.9), (7, 0.5)])
+        self.assertEqual(top_k(batches, 0), [])
+        self.assertEqual(len(top_k(batches, 10)), 5)
+
+    def test_rank_sites(self):
+        """Test batched ranking matches scoring every candidate at once."""
+        generator = np.random.default_rng(23)
+        population = generator.integers(0, 1000, 500).astype(float)
+        school_distances = generator.random(500) * 4000
+        river_distances = generator.random(500) * 400
+        weights = ScoreWeights(1.0, 2.0, 0.5)
+
+        ranking = rank_sites(np.arange(500), population, school_distances, river_distances, weights, 10,
+                             2000.0, 100.0, batch_size=64)
+        scores = site_scores(population, school_distances, river_distances, weights,
+                             population.max(), 2000.0, 100.0)
+
+        self.assertEqual([site for site, _ in ranking], list(np.argsort(-scores, kind="stable")[:10]))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ScoringTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
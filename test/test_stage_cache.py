@@ -0,0 +1,77 @@
+# coding=utf-8
+"""Stage cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from pipeline import build_suitability_pipeline, plan
+from stage_cache import StageCache, plan_keys
+
+
+class StageCacheTest(unittest.TestCase):
+    """Test stage outputs are keyed and evicted correctly."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.directory)
+
+    def keys(self, threshold, school_distance):
+        source_keys = {name: name for name in ("population", "school", "river", "boundary")}
+        return plan_keys(plan(build_suitability_pipeline(threshold, school_distance, 50.0)), source_keys)
+
+    def test_threshold_keeps_buffer_keys(self):
+        """Test changing the threshold only invalidates the population stages."""
+        first = self.keys(100, 500.0)
+        second = self.keys(200, 500.0)
+
+        for name in ("school_buffer", "river_buffer", "merge"):
+            self.assertEqual(first[name], second[name])
+        for name in ("extract_high_population", "clip_population", "difference"):
+            self.assertNotEqual(first[name], second[name])
+
+    def test_distance_changes_school_buffer_key(self):
+        """Test changing a buffer distance invalidates the buffer."""
+        first = self.keys(100, 500.0)
+        second = self.keys(100, 800.0)
+
+        self.assertNotEqual(first["school_buffer"], second["school_buffer"])
+        self.assertEqual(first["river_buffer"], second["river_buffer"])
+
+    def test_least_recently_used_evicted(self):
+        """Test trimming evicts the least recently used outputs first."""
+        cache = StageCache(self.directory, max_bytes=20)
+        for key in ("old", "recent"):
+            with open(cache.path_for(key), "wb") as output:
+                output.write(b"x" * 15)
+            cache.add(key)
+            time.sleep(0.01)
+
+        cache.trim()
+
+        self.assertIsNone(cache.get("old"))
+        self.assertEqual(cache.get("recent"), cache.path_for("recent"))
+        self.assertFalse(os.path.exists(cache.path_for("old")))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(StageCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,56 @@
+# coding=utf-8
+"""Parameter sweep test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import unittest
+
+from sweep import Scenario, scenario_field, scenario_grid, value_range
+
+
+class SweepTest(unittest.TestCase):
+    """Test scenarios are generated and evaluated from distances."""
+
+    def test_value_range(self):
+        """Test ranges include their end and do not drift."""
+        self.assertEqual(value_range(0, 1000, 250), [0, 250, 500, 750, 1000])
+        self.assertEqual(len(value_range(0.0, 1.0, 0.1)), 11)
+        self.assertEqual(value_range(100, 100, 50), [100])
+        self.assertEqual(value_range(100, 500, 0), [100])
+
+    def test_scenario_grid(self):
+        """Test every combination of the parameters is evaluated."""
+        scenarios = scenario_grid([100, 200], [500.0], [50.0, 100.0, 150.0])
+
+        self.assertEqual(len(scenarios), 6)
+        self.assertEqual(scenarios[0], Scenario(100, 500.0, 50.0))
+        self.assertEqual(len(set(scenarios)), 6)
+        self.assertLessEqual(len(scenario_field(len(scenarios) - 1)), 10)
+
+    def test_is_suitable(self):
+        """Test a polygon must clear every threshold."""
+        scenario = Scenario(100, 500.0, 50.0)
+
+        self.assertTrue(scenario.is_suitable(150, 800.0, 60.0))
+        self.assertTrue(scenario.is_suitable(100, 500.0, 50.0))
+        self.assertFalse(scenario.is_suitable(99, 800.0, 60.0))
+        self.assertFalse(scenario.is_suitable(150, 499.0, 60.0))
+        self.assertFalse(scenario.is_suitable(150, 800.0, 10.0))
+        self.assertFalse(scenario.is_suitable(None, 800.0, 60.0))
+        # Without any school or river the distances do not restrict anything
+        self.assertTrue(scenario.is_suitable(150, None, None))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SweepTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,55 @@
+# coding=utf-8
+"""Tiling test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'bsc-phy-15-19@gmail.com'
+__date__ = '2024-11-29'
+__copyright__ = 'Copyright 2024, group14'
+
+import unittest
+
+from tiling import tile_grid
+
+
+class TilingTest(unittest.TestCase):
+    """Test the boundary extent is partitioned without gaps or overlaps."""
+
+    def test_grid_covers_extent(self):
+        """Test the grid has enough tiles and the last ones are cut to the extent."""
+        tiles = tile_grid((0, 0, 250, 100), 100)
+
+        self.assertEqual(len(tiles), 3)
+        self.assertEqual(tiles[-1].rect, (200, 0, 250, 100))
+
+    def test_every_point_owned_once(self):
+        """Test shared edges and points outside the grid have a single owner."""
+        tiles = tile_grid((0, 0, 200, 200), 100)
+        points = [(100, 100), (0, 0), (200, 200), (-50, 150), (150, 999), (99.9, 100)]
+
+        for x, y in points:
+            owners = [tile for tile in tiles if tile.owns(x, y)]
+            self.assertEqual(len(owners), 1, (x, y))
+
+    def test_ownership_rect_extends_outer_tiles(self):
+        """Test outer tiles reach the bounds of the data."""
+        tiles = tile_grid((0, 0, 200, 200), 100)
+
+        self.assertEqual(tiles[0].ownership_rect((-10, -10, 210, 210)), (-10, -10, 100, 100))
+        self.assertEqual(tiles[3].ownership_rect((-10, -10, 210, 210)), (100, 100, 210, 210))
+
+    def test_invalid_tile_size(self):
+        """Test a tile size of zero is rejected."""
+        with self.assertRaises(ValueError):
+            tile_grid((0, 0, 1, 1), 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TilingTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
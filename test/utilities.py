@@ -1,6 +1,7 @@
 # coding=utf-8
 """Common functionality used by regression tests."""
 
+import os
 import sys
 import logging
 
@@ -59,3 +60,81 @@ def get_qgis_app():
         IFACE = QgisInterface(CANVAS)
 
     return QGIS_APP, CANVAS, IFACE, PARENT
+
+
+def init_processing():
+    """Initialises the processing framework the analysis tasks run."""
+    from qgis.core import QgsApplication
+
+    sys.path.append(os.path.join(QgsApplication.pkgDataPath(), "python", "plugins"))
+    from processing.core.Processing import Processing
+    Processing.initialize()
+
+
+def memory_layer(geometry_type, geometries, population=None):
+    """Returns a memory layer of ``geometries`` in EPSG:3857.
+
+    :param population: Values of a ``population`` attribute, one per geometry.
+    """
+    from qgis.core import QgsFeature, QgsVectorLayer
+
+    uri = f"{geometry_type}?crs=EPSG:3857"
+    if population is not None:
+        uri += "&field=population:double"
+    layer = QgsVectorLayer(uri, geometry_type, "memory")
+    features = []
+    for position, geometry in enumerate(geometries):
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(geometry)
+        if population is not None:
+            feature.setAttributes([population[position]])
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+def write_layers(directory, layers):
+    """Writes the ``population``, ``school``, ``river`` and ``boundary``
+    layers to GeoPackages of ``directory``.
+
+    :returns: The layer paths read by the analysis tasks.
+    :rtype: dict
+    """
+    from qgis.core import QgsCoordinateTransformContext, QgsVectorFileWriter
+
+    names = {"population": "Population Data", "school": "School Layer",
+             "river": "River Layer", "boundary": "Boundary Layer"}
+    layer_paths = {}
+    for name, layer in layers.items():
+        path = os.path.join(directory, f"{name}.gpkg")
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = "GPKG"
+        QgsVectorFileWriter.writeAsVectorFormatV2(layer, path, QgsCoordinateTransformContext(), options)
+        layer_paths[names[name]] = path
+    return layer_paths
+
+
+def write_grid_layers(directory):
+    """Writes the layers of a small analysis to GeoPackages of ``directory``:
+    a 10 x 10 grid of population squares 100 wide, three schools, a river
+    winding across the grid in 200 vertices and a boundary cutting the
+    outer squares.
+
+    :returns: The layer paths read by the analysis tasks.
+    :rtype: dict
+    """
+    import math
+
+    from qgis.core import QgsGeometry, QgsRectangle
+
+    squares = [QgsGeometry.fromRect(QgsRectangle(x * 100, y * 100, x * 100 + 100, y * 100 + 100))
+               for x in range(10) for y in range(10)]
+    river = ", ".join(f"{x * 5} {500 + 120 * math.sin(x / 6)}" for x in range(200))
+    return write_layers(directory, {
+        "population": memory_layer("Polygon", squares, [float((index * 37) % 100) for index in range(100)]),
+        "school": memory_layer("Point", [QgsGeometry.fromWkt(wkt) for wkt in
+                                         ("POINT(250 250)", "POINT(720 810)", "POINT(90 930)")]),
+        "river": memory_layer("LineString", [QgsGeometry.fromWkt(f"LINESTRING({river})")]),
+        "boundary": memory_layer("Polygon", [QgsGeometry.fromWkt(
+            "POLYGON((20 20, 980 40, 960 980, 40 940, 20 20))")]),
+    })
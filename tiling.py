@@ -0,0 +1,87 @@
+"""Partitioning of the study area into tiles processed independently.
+
+Every population polygon is owned by exactly one tile, the one containing
+the centre of its bounding box, so tile results never overlap and can be
+appended to each other without seams. The outer tiles own everything
+beyond the grid so that no polygon is left out. Rectangles are
+``(xmin, ymin, xmax, ymax)`` tuples.
+"""
+
+import math
+
+
+class Tile:
+    """A cell of the tile grid."""
+
+    def __init__(self, row, column, rows, columns, rect):
+        self.row = row
+        self.column = column
+        self.rows = rows
+        self.columns = columns
+        self.rect = rect
+
+    @property
+    def name(self):
+        return f"tile_{self.row}_{self.column}"
+
+    def owns(self, x, y):
+        """Returns whether the point ``(x, y)`` belongs to this tile.
+
+        Tiles are half-open on their upper sides so that a point on a shared
+        edge belongs to a single tile; outer sides extend to infinity.
+        """
+        xmin, ymin, xmax, ymax = self.rect
+        if self.column > 0 and x < xmin:
+            return False
+        if self.column < self.columns - 1 and x >= xmax:
+            return False
+        if self.row > 0 and y < ymin:
+            return False
+        if self.row < self.rows - 1 and y >= ymax:
+            return False
+        return True
+
+    def ownership_rect(self, bounds):
+        """Returns the part of ``bounds`` this tile may own points in."""
+        xmin, ymin, xmax, ymax = self.rect
+        if self.column == 0:
+            xmin = min(xmin, bounds[0])
+        if self.row == 0:
+            ymin = min(ymin, bounds[1])
+        if self.column == self.columns - 1:
+            xmax = max(xmax, bounds[2])
+        if self.row == self.rows - 1:
+            ymax = max(ymax, bounds[3])
+        return xmin, ymin, xmax, ymax
+
+    def __repr__(self):
+        return f"Tile({self.row}, {self.column}, {self.rect!r})"
+
+
+def tile_grid(extent, tile_size):
+    """Splits ``extent`` into a grid of square tiles of ``tile_size``.
+
+    :returns: The tiles, row by row.
+    :rtype: list of Tile
+    """
+    if tile_size <= 0:
+        raise ValueError("The tile size must be positive.")
+
+    xmin, ymin, xmax, ymax = extent
+    columns = max(1, math.ceil((xmax - xmin) / tile_size))
+    rows = max(1, math.ceil((ymax - ymin) / tile_size))
+
+    tiles = []
+    for row in range(rows):
+        for column in range(columns):
+            rect = (xmin + column * tile_size,
+                    ymin + row * tile_size,
+                    min(xmax, xmin + (column + 1) * tile_size),
+                    min(ymax, ymin + (row + 1) * tile_size))
+            tiles.append(Tile(row, column, rows, columns, rect))
+    return tiles
+
+
+def expand(rect, distance):
+    """Returns ``rect`` grown by ``distance`` on every side."""
+    return rect[0] - distance, rect[1] - distance, rect[2] + distance, rect[3] + distance